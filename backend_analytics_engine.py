@@ -10,10 +10,25 @@ import pandas as pd
 import numpy as np
 import os
 import traceback
-import re
-import plotly.figure_factory as ff # Plotting library
-import plotly.express as px
+from ingestion_engine import (read_table, detect_format, document_name, list_sheets, portable_source, run_parallel,
+                              optimize_dtypes as optimize_dtypes_of)
+from columnar_cache import Columnar_Cache
+from duckdb_engine import Parquet_Table, quote, literal
+from preview_engine import sort_order, filter_mask, filters_to_sql, stratified_positions
+from data_cache import content_digest
+from cleaning_engine import Cleaning_Plan
+from plot_engine import (ols_fit, trend_figure, distribution_data, distribution_figure, box_statistics,
+                         outlier_figure, correlation_figure)
+from export_engine import export_frame
+from stats_engine import (continuous_column_stats, categorical_column_stats, summary_frame,
+                          to_float_array, group_codes, grouped_continuous_stats, grouped_summary_frame,
+                          spearman_correlation, pairwise_regression, CONT_STATS, CATEG_STATS)
+from sketch_engine import Continuous_Sketch, Categorical_Sketch, APPROX_CONT_STATS, APPROX_CATEG_STATS
+from instrumentation import Metrics_Recorder, instrument_methods
+from history_engine import Dataset_History
+from job_runner import Job_Cancelled
 
+@instrument_methods
 class Data_Analytics():
     """
     Class to perform data analytics
@@ -26,22 +41,100 @@ class Data_Analytics():
         List of continuous variables in the df dataframe
     categ_var : list
         List of categorical variables in the df dataframe
+    disk_cache : Columnar_Cache or None
+        On-disk cache of ingested documents
+    digest : str or None
+        Digest of the document read last
+    datasets : dict
+        Named dataframes loaded from the documents and worksheets
+    active_dataset : str or None
+        Name of the dataset currently held in df
+    data_version : int
+        Incremented whenever df is replaced or modified
+    column_versions : dict
+        Version of every column, changed to a new unique value whenever the column is modified
+    memory_reports : dict
+        Memory usage per column before and after optimize_memory, by dataset name
+    backend : str
+        'pandas' keeps df in memory, 'duckdb' keeps the data in a Parquet file queried by DuckDB
+    table : Parquet_Table or None
+        Parquet file of the working dataset with the duckdb backend
+    history : Dataset_History
+        Versions of the working dataset committed after every modification, see undo, redo and revert_version
+    metrics : Metrics_Recorder or None
+        Records the wall time, memory, data size and cache hits of every public method
+    cache_hits : int
+        Number of statistics served from the cache
+    cache_misses : int
+        Number of statistics computed
         
     Methods
     -------
         Details of the method are given with each method
     """
-    def __init__(self):
+    def __init__(self, disk_cache=None, backend='pandas', work_dir=None, threads=None, memory_limit=None,
+                 metrics=None):
         """
         Constructs/define all the necessary attributes for a use case
         
         Parameters
         ----------
-        
+        disk_cache : Columnar_Cache, optional
+            On-disk cache of ingested documents. The default is None which uses a cache
+            in the temporary folder. False disables the cache.
+        backend : str, optional
+            'pandas' or 'duckdb'. With 'duckdb', integrity checks, cleaning, descriptive
+            statistics and outlier handling run as DuckDB queries over a Parquet file and
+            df is only loaded when an operation needs the full frame. The default is 'pandas'.
+        work_dir : str, optional
+            Folder of the Parquet files of the duckdb backend. The default is None which
+            uses a folder in the temporary folder.
+        threads : int, optional
+            Number of DuckDB threads. The default is None which uses every core.
+        memory_limit : str, optional
+            DuckDB memory limit, e.g. '2GB'. The default is None.
+        metrics : Metrics_Recorder, optional
+            Recorder of the method calls, shared with the app. The default is None which
+            creates a recorder keeping the records in memory. False disables the instrumentation.
         """
-        self.df = pd.DataFrame()
+        if backend not in ('pandas', 'duckdb'):
+            raise ValueError("backend must be 'pandas' or 'duckdb'")
+        self.backend = backend
+        self.table = None
+        self._table_options = {"work_dir": work_dir, "threads": threads, "memory_limit": memory_limit}
+        self._df = pd.DataFrame()
         self.cont_var = []
         self.categ_var = []
+        self.disk_cache = Columnar_Cache() if disk_cache is None else (disk_cache or None)
+        self.digest = None
+        self.datasets = {}
+        self.active_dataset = None
+        self.data_version = 0
+        self.column_versions = {}
+        self._stats_cache = {}
+        self.memory_reports = {}
+        self.history = Dataset_History()
+        self.metrics = Metrics_Recorder() if metrics is None else (metrics or None)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def df(self):
+        """Working dataframe, loaded from table on first use with the duckdb backend"""
+        if self._df is None:
+            self._df = self.table.to_frame()
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        if self.backend == 'duckdb':
+            # the frame is spilled to Parquet and released, it is reloaded only when needed
+            if not isinstance(value, Parquet_Table):
+                value = Parquet_Table.from_frame(value, **self._table_options)
+            self.table = value
+            self._df = None
+        else:
+            self._df = value
 
     def return_status(self,
                      error_code, 
@@ -79,14 +172,22 @@ class Data_Analytics():
              }
         return d
 
-    def read_document(self, document_path):
+    def read_document(self, document_path, chunk_size=50000, digest=None, optimize_dtypes=False):
         """
         Function to read the document uploaded by the user.
+        Excel sheets are streamed row-wise and CSV files are parsed in chunks.
+        Documents read before are loaded from the on-disk columnar cache.
 
         Parameters
         ----------
         document_path : string
             Path of the document uploaded by the user
+        chunk_size : int, optional
+            Number of rows converted at a time. The default is 50000.
+        digest : str, optional
+            Content digest of the document if already known. Computed when None.
+        optimize_dtypes : boolean, optional
+            Reduces memory usage of the data after ingestion, see optimize_memory. The default is False.
 
         Returns
         -------
@@ -95,20 +196,491 @@ class Data_Analytics():
 
         """
         try:
-            self.df = pd.read_excel(document_path)
-            self.cont_var = self.df.select_dtypes(exclude=['object', 'datetime64']).columns
-            self.categ_var = self.df.select_dtypes(include=['object'], exclude=['datetime64[ns]']).columns
+            df = None
+            self.digest = None
+            file_format = detect_format(document_path)
+            if self.backend == 'duckdb' and file_format in ('csv', 'parquet'):
+                # scanned by DuckDB without going through pandas
+                df = Parquet_Table.from_document(document_path, file_format, **self._table_options)
+            elif self.disk_cache is not None and self.disk_cache.enabled:
+                self.digest = digest or content_digest(document_path)
+                df = self.disk_cache.get(self.digest)
+            if df is None:
+                df = read_table(document_path, file_format=file_format, chunk_size=chunk_size)
+                if self.digest is not None:
+                    self.disk_cache.put(self.digest, df)
+            self.datasets = {document_name(document_path): df}
+            self.memory_reports = {}
+            self.active_dataset = None
+            self.select_dataset(document_name(document_path))
+            if optimize_dtypes:
+                self.optimize_memory()
             status_msg = "Function executed successfully"
             return self.return_status(0, status_msg)
         except:
-            status_msg = "Upload file with .xlsx, .xls format ONLY"
+            status_msg = "Upload file with .xlsx, .xls, .csv, .parquet format ONLY"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(101, status_msg, error_trace)
         
+    def read_documents(self,
+                       document_paths,
+                       sheet_names = None,
+                       max_workers = None,
+                       concat = False,
+                       chunk_size = 50000,
+                       digests = None,
+                       optimize_dtypes = False
+                       ):
+        """
+        Reads several documents and worksheets concurrently in a process pool.
+        Every worksheet becomes a named dataset, "<document>:<sheet>" for workbooks
+        and "<document>" for CSV and Parquet files.
+
+        Parameters
+        ----------
+        document_paths : list
+            Paths of the documents or uploaded files
+        sheet_names : list, optional
+            Names or indices of the worksheets to read from every workbook. Worksheets
+            missing in a workbook are skipped. The default is None which reads all worksheets.
+        max_workers : int, optional
+            Number of worker processes. The default is the number of CPUs.
+        concat : boolean or str, optional
+            Combines all datasets into a dataset named "combined" with a "Dataset" column.
+            'union' or True keeps all columns, 'intersection' keeps common columns only.
+            The default is False.
+        chunk_size : int, optional
+            Number of rows converted at a time. The default is 50000.
+        digests : list, optional
+            Content digests of the documents if already known. Computed when None.
+        optimize_dtypes : boolean, optional
+            Reduces memory usage of every dataset after ingestion, see optimize_memory.
+            The default is False.
+
+        Returns
+        -------
+        Dictionary
+            Contains the list of loaded dataset names
+        """
+        try:
+            use_cache = self.disk_cache is not None and self.disk_cache.enabled
+            names, keys, frames, jobs, pending = [], [], {}, [], []
+            for n, document in enumerate(document_paths):
+                file_format = detect_format(document)
+                sheets = list_sheets(document, file_format)
+                if sheet_names is not None and sheets != [None]:
+                    sheets = [sheets[s] if isinstance(s, int) else s for s in sheet_names
+                              if (isinstance(s, int) and s < len(sheets)) or s in sheets]
+                digest = None
+                if use_cache:
+                    digest = digests[n] if digests else content_digest(document)
+                source = None
+                base_name = document_name(document)
+                for sheet in sheets:
+                    name = base_name if sheet is None else "%s:%s" % (base_name, sheet)
+                    key = None if digest is None else "%s-%s" % (digest, sheet)
+                    names.append(name)
+                    keys.append(key)
+                    df = self.disk_cache.get(key) if key is not None else None
+                    if df is not None:
+                        frames[name] = df
+                        continue
+                    if source is None:
+                        source = portable_source(document)
+                    jobs.append((source, file_format, sheet, chunk_size))
+                    pending.append(name)
+
+            for name, df in zip(pending, run_parallel(jobs, max_workers)):
+                frames[name] = df
+                key = keys[names.index(name)]
+                if key is not None:
+                    self.disk_cache.put(key, df)
+
+            self.memory_reports = {}
+            if optimize_dtypes:
+                for name in names:
+                    frames[name], self.memory_reports[name] = optimize_dtypes_of(frames[name])
+            self.datasets = {name: frames[name] for name in names}
+            if concat and len(names) > 1:
+                join = 'inner' if concat == 'intersection' else 'outer'
+                combined = pd.concat([frames[name].assign(Dataset=name) for name in names],
+                                     join=join, ignore_index=True)
+                self.datasets["combined"] = combined
+            self.active_dataset = None
+            self.select_dataset("combined" if "combined" in self.datasets else names[0])
+            status_msg = "%d datasets loaded" % len(self.datasets)
+            return self.return_status(0, status_msg, output=list(self.datasets))
+        except:
+            status_msg = "Upload files with .xlsx, .xls, .csv, .parquet format ONLY"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(113, status_msg, error_trace)
+
+    def select_dataset(self, name):
+        """
+        Makes one of the loaded datasets the working dataframe
+
+        Parameters
+        ----------
+        name : str
+            Name of the dataset
+
+        Returns
+        -------
+        Dictionary
+            Contains the name of the selected dataset
+        """
+        try:
+            # the history belongs to the previous dataset, the file of its current version goes back to the table
+            if self.history.clear() and self.table is not None:
+                self.table.owned = True
+            if self.active_dataset is not None:
+                # keep cleaning done on the current dataset
+                self.datasets[self.active_dataset] = self.table if self.backend == 'duckdb' else self.df
+            self.df = self.datasets[name]
+            if self.backend == 'duckdb':
+                self.datasets[name] = self.table
+            self.active_dataset = name
+            self._classify_columns()
+            self._reset_stats()
+            self._commit("Loaded " + str(name))
+            return self.return_status(0, output=name)
+        except:
+            status_msg = "Dataset could not be selected"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(114, status_msg, error_trace)
+
+    def optimize_memory(self, categorical_threshold=0.5, parse_dates=True):
+        """
+        Reduces the memory used by df: numerics are downcast, low cardinality text
+        columns become category and date-like text is parsed to datetime
+
+        Parameters
+        ----------
+        categorical_threshold : float, optional
+            Maximum ratio of distinct values to non missing values for a text column
+            to be converted to category. The default is 0.5.
+        parse_dates : boolean, optional
+            Parses date-like text columns if True. The default is True.
+
+        Returns
+        -------
+        Dictionary
+            Contains the dtype and memory of every column before and after the optimization
+        """
+        try:
+            self.df, report = optimize_dtypes_of(self.df, categorical_threshold, parse_dates)
+            self.memory_reports[self.active_dataset] = report
+            self._mark_dirty()
+            self._classify_columns()
+            self._commit("Memory optimization")
+            status_msg = "Memory usage reduced from %.1f MB to %.1f MB" % (
+                report['Memory before (bytes)'].sum() / 1e6, report['Memory after (bytes)'].sum() / 1e6)
+            return self.return_status(0, status_msg, output=report)
+        except:
+            status_msg = "Memory optimization could not be performed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(116, status_msg, error_trace)
+
+    def _classify_columns(self):
+        # Split the columns of df into continuous and categorical variables
+        if self.table is not None:
+            self.cont_var = self.table.continuous_columns()
+            self.categ_var = self.table.categorical_columns()
+            return
+        self.cont_var = self.df.select_dtypes(exclude=['object', 'category', 'string', 'datetime', 'datetimetz']).columns
+        self.categ_var = self.df.select_dtypes(include=['object', 'category', 'string']).columns
+
+    def _reset_stats(self):
+        # df was replaced, every cached statistic is stale
+        self._stats_cache = {}
+        self.column_versions = {}
+        self.data_version += 1
+
+    def _mark_dirty(self, columns=None):
+        """
+        Marks columns as modified so that their cached statistics are recomputed
+
+        Parameters
+        ----------
+        columns : list, optional
+            Modified columns. The default is None which marks every column,
+            used when rows have been added or removed.
+        """
+        if columns is None:
+            columns = self._columns()
+        # versions are unique values of data_version, so a column modified on another branch of
+        # the history never gets the version of statistics cached for a discarded branch
+        self.data_version += 1
+        for col in columns:
+            self.column_versions[col] = self.data_version
+
+    def _cached(self, key, columns, compute):
+        """
+        Returns a cached result depending on some columns, recomputed only if any of them changed
+
+        Parameters
+        ----------
+        key : hashable
+            Identifier of the result
+        columns : list
+            Columns the result depends on
+        compute : callable
+            Called without arguments to compute the result
+
+        Returns
+        -------
+        any type
+            The cached or freshly computed result
+        """
+        version = tuple(self.column_versions.get(c, 0) for c in columns)
+        cached = self._stats_cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            return cached[1]
+        self.cache_misses += 1
+        result = compute()
+        self._stats_cache[key] = (version, result)
+        return result
+
+    def _column_stats(self, column, kind):
+        """
+        Returns the statistics of a column, computed only if the column changed
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+        kind : str
+            'continuous', 'categorical' or 'missing'
+
+        Returns
+        -------
+        dictionary
+            Statistics of the column, see stats_engine
+        """
+        if self.table is not None:
+            compute = lambda: {'continuous': self.table.continuous_stats,
+                               'categorical': self.table.categorical_stats,
+                               'missing': self.table.missing_counts}[kind]([column])[0]
+        elif kind == 'continuous':
+            compute = lambda: continuous_column_stats(self.df[column])
+        elif kind == 'categorical':
+            compute = lambda: categorical_column_stats(self.df[column])
+        else:
+            compute = lambda: {'Missing': int(self.df[column].isna().sum())}
+        return self._cached((column, kind), [column], compute)
+
+    def _prefetch_stats(self, columns, kind):
+        # With the duckdb backend the stale statistics of all columns come from one query
+        if self.table is None:
+            return
+        stale = [c for c in columns
+                 if self._stats_cache.get((c, kind), (None,))[0] != (self.column_versions.get(c, 0),)]
+        self.cache_hits += len(columns) - len(stale)
+        self.cache_misses += len(stale)
+        if not stale:
+            return
+        compute = {'continuous': self.table.continuous_stats,
+                   'categorical': self.table.categorical_stats,
+                   'missing': self.table.missing_counts}[kind]
+        for column, stats in zip(stale, compute(stale)):
+            self._stats_cache[(column, kind)] = ((self.column_versions.get(column, 0),), stats)
+
+    def _shape(self):
+        # rows and columns of the working data without loading df
+        if self.table is not None:
+            return len(self.table), len(self.table.columns)
+        return self._df.shape
+
+    def _commit(self, label):
+        # records the working data as a new version of the history, unless it did not change
+        if self.history.unchanged(self.column_versions):
+            return
+        if self.table is not None:
+            # the history deletes the file once the version is evicted
+            self.history.commit(label, path=self.table.path, owned=self.table.owned,
+                                column_versions=self.column_versions, cont_var=self.cont_var,
+                                categ_var=self.categ_var, rows=len(self.table))
+            self.table.owned = False
+        else:
+            self.history.commit(label, data=self.df.copy(deep=False), column_versions=self.column_versions,
+                                cont_var=self.cont_var, categ_var=self.categ_var, rows=len(self.df))
+
+    def _restore(self, version_id):
+        # makes a version of the history the working data, cached statistics of its columns stay valid
+        version = self.history.checkout(version_id)
+        if self.table is not None:
+            self.table.checkout(version.path)
+            self._df = None
+        else:
+            self._df = version.data.copy(deep=False)
+        self.column_versions = dict(version.column_versions)
+        self.cont_var = pd.Index(version.cont_var)
+        self.categ_var = pd.Index(version.categ_var)
+        self.data_version += 1
+        return version
+
+    def _columns(self):
+        # column names without loading df
+        return self.table.columns if self.table is not None else self.df.columns
+
+    def _column_array(self, column):
+        # float values of a continuous column with NaN for missing values, only this column is read
+        if self.table is not None:
+            return self.table.column_array(column)
+        return to_float_array(self.df[column])
+
+    def _take_rows(self, positions):
+        # rows at the given positions, only these rows are read
+        if self.table is not None:
+            return self.table.take(positions)
+        return self.df.iloc[positions]
+
+    def _run_plan(self, plan):
+        # executes a cleaning plan on the working data and returns the report
+        if self.table is not None:
+            report = self.table.execute_plan(plan)
+            self._df = None
+        else:
+            self.df, report = plan.execute(self.df)
+        return report
+
+    def _iter_chunks(self, columns, chunk_size):
+        # the columns a chunk of rows at a time, as a dataframe or a dictionary of series
+        if self.table is not None:
+            yield from self.table.iter_frames(columns, chunk_size)
+            return
+        for start in range(0, len(self.df), chunk_size):
+            yield {col: self.df[col].iloc[start:start + chunk_size] for col in columns}
+
+    def _sketch_stats(self, quantile_error, unique_error, mode_error, chunk_size, progress=None):
+        """
+        Computes the approximate statistics of every column with sketches built in one streaming pass
+
+        Only columns modified since their last summary are read again.
+
+        Returns
+        -------
+        tuple
+            Lists of statistics dictionaries of the continuous and the categorical columns
+        """
+        cont_key = ('approximate', quantile_error)
+        categ_key = ('approximate', unique_error, mode_error)
+        stale = [(c, cont_key) for c in self.cont_var] + [(c, categ_key) for c in self.categ_var]
+        n_columns = len(stale)
+        stale = [(c, key) for c, key in stale
+                 if self._stats_cache.get((c, key), (None,))[0] != (self.column_versions.get(c, 0),)]
+        self.cache_hits += n_columns - len(stale)
+        self.cache_misses += len(stale)
+        if stale:
+            cont = set(self.cont_var)
+            # a fixed seed keeps the approximate quantiles identical from one run to the next
+            sketches = {c: Continuous_Sketch(quantile_error, seed=0) if c in cont
+                        else Categorical_Sketch(unique_error, mode_error)
+                        for c, _ in stale}
+            n_rows = max(len(self.table) if self.table is not None else len(self.df), 1)
+            done = 0
+            for chunk in self._iter_chunks(list(sketches), chunk_size):
+                for c, sketch in sketches.items():
+                    sketch.update(to_float_array(chunk[c]) if c in cont else chunk[c])
+                    n_chunk = len(chunk[c])
+                done += n_chunk
+                if progress is not None:
+                    progress(done / n_rows, "Sketched %d rows" % done)
+            for c, key in stale:
+                self._stats_cache[(c, key)] = ((self.column_versions.get(c, 0),), sketches[c].stats())
+        return ([self._stats_cache[(c, cont_key)][1] for c in self.cont_var],
+                [self._stats_cache[(c, categ_key)][1] for c in self.categ_var])
+
+    def _grouped_summary(self, group_by):
+        """
+        Summarizes the continuous columns per group, cached until a grouping or summarized column changes
+
+        Parameters
+        ----------
+        group_by : list
+            Grouping columns, left out of the summarized columns
+
+        Returns
+        -------
+        Pandas DataFrame
+            See stats_engine.grouped_summary_frame
+        """
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        columns = [c for c in self.cont_var if c not in group_by]
+
+        def compute():
+            if self.table is not None:
+                group_keys, stats = self.table.grouped_continuous_stats(group_by, columns)
+            else:
+                codes, group_keys = group_codes([self.df[g] for g in group_by])
+                stats = [grouped_continuous_stats(codes, len(group_keys), self._column_array(c)) for c in columns]
+            return grouped_summary_frame(group_keys, group_by, stats, columns)
+        return self._cached(("grouped", tuple(group_by)), group_by + columns, compute)
+
+    def _valid_values(self, column):
+        # float values of a continuous column without the missing values
+        values = self._column_array(column)
+        return values[~np.isnan(values)]
+
+    def _missing_count(self, column):
+        # every kind of cached statistics carries the missing values count
+        version = (self.column_versions.get(column, 0),)
+        for kind in ('continuous', 'categorical', 'missing'):
+            cached = self._stats_cache.get((column, kind))
+            if cached is not None and cached[0] == version:
+                self.cache_hits += 1
+                return cached[1]['Missing']
+        return self._column_stats(column, 'missing')['Missing']
+
+    def disk_cache_stats(self):
+        """
+        Returns the statistics of the on-disk columnar cache
+
+        Returns
+        -------
+        Dictionary
+            Contains folder, number of entries, size on disk, limits, hits and misses
+        """
+        try:
+            if self.disk_cache is None:
+                return self.return_status(0, "Disk cache is disabled", output={"enabled": False})
+            return self.return_status(0, output=self.disk_cache.stats())
+        except:
+            status_msg = "Cache statistics could not be collected"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(111, status_msg, error_trace)
+
+    def evict_disk_cache(self, clear=False):
+        """
+        Removes expired and least recently used entries from the on-disk cache
+
+        Parameters
+        ----------
+        clear : boolean, optional
+            Removes every entry if True. The default is False.
+
+        Returns
+        -------
+        Dictionary
+            Contains the number of removed entries
+        """
+        try:
+            if self.disk_cache is None:
+                return self.return_status(0, "Disk cache is disabled", output=0)
+            removed = self.disk_cache.clear() if clear else self.disk_cache.evict()
+            return self.return_status(0, "%d cached files removed" % removed, output=removed)
+        except:
+            status_msg = "Cache eviction could not be performed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(112, status_msg, error_trace)
+
     # Function to check data missingness, foreign values
     def check_data_integrity(self):
         """
         This function checks data missingness columnwise
+        Missing counts are shared with the cached column statistics.
+
         Returns
         -------
         Dictionary
@@ -118,10 +690,13 @@ class Data_Analytics():
         # checking data missingness columnwise
         try:
             output = {}
-            data_missingness = self.df.isnull().sum()
-            data_missingness = data_missingness.to_frame()
-            data_missingness.reset_index(inplace=True)
-            data_missingness.columns = ['Features', "Missing values count"]
+            columns = self._columns()
+            if self.table is not None:
+                self._prefetch_stats([c for c in columns if self._stats_cache.get((c, 'continuous')) is None
+                                      and self._stats_cache.get((c, 'categorical')) is None], 'missing')
+            data_missingness = pd.DataFrame({'Features': columns,
+                                             "Missing values count": [self._missing_count(c) for c in columns]
+                                             })
             output["data_missingness"] = data_missingness
             return self.return_status(0, output=output)
         except: 
@@ -139,6 +714,7 @@ class Data_Analytics():
                             ):
         """
         Method to remove rows with missing data and foreign values and to perform imputation
+        All steps are executed as one cleaning plan, see build_cleaning_plan
         
         Parameters
         ----------
@@ -165,108 +741,338 @@ class Data_Analytics():
 
         """
         
-        # Remove/impute rows with missing values
+        try:
+            plan = self.build_cleaning_plan(remove_missing_rows_continuous=remove_missing_rows_continuous,
+                                            remove_missing_rows_categorical=remove_missing_rows_categorical,
+                                            remove_foreign_rows=remove_foreign_rows,
+                                            impute_missing_rows_continuous=impute_missing_rows_continuous,
+                                            impute_missing_rows_categorical=impute_missing_rows_categorical
+                                            )["output"]
+        except:
+            status_msg = "Removal of rows with missing data or imputation could not be performed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(104, status_msg, error_trace)
+
+        output = self.execute_cleaning_plan(plan)
+        if output["error_code"] != 0:
+            return output
+
         status_msg =''
+        if remove_missing_rows_continuous == True:
+            status_msg = status_msg + ' Missing rows have been removed from continuous features.'
+        else:
+            status_msg = status_msg + ' Imputation performed on continuous features.'
+        if remove_missing_rows_categorical == True:
+            status_msg = status_msg + ' Missing rows have been removed from categorical features.'
+        elif impute_missing_rows_categorical == 'mode':
+            status_msg = status_msg + ' Imputation performed on categorical features.'
+        if remove_foreign_rows == True:
+            status_msg = status_msg + ' Foreign values have been removed.'
+        else:
+            status_msg = status_msg + ' Foreign labels in categorical features have been imputed.'
+        return self.return_status(0, status_msg, output=self.table if self.table is not None else self.df)
+
+    def build_cleaning_plan(self,
+                            remove_missing_rows_continuous = False,
+                            remove_missing_rows_categorical = False,
+                            remove_foreign_rows = False,
+                            impute_missing_rows_continuous = 'mean',
+                            impute_missing_rows_categorical = 'mode',
+                            outlier_columns = [],
+                            outlier_imputation_method = 'mean',
+                            f = 1.3
+                            ):
+        """
+        Builds the cleaning plan equivalent to keep_data_integrity, optionally followed by outlier handling.
+        The plan can be inspected or extended before it is passed to execute_cleaning_plan.
+
+        Parameters
+        ----------
+        remove_missing_rows_continuous : boolean, optional
+            See keep_data_integrity. The default is False.
+        remove_missing_rows_categorical : boolean, optional
+            See keep_data_integrity. The default is False.
+        remove_foreign_rows : boolean, optional
+            See keep_data_integrity. The default is False.
+        impute_missing_rows_continuous : str, optional
+            See keep_data_integrity. The default is 'mean'.
+        impute_missing_rows_categorical : str, optional
+            See keep_data_integrity. The default is 'mode'.
+        outlier_columns : list, optional
+            Continuous columns whose outliers are imputed. The default is [].
+        outlier_imputation_method : str or list, optional
+            Imputation method of the outliers, or one method per column. The default is 'mean'.
+        f : float, optional
+            Factor deciding whisker length. The default is 1.3.
+
+        Returns
+        -------
+        Dictionary
+            Contains the Cleaning_Plan
+        """
         try:
+            plan = Cleaning_Plan()
             if remove_missing_rows_continuous == True:
-                self.df.dropna(subset=self.cont_var, axis=0, how='any', inplace=True)
-                status_msg = status_msg + ' Missing rows have been removed from continuous features.'
-            else:
-                # ------------ impute with mean and median
-                if impute_missing_rows_continuous == 'mean':
-                    for i in self.cont_var:
-                        self.df[i].fillna(value=self.df[i].mean(), inplace=True)
-                elif impute_missing_rows_continuous == 'median':
-                    for i in self.cont_var:
-                        self.df[i].fillna(value=self.df[i].median(), inplace=True)
-                else:
-                    pass
-                status_msg = status_msg + ' Imputation performed on continuous features.'
-                
+                plan.drop_missing(self.cont_var)
+            elif impute_missing_rows_continuous in ('mean', 'median'):
+                plan.impute_missing(self.cont_var, impute_missing_rows_continuous)
             if remove_missing_rows_categorical == True:
-                self.df.dropna(subset=self.categ_var, axis=0, how='any', inplace=True)
-                status_msg = status_msg + ' Missing rows have been removed from categorical features.'
-            else:
-                # impute with mode
-                if impute_missing_rows_categorical == 'mode':
-                    for i in self.categ_var:
-                        self.df[i].fillna(value=self.df[i].mode()[0], inplace=True)
-                    status_msg = status_msg + ' Imputation performed on categorical features.'
-
+                plan.drop_missing(self.categ_var)
+            elif impute_missing_rows_categorical == 'mode':
+                plan.impute_missing(self.categ_var, 'mode')
+            plan.handle_foreign(self.categ_var, action='drop' if remove_foreign_rows == True else 'impute')
+            if len(outlier_columns):
+                plan.handle_outliers(outlier_columns, f=f, method=outlier_imputation_method)
+            return self.return_status(0, output=plan)
         except:
-            status_msg = "Removal of rows with missing data or imputation could not be performed"
+            status_msg = "Cleaning plan could not be built"
             error_trace = ''.join(traceback.format_exc())
-            return self.return_status(104, status_msg, error_trace)
-        
-        # Remove/impute rows with foreign values
+            return self.return_status(115, status_msg, error_trace)
+
+    def execute_cleaning_plan(self, plan):
+        """
+        Executes a cleaning plan on df with one row mask and one materialization of the cleaned frame
+
+        Parameters
+        ----------
+        plan : Cleaning_Plan
+            Plan returned by build_cleaning_plan
+
+        Returns
+        -------
+        Dictionary
+            Contains the report with the rows removed, imputed values per column
+            and the timings of every phase
+        """
         try:
-            values_count_index =[]
-            for col in self.categ_var:
-                l = self.df[col].value_counts().index.tolist()
-                values_count_index.extend(l)
-            values_count_index = set(values_count_index)
-            foreign_values = [val for val in values_count_index if type(val)==str and not re.findall('\w+', val)]
-            self.df = self.df.replace(foreign_values, np.nan)
-
-            if remove_foreign_rows == True:
-                # remove foreign rows
-                self.df.dropna(axis=0, inplace=True)
-                status_msg = status_msg + ' Foreign values have been removed.'
+            report = self._run_plan(plan)
+            # Only the modified columns have their statistics recomputed
+            if report["rows_removed"]:
+                self._mark_dirty()
             else:
-                # perform imputation for categorical  features
-                for i in self.categ_var:
-                    self.df[i].fillna(value=self.df[i].mode()[0], inplace=True)
-                status_msg = status_msg + ' Foreign labels in categorical features have been imputed.'
+                self._mark_dirty(report["modified_columns"])
+            # Return updated df after resetting categ and cont var lists
+            self._classify_columns()
+            status_msg = "%d rows removed, %d values imputed" % (report["rows_removed"], sum(report["imputed"].values()))
+            self._commit("Cleaning: " + status_msg)
+            return self.return_status(0, status_msg, output=report)
         except:
-            status_msg = "Removal of rows with foreign data or imputation could not be performed"
+            status_msg = "Removal of rows with missing or foreign data or imputation could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(105, status_msg, error_trace)
-        
-        # Return updated df after resetting categ and cont var lists
-        self.cont_var = self.df.select_dtypes(exclude = ['object', 'datetime64[ns]']).columns
-        self.categ_var = self.df.select_dtypes(include = ['object'], exclude = ['datetime64[ns]']).columns
-        return self.return_status(0, status_msg, output=self.df)
     
-    def describe_data(self):
+    def describe_data(self,
+                      progress = None,
+                      approximate = False,
+                      quantile_error = 0.01,
+                      unique_error = 0.01,
+                      mode_error = 0.001,
+                      chunk_size = 1000000,
+                      group_by = None
+                      ):
         """
         Performs Descriptive analytics  
+        All statistics of a column are computed from one NumPy array of the column
+        and cached until the column is modified.
+        In approximate mode every column is summarized by mergeable sketches built in one
+        streaming pass over chunks of rows: quartiles and median from a KLL sketch, number
+        of unique values from HyperLogLog and mode from a Misra-Gries summary. Counts,
+        mean, variance, min and max stay exact. Sketches pay off when the data cannot be
+        held in memory; a frame in memory is described exactly at least as fast.
+
+        Parameters
+        ----------
+        progress : callable, optional
+            Called with the fraction of columns done and a message after every column.
+            The default is None.
+        approximate : boolean or str, optional
+            True uses sketches instead of exact statistics. 'auto' only uses them when the
+            data is a DuckDB table larger than chunk_size rows, frames in memory are described
+            exactly. The default is False.
+        quantile_error : float, optional
+            Normalized rank error of the quartiles and median in approximate mode. The default is 0.01.
+        unique_error : float, optional
+            Relative standard error of the number of unique values in approximate mode. The default is 0.01.
+        mode_error : float, optional
+            Maximum count error of the mode as a fraction of the values in approximate mode.
+            The default is 0.001.
+        chunk_size : int, optional
+            Number of rows per chunk in approximate mode. The default is 1000000.
+        group_by : list, optional
+            Columns, usually categorical, by which the continuous features are also summarized
+            per group. The statistics of all groups are computed together, without a loop over
+            the groups, and are always exact. The default is None.
 
         Returns
         -------
         Dictionary
-            DESCRIPTION.
+            Summaries of the continuous and categorical features. In approximate mode the
+            error bounds are reported in the Quantile_Rank_Error, Count_of_Unique_Values_Error
+            and Mode_Count_Error columns. With group_by, grouped_cont_data_summary holds one
+            row per group and feature, indexed by the group keys and the feature.
         """
         
         try:
+            if approximate == 'auto':
+                approximate = self.table is not None and len(self.table) > chunk_size
+            if approximate:
+                cont_stats, categ_stats = self._sketch_stats(quantile_error, unique_error, mode_error,
+                                                             chunk_size, progress)
+                output = {"cont_data_summary": summary_frame(cont_stats, APPROX_CONT_STATS, list(self.cont_var)),
+                          "categ_data_summary": summary_frame(categ_stats, APPROX_CATEG_STATS, list(self.categ_var))
+                          }
+                if group_by:
+                    output["grouped_cont_data_summary"] = self._grouped_summary(group_by)
+                return self.return_status(0, output=output)
+
             # Summary of continuous type data
-            cont_data_summary = pd.DataFrame(data = None, index = self.cont_var)
-            cont_data_summary = cont_data_summary.assign(Mean = self.df[self.cont_var].mean())
-            cont_data_summary = cont_data_summary.assign(Standard_Deviation = self.df[self.cont_var].std())
-            cont_data_summary = cont_data_summary.assign(Variance = self.df[self.cont_var].var())
-            cont_data_summary = cont_data_summary.assign(Min = self.df[self.cont_var].min())
-            cont_data_summary = cont_data_summary.assign(Max = self.df[self.cont_var].max())
-            cont_data_summary = cont_data_summary.assign(First_Quartile = self.df[self.cont_var].quantile(0.25))
-            cont_data_summary = cont_data_summary.assign(Median = self.df[self.cont_var].median())
-            cont_data_summary = cont_data_summary.assign(Third_Quartile = self.df[self.cont_var].quantile(0.75))
+            n_columns = max(len(self.cont_var) + len(self.categ_var), 1)
+            self._prefetch_stats(self.cont_var, 'continuous')
+            self._prefetch_stats(self.categ_var, 'categorical')
+            cont_stats = []
+            for c in self.cont_var:
+                cont_stats.append(self._column_stats(c, 'continuous'))
+                if progress is not None:
+                    progress(len(cont_stats) / n_columns, "Summarized %s" % c)
+            cont_data_summary = summary_frame(cont_stats, CONT_STATS, list(self.cont_var))
             
             # Summary of categorical data
-            categ_data_summary = pd.DataFrame(data = None, index = self.categ_var)
-            categ_data_summary = categ_data_summary.assign(Count = self.df[self.categ_var].count())
-            categ_data_summary = categ_data_summary.assign(Count_of_Unique_Values = self.df[self.categ_var].nunique(axis=0))
-            categ_data_summary = categ_data_summary.assign(Mode = self.df[self.categ_var].mode().transpose())
+            categ_stats = []
+            for c in self.categ_var:
+                categ_stats.append(self._column_stats(c, 'categorical'))
+                if progress is not None:
+                    progress((len(cont_stats) + len(categ_stats)) / n_columns, "Summarized %s" % c)
+            categ_data_summary = summary_frame(categ_stats, CATEG_STATS, list(self.categ_var))
             
             output = {"cont_data_summary": cont_data_summary,
                       "categ_data_summary": categ_data_summary
                       }
+            if group_by:
+                output["grouped_cont_data_summary"] = self._grouped_summary(group_by)
             return self.return_status(0, output=output)
+        except Job_Cancelled:
+            # raised by the progress callback of a cancelled background job
+            raise
         except:
             status_msg = "Descriptive statistics of data could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(106, status_msg, error_trace)
         
+    def preview_data(self,
+                     mode = 'page',
+                     page = 0,
+                     page_size = 100,
+                     sort_by = None,
+                     ascending = True,
+                     filters = None,
+                     stratify_by = None,
+                     seed = 0
+                     ):
+        """
+        Returns a bounded preview of the data
+        Sort orders and filtered row positions are cached until the columns involved change,
+        so turning pages only materializes page_size rows.
+
+        Parameters
+        ----------
+        mode : str, optional
+            'head' first rows, 'sample' random rows, 'stratified' page_size random rows with the
+            groups of stratify_by represented in proportion, 'page' page of the sorted and filtered
+            rows. The default is 'page'.
+        page : int, optional
+            Page number in 'page' mode, starting at 0. The default is 0.
+        page_size : int, optional
+            Number of rows returned. The default is 100.
+        sort_by : str, optional
+            Column to sort by in 'page' mode, missing values last. The default is None.
+        ascending : boolean, optional
+            Sort direction. The default is True.
+        filters : list, optional
+            (column, operator, value) tuples combined with AND in 'page' mode, see
+            preview_engine.filter_mask. The default is None.
+        stratify_by : str, optional
+            Column defining the groups in 'stratified' mode. The default is None.
+        seed : int, optional
+            Seed of the random samples. The default is 0.
+
+        Returns
+        -------
+        Dictionary
+            Contains the rows indexed by their position, the number of matching rows,
+            the page number and the number of pages
+        """
+        try:
+            filters = [tuple(f) for f in (filters or [])]
+            page_size = max(int(page_size), 1)
+            page = max(int(page), 0)
+            n_pages = 1
+            if mode not in ('page', 'head', 'sample', 'stratified'):
+                raise ValueError("Unsupported preview mode: %s" % mode)
+            if self.table is not None:
+                total = len(self.table)
+                if mode == 'head':
+                    rows = self.table.page(limit=page_size)
+                elif mode == 'sample':
+                    rows = self.table.sample(page_size, seed)
+                elif mode == 'stratified':
+                    rows = self.table.sample(page_size, seed, stratify_by)
+                else:
+                    where = filters_to_sql(filters, quote, literal)
+                    total = self.table.count_rows(where) if filters else total
+                    n_pages = max(1, int(np.ceil(total / page_size)))
+                    page = min(page, n_pages - 1)
+                    rows = self.table.page(where, sort_by, ascending, page * page_size, page_size)
+            else:
+                total = len(self.df)
+                if mode == 'head':
+                    positions = np.arange(min(page_size, total))
+                elif mode == 'sample':
+                    rng = np.random.default_rng(seed)
+                    positions = np.sort(rng.choice(total, min(page_size, total), replace=False))
+                elif mode == 'stratified':
+                    codes = self._cached((stratify_by, 'codes'), [stratify_by],
+                                         lambda: pd.factorize(self.df[stratify_by], use_na_sentinel=True)[0])
+                    positions = stratified_positions(codes, page_size, seed)
+                else:
+                    if sort_by is None and not filters:
+                        matching = None
+                    else:
+                        def compute():
+                            if sort_by is None:
+                                positions = np.arange(len(self.df))
+                            else:
+                                positions, _ = self._cached((sort_by, 'sort_order', ascending), [sort_by],
+                                                            lambda: sort_order(self.df[sort_by], ascending))
+                            if filters:
+                                positions = positions[filter_mask(self.df, filters)[positions]]
+                            return positions
+                        columns = ([sort_by] if sort_by is not None else []) + [f[0] for f in filters]
+                        matching = self._cached(('preview', sort_by, ascending, tuple(filters)), columns, compute)
+                        total = len(matching)
+                    n_pages = max(1, int(np.ceil(total / page_size)))
+                    page = min(page, n_pages - 1)
+                    start, stop = page * page_size, min((page + 1) * page_size, total)
+                    positions = np.arange(start, stop) if matching is None else matching[start:stop]
+                rows = self._take_rows(positions)
+            output = {"rows": rows,
+                      "total_rows": total,
+                      "page": page,
+                      "n_pages": n_pages,
+                      }
+            if mode == 'page':
+                status_msg = "Page %d of %d, %d matching rows" % (page + 1, n_pages, total)
+            else:
+                status_msg = "%d of %d rows" % (len(rows), total)
+            return self.return_status(0, status_msg, output=output)
+        except:
+            status_msg = "Preview of the data could not be performed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(117, status_msg, error_trace)
+
     def show_distribution(self, feature):
         """
         This function returns distribution plot
+        Histogram and binned KDE are computed server-side and cached until the feature changes.
 
         Parameters
         ----------
@@ -279,18 +1085,20 @@ class Data_Analytics():
 
         """
         try:
-            hist_data = [self.df[feature]]
-            group_labels = [feature]
-            fig = ff.create_distplot(hist_data, group_labels)
+            data = self._cached((feature, 'distribution'), [feature],
+                                lambda: distribution_data(self._valid_values(feature)))
+            fig = distribution_figure(data, feature)
             return self.return_status(0, output=fig)
         except:
             status_msg = "Plotting of distribution could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(110, status_msg, error_trace)
             
-    def show_trend(self, x_feature, y_feature):
+    def show_trend(self, x_feature, y_feature, mode='auto', max_points=5000):
         """
-        
+        Plots y_feature against x_feature with an OLS trendline.
+        The trendline is fitted on all rows in closed form and cached per x/y pair,
+        while at most max_points points are sent to the browser.
 
         Parameters
         ----------
@@ -298,6 +1106,11 @@ class Data_Analytics():
             Feature to be set as x-axis
         y_feature : str
             Feature to be set as y-axis.
+        mode : str, optional
+            'auto', 'full', 'lttb' (downsampled scatter) or 'density' (2D histogram).
+            The default is 'auto' which downsamples above max_points rows.
+        max_points : int, optional
+            Maximum number of points plotted. The default is 5000.
 
         Returns
         -------
@@ -306,16 +1119,107 @@ class Data_Analytics():
 
         """
         try:
-            fig = px.scatter(self.df, x=x_feature, y=y_feature, trendline="ols")
-            return self.return_status(0, output=fig)
+            x = self._column_array(x_feature)
+            y = self._column_array(y_feature)
+            valid = ~(np.isnan(x) | np.isnan(y))
+            x, y = x[valid], y[valid]
+            fit = self._cached(((x_feature, y_feature), 'ols'), [x_feature, y_feature],
+                               lambda: ols_fit(x, y))
+            fig, n_plotted = trend_figure(x, y, x_feature, y_feature, fit, mode=mode, max_points=max_points)
+            status_msg = "%d of %d points plotted" % (n_plotted, len(x)) if mode != 'density' else None
+            return self.return_status(0, status_msg, output=fig)
         except:
             status_msg = "Plotting of trendline could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(103, status_msg, error_trace)
         
-    def show_outliers(self, feature):
+    def show_correlations(self, method='pearson', chunk_size=100000, top=20):
+        """
+        Computes the correlation and the least squares line of every pair of continuous features
+        All pairs come from a few matrix products over chunks of rows, see stats_engine.pairwise_regression,
+        and are cached until a continuous feature changes. Every pair uses the rows where both
+        features are valid.
+
+        Parameters
+        ----------
+        method : str, optional
+            'pearson' correlates the values, 'spearman' their ranks, computed as in
+            DataFrame.corr over the rows where both features are valid, see
+            stats_engine.spearman_correlation. Slopes, intercepts and R² are always those of the
+            least squares fit of the values. The default is 'pearson'.
+        chunk_size : int, optional
+            Number of rows multiplied at a time. The default is 100000.
+        top : int, optional
+            Number of most correlated pairs listed. The default is 20.
+
+        Returns
+        -------
+        Dictionary
+            Contains the correlation matrix as a dataframe, the most correlated pairs with the
+            slope, intercept and R² of the fit of y on x, and the heatmap figure
+        """
+        try:
+            if method not in ('pearson', 'spearman'):
+                raise ValueError("method must be 'pearson' or 'spearman'")
+            columns = list(self.cont_var)
+
+            def regression():
+                chunks = (np.column_stack([to_float_array(chunk[c]) for c in columns])
+                          for chunk in self._iter_chunks(columns, chunk_size))
+                return pairwise_regression(chunks)
+            pairs = self._cached(("correlation", 'pearson'), columns, regression)
+            if not len(pairs["Correlation"]):
+                raise ValueError("No continuous features")
+            if method == 'pearson':
+                matrix = pairs["Correlation"]
+            else:
+                matrix = self._cached(("correlation", 'spearman'), columns,
+                                      lambda: spearman_correlation([self._column_array(c) for c in columns],
+                                                                   chunk_size))
+            correlation = pd.DataFrame(matrix, index=columns, columns=columns)
+            # every unordered pair once, strongest correlation first
+            x, y = np.triu_indices(len(columns), k=1)
+            trends = pd.DataFrame({"x": np.asarray(columns, dtype=object)[x],
+                                   "y": np.asarray(columns, dtype=object)[y],
+                                   "Correlation": matrix[x, y],
+                                   "Slope": pairs["Slope"][x, y],
+                                   "Intercept": pairs["Intercept"][x, y],
+                                   "R2": pairs["R2"][x, y],
+                                   "Count": pairs["Count"][x, y],
+                                   })
+            trends = trends.iloc[np.argsort(-np.nan_to_num(np.abs(trends["Correlation"].to_numpy())),
+                                            kind='stable')[:top]].reset_index(drop=True)
+            output = {"correlation": correlation,
+                      "trends": trends,
+                      "figure": correlation_figure(matrix, columns, pairs),
+                      }
+            status_msg = "%s correlation of %d features, %d pairs" % (method.capitalize(), len(columns),
+                                                                      len(columns) * (len(columns) - 1) // 2)
+            return self.return_status(0, status_msg, output=output)
+        except:
+            status_msg = "Correlations could not be computed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(120, status_msg, error_trace)
+
+    def show_outliers(self, feature, f=1.5, page=0, page_size=200, json_budget=None):
         """
         Performs data engineering - Plotting outliers using box and whisker method
+        Box statistics and histogram bins are computed server-side; only the rows flagged
+        as outliers are shipped as hover points, page_size rows at a time.
+
+        Parameters
+        ----------
+        feature : str
+            Pass the feature name
+        f : float, optional
+            Factor deciding whisker length. The default is 1.5.
+        page : int, optional
+            Page of outlier rows shown as hover points, starting at 0. The default is 0.
+        page_size : int, optional
+            Maximum number of outlier rows shown. The default is 200.
+        json_budget : int, optional
+            Maximum size of the figure JSON in bytes. Hover points are reduced until the
+            figure fits. The default is None which does not limit the size.
 
         Returns
         -------
@@ -325,8 +1229,30 @@ class Data_Analytics():
         """
         try:
             # plotting outliers using box and whisker 
-            fig = px.histogram(self.df, x=feature, marginal='box', hover_data=self.df.columns)
-            return self.return_status(0, output=fig)
+            def compute():
+                values = self._valid_values(feature)
+                box = box_statistics(values, f)
+                hist, edges = np.histogram(values, bins=self._cached((feature, 'distribution'), [feature],
+                                                                       lambda: distribution_data(values))["edges"])
+                column = self._column_array(feature)
+                rows = np.flatnonzero((column < box["lower"]) | (column > box["upper"]))
+                return box, hist, edges, rows
+            box, hist, edges, rows = self._cached((feature, 'outliers', f), [feature], compute)
+
+            n_pages = max(1, int(np.ceil(len(rows) / page_size)))
+            page = min(max(int(page), 0), n_pages - 1)
+            page_rows = rows[page * page_size:(page + 1) * page_size]
+            hover_columns = list(self._columns())
+            page_frame = self._take_rows(page_rows)
+            while True:
+                fig = outlier_figure(feature, box, hist, edges, page_frame.iloc[:len(page_rows)], hover_columns)
+                fig_size = len(fig.to_json())
+                if json_budget is None or fig_size <= json_budget or len(page_rows) == 0:
+                    break
+                page_rows = page_rows[:len(page_rows) // 2]
+            status_msg = "%d outliers, showing %d on page %d of %d, figure size %.1f kB" % (
+                len(rows), len(page_rows), page + 1, n_pages, fig_size / 1024)
+            return self.return_status(0, status_msg, output=fig)
         except:
             status_msg = "Plotting of outliers could not be performed"
             error_trace = ''.join(traceback.format_exc())
@@ -347,83 +1273,163 @@ class Data_Analytics():
         ----------
         remove_outliers : boolean, optional
             Removes outliers if True. The default is True. False - Do not remove outliers                                
-        imputation_method : list, optional
-            List of imputation method. The default is [] 
+        imputation_method : list or str, optional
+            List of imputation method, one per selected column, or a single method for all columns.
+            The default is [] which performs extreme value capping instead of imputation.
             mean - imputes outlier with mean 
             meadian - impute  outlier with median
             other methods are not supported now                                
         selected_columns : list, optional
             List of columns which should undergo outlier removal. The default is []
         lower_extreme : list, optional
-            List of lower extreme values of respective columns. The default is [].
+            List of lower extreme values of respective columns used for capping. The default is []
+            which caps at the lower whisker.
         higher_extreme : list, optional
-            List of higher extreme values of respective columns. The default is [].
+            List of higher extreme values of respective columns used for capping. The default is []
+            which caps at the upper whisker.
         f : factor deciding whisker length, Default is 1.3
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        Dictionary
+            Contains the limits and the number of values affected per column. Error code 109
+            when a list of methods or extremes does not have one entry per selected column.
 
         """
         try:
             status_msg=''
-            if remove_outliers == True:
-                # remove outliers using box and whisker
-                i=0
-                for k in selected_columns:
-                    #calculating 1st and 3rd quantile in q
-                    q = self.df[k].quantile([0.25, 0.75])
-                    #Calculating the whisker's Min and Max value in d
-                    d = list([q.iloc[0] - (f*(q.iloc[1]-q.iloc[0])), q.iloc[1] + (f*(q.iloc[1] - q.iloc[0]))])
-                    # replace the outlier values by nan
-                    self.df.loc[(self.df[k] < d[0]) | (self.df[k] > d[1]), k] = np.nan
+            counts = pd.DataFrame(columns=['Features', 'Lower limit', 'Upper limit', 'Values affected'])
+            if remove_outliers == True and len(selected_columns):
+                # all columns are processed as one block by the cleaning plan
+                plan = Cleaning_Plan()
+                if len(imputation_method):
+                    plan.handle_outliers(selected_columns, f=f, action='impute', method=imputation_method)
+                else:
+                    plan.handle_outliers(selected_columns, f=f, action='cap',
+                                         lower=lower_extreme, upper=higher_extreme)
+                report = self._run_plan(plan)
+                self._mark_dirty(report["modified_columns"])
+                self._commit("Outliers of %s %s" % (", ".join(map(str, selected_columns)),
+                                                     "imputed" if len(imputation_method) else "capped"))
+                counts = pd.DataFrame.from_dict(report["outliers"], orient='index')
+                counts = counts.rename_axis('Features').reset_index()
                 status_msg = status_msg + " Outlier removal is performed."
-                # Perform imputation
-                for k in selected_columns:
-                    if imputation_method != []:
-                        if imputation_method[i] == 'mean':
-                            self.df[k].fillna(value=self.df[k].mean(), inplace=True)
-                        elif imputation_method[i] == 'median':
-                            self.df[k].fillna(value=self.df[k].median(), inplace=True)
-
-                    else:
-                        #perform extreme value capping
-                        pass
-                status_msg = status_msg + " Imputation is performed."
-            return self.return_status(0, status_msg)
+                if len(imputation_method):
+                    status_msg = status_msg + " Imputation is performed."
+                else:
+                    status_msg = status_msg + " Extreme value capping is performed."
+            return self.return_status(0, status_msg, output=counts)
 
         except:
             status_msg = "Outlier removal or imputation could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(109, status_msg, error_trace)
     
-    def download_file(self, folder_path):
+    def download_file(self, folder_path=None, file_format='xlsx', index=True):
         """
         Downloads the data file
+        The file is written into memory and cached until the data changes, so repeated
+        downloads of an unchanged frame do not encode it again.
 
         Parameters
         ----------
-        folderpath : str
-            Folder path where the file to be downloaded
+        folderpath : str, optional
+            Folder path where the file to be downloaded. The default is None which
+            only returns the content, e.g. for st.download_button.
+        file_format : str, optional
+            'xlsx', 'csv', 'parquet' or 'feather', see export_engine.FRAME_WRITERS.
+            The default is 'xlsx'.
+        index : boolean, optional
+            Exports the index of the dataframe too. The default is True.
 
         Returns
         -------
-        dataframe
-            Dataframe which is converted and downloaded to the path
-
+        bytes
+            Content of the file
+            
         """
         try:
-            # Ensure output folder path exist
-            if not os.path.isdir(folder_path):
-                os.makedirs(folder_path)
-            file_path = os.path.join(folder_path, 'file.xlsx')    
-            self.df.to_excel(file_path)
-            df_copy = self.df
-            return self.return_status(0, output=df_copy)
+            content = self._cached(("export", file_format, index), self._columns(),
+                                   lambda: export_frame(self.df, file_format, index=index))
+            if folder_path is not None:
+                # Ensure output folder path exist
+                if not os.path.isdir(folder_path):
+                    os.makedirs(folder_path)
+                file_path = os.path.join(folder_path, 'file.' + file_format)
+                with open(file_path, 'wb') as file:
+                    file.write(content)
+            return self.return_status(0, output=content)
         except:
             status_msg = "Downloading of the file could not be performed"
             error_trace = ''.join(traceback.format_exc())
             return self.return_status(108, status_msg, error_trace)
         
-  
\ No newline at end of file
+  
+    def list_versions(self):
+        """
+        Lists the versions of the working dataset kept by the history
+
+        Returns
+        -------
+        Dictionary
+            Contains a dataframe with the version, its parent, the step which produced it,
+            its rows and columns, the commit time and whether it is the current version
+        """
+        try:
+            status_msg = "%d versions, %.1f MB" % (len(self.history), self.history.nbytes / 1e6)
+            return self.return_status(0, status_msg, output=self.history.log())
+        except:
+            status_msg = "Versions could not be listed"
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(119, status_msg, error_trace)
+
+    def revert_version(self, version_id):
+        """
+        Makes an earlier or later version of the working dataset current without reading the document again.
+        Cleaning the reverted data starts a new branch, the versions after it stay available.
+
+        Parameters
+        ----------
+        version_id : int
+            Version listed by list_versions
+
+        Returns
+        -------
+        Dictionary
+            Contains the version id
+        """
+        try:
+            version = self._restore(version_id)
+            status_msg = "Reverted to version %d: %s" % (version.version_id, version.label)
+            return self.return_status(0, status_msg, output=version.version_id)
+        except:
+            status_msg = "Version %s could not be restored" % (version_id,)
+            error_trace = ''.join(traceback.format_exc())
+            return self.return_status(118, status_msg, error_trace)
+
+    def undo(self):
+        """
+        Reverts the last cleaning step, see revert_version
+
+        Returns
+        -------
+        Dictionary
+            Contains the version id
+        """
+        if self.history.current is None or self.history.parent_of(self.history.current) is None:
+            return self.return_status(118, "Nothing to undo")
+        return self.revert_version(self.history.parent_of(self.history.current))
+
+    def redo(self):
+        """
+        Restores the step reverted last, or the latest step derived from the current version
+
+        Returns
+        -------
+        Dictionary
+            Contains the version id
+        """
+        child = None if self.history.current is None else self.history.latest_child(self.history.current)
+        if child is None:
+            return self.return_status(118, "Nothing to redo")
+        return self.revert_version(child)
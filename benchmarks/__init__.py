@@ -0,0 +1 @@
+"""Benchmarks of the Data_Analytics pipeline. Run the modules with python -m."""
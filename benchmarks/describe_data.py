@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the single-pass describe_data engine with the previous pandas implementation.
+
+Usage: python -m benchmarks.describe_data --rows 1000000
+"""
+
+#packages
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from backend_analytics_engine import Data_Analytics
+
+
+def make_frame(rows, n_cont=8, n_categ=3, seed=0):
+    """
+    Creates a synthetic frame with continuous and categorical columns
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows
+    n_cont : int, optional
+        Number of continuous columns. The default is 8.
+    n_categ : int, optional
+        Number of categorical columns, the last one has high cardinality. The default is 3.
+    seed : int, optional
+        Seed of the random generator. The default is 0.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Synthetic data
+    """
+    rng = np.random.default_rng(seed)
+    data = {"num_%d" % i: rng.normal(100, 15, rows) for i in range(n_cont)}
+    for i in range(n_categ - 1):
+        data["cat_%d" % i] = rng.choice(["North", "South", "East", "West", "Central"], rows)
+    data["cat_id"] = np.char.add("id_", rng.integers(0, rows // 2, rows).astype(str)).astype(object)
+    df = pd.DataFrame(data)
+    df.iloc[rng.integers(0, rows, rows // 100), 0] = np.nan
+    return df
+
+
+def legacy_describe(df, cont_var, categ_var):
+    """describe_data as implemented before the stats engine"""
+    cont_data_summary = pd.DataFrame(data=None, index=cont_var)
+    cont_data_summary = cont_data_summary.assign(Mean=df[cont_var].mean())
+    cont_data_summary = cont_data_summary.assign(Standard_Deviation=df[cont_var].std())
+    cont_data_summary = cont_data_summary.assign(Variance=df[cont_var].var())
+    cont_data_summary = cont_data_summary.assign(Min=df[cont_var].min())
+    cont_data_summary = cont_data_summary.assign(Max=df[cont_var].max())
+    cont_data_summary = cont_data_summary.assign(First_Quartile=df[cont_var].quantile(0.25))
+    cont_data_summary = cont_data_summary.assign(Median=df[cont_var].median())
+    cont_data_summary = cont_data_summary.assign(Third_Quartile=df[cont_var].quantile(0.75))
+    categ_data_summary = pd.DataFrame(data=None, index=categ_var)
+    categ_data_summary = categ_data_summary.assign(Count=df[categ_var].count())
+    categ_data_summary = categ_data_summary.assign(Count_of_Unique_Values=df[categ_var].nunique(axis=0))
+    categ_data_summary = categ_data_summary.assign(Mode=df[categ_var].mode().transpose()[0])
+    return cont_data_summary, categ_data_summary
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    da = Data_Analytics(disk_cache=False)
+    da.datasets = {"benchmark": make_frame(args.rows)}
+    da.select_dataset("benchmark")
+
+    legacy_time, (cont_old, categ_old) = best_of(
+        lambda: legacy_describe(da.df, da.cont_var, da.categ_var), args.repeat)
+    engine_time, output = best_of(da.describe_data, args.repeat)
+    cont_new = output["output"]["cont_data_summary"]
+    categ_new = output["output"]["categ_data_summary"]
+
+    pd.testing.assert_frame_equal(cont_old, cont_new, check_exact=False, rtol=1e-9)
+    pd.testing.assert_series_equal(categ_old["Mode"], categ_new["Mode"], check_dtype=False)
+    print("rows: %d" % args.rows)
+    print("legacy describe_data: %.3f s" % legacy_time)
+    print("engine describe_data: %.3f s" % engine_time)
+    print("speedup: %.1fx" % (legacy_time / engine_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic workbooks for the benchmarks.
+
+Usage: python -m benchmarks.generators --rows 100000 --format xlsx --output data.xlsx
+"""
+
+#packages
+import io
+import argparse
+import numpy as np
+import pandas as pd
+from export_engine import export_frame
+
+FOREIGN_LABELS = ["?", "-", "", "#"]
+
+
+def make_workbook_frame(rows,
+                        n_cont = 8,
+                        n_categ = 3,
+                        missing_rate = 0.01,
+                        cardinality = 5,
+                        outlier_rate = 0.005,
+                        foreign_rate = 0.001,
+                        seed = 0
+                        ):
+    """
+    Creates a synthetic dataset with continuous and categorical columns
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows
+    n_cont : int, optional
+        Number of continuous columns. The default is 8.
+    n_categ : int, optional
+        Number of categorical columns. The default is 3.
+    missing_rate : float, optional
+        Fraction of missing values in every column. The default is 0.01.
+    cardinality : int or list, optional
+        Number of distinct labels of the categorical columns, one value for all columns
+        or one per column. The default is 5.
+    outlier_rate : float, optional
+        Fraction of values of every continuous column moved far outside the whiskers.
+        The default is 0.005.
+    foreign_rate : float, optional
+        Fraction of foreign labels ("?", "-", ...) in every categorical column.
+        The default is 0.001.
+    seed : int, optional
+        Seed of the random generator. The default is 0.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Synthetic data
+    """
+    rng = np.random.default_rng(seed)
+    cardinalities = [cardinality] * n_categ if np.isscalar(cardinality) else list(cardinality)
+    data = {}
+    for i in range(n_cont):
+        values = rng.normal(100, 15, rows)
+        outliers = rng.random(rows) < outlier_rate
+        values[outliers] += rng.choice([-1, 1], int(outliers.sum())) * rng.uniform(100, 500, int(outliers.sum()))
+        values[rng.random(rows) < missing_rate] = np.nan
+        data["num_%d" % i] = values
+    for i, n_labels in enumerate(cardinalities):
+        labels = np.char.add("label_%d_" % i, np.arange(max(int(n_labels), 1)).astype(str)).astype(object)
+        # skewed label frequencies, as real categorical data
+        weights = 1 / np.arange(1, len(labels) + 1)
+        values = labels[rng.choice(len(labels), rows, p=weights / weights.sum())]
+        foreign = rng.random(rows) < foreign_rate
+        values[foreign] = rng.choice(np.array(FOREIGN_LABELS, dtype=object), int(foreign.sum()))
+        values[rng.random(rows) < missing_rate] = None
+        data["cat_%d" % i] = values
+    return pd.DataFrame(data)
+
+
+def make_workbook(df, file_format='xlsx'):
+    """
+    Writes a synthetic dataset as an uploaded document
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    file_format : str, optional
+        'xlsx', 'csv' or 'parquet'. The default is 'xlsx'.
+
+    Returns
+    -------
+    BytesIO
+        Document with a name attribute, as the uploaded files of the app
+    """
+    document = io.BytesIO(export_frame(df, file_format, index=False))
+    document.name = "benchmark." + file_format
+    return document
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--cont", type=int, default=8)
+    parser.add_argument("--categ", type=int, default=3)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--cardinality", type=int, default=5)
+    parser.add_argument("--outlier-rate", type=float, default=0.005)
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "csv", "parquet"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    df = make_workbook_frame(args.rows, args.cont, args.categ, args.missing_rate,
+                             args.cardinality, args.outlier_rate, seed=args.seed)
+    with open(args.output, "wb") as file:
+        file.write(make_workbook(df, args.format).getvalue())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the cold-start cost of the backend in fresh interpreters.
+
+Reports the import time of the modules loaded before the upload widget appears,
+checks that the plotting stack is not among the modules they import, and times
+the first plot with and without prewarming. The command fails when the import
+time exceeds the budget or a forbidden module is imported.
+
+Usage:
+    python -m benchmarks.import_time --budget 2.0 --output import_time.json
+"""
+
+#packages
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(" ".join(sorted(sys.modules)))
+"""
+
+FIRST_PLOT_SCRIPT = """
+import time
+import numpy as np
+import pandas as pd
+import plot_engine
+from backend_analytics_engine import Data_Analytics
+da = Data_Analytics(disk_cache=False, metrics=False)
+da.datasets = {{"benchmark": pd.DataFrame({{"x": np.random.default_rng(0).normal(size=10000)}})}}
+da.select_dataset("benchmark")
+if {prewarm}:
+    # the user is busy uploading while the thread imports plotly
+    plot_engine.prewarm().join()
+start = time.perf_counter()
+output = da.show_distribution("x")
+assert output["error_code"] == 0, output["error_trace"]
+print(time.perf_counter() - start)
+"""
+
+FORBIDDEN_MODULES = ("plotly", "scipy", "statsmodels")
+
+
+def run(script):
+    """Runs a script in a fresh interpreter from the repository root and returns its output lines"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.splitlines()
+
+
+def import_time(module, repeat=5):
+    """
+    Times the import of a module in fresh interpreters
+
+    Parameters
+    ----------
+    module : str
+        Name of the module
+    repeat : int, optional
+        Number of interpreters. The default is 5.
+
+    Returns
+    -------
+    dictionary
+        Best and median import time in seconds and the modules loaded by the import
+    """
+    timings = []
+    for _ in range(repeat):
+        seconds, modules = run(IMPORT_SCRIPT.format(module=module))
+        timings.append(float(seconds))
+    return {"seconds": min(timings),
+            "median_seconds": float(np.median(timings)),
+            "modules": modules.split(),
+            }
+
+
+def first_plot_time(prewarm, repeat=3):
+    """Best time of the first show_distribution call of fresh interpreters"""
+    return min(float(run(FIRST_PLOT_SCRIPT.format(prewarm=prewarm))[0]) for _ in range(repeat))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="*", default=["backend_analytics_engine"],
+                        help="modules imported before the first page is shown")
+    parser.add_argument("--forbidden", nargs="*", default=list(FORBIDDEN_MODULES),
+                        help="packages which must not be imported by those modules")
+    parser.add_argument("--budget", type=float, help="maximum import time in seconds of every module")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON file of the results, printed when omitted")
+    args = parser.parse_args(argv)
+
+    results = {"imports": {}, "first_plot": {}}
+    failures = []
+    for module in args.modules:
+        timing = import_time(module, args.repeat)
+        loaded = [m for m in timing.pop("modules")
+                  if any(m == f or m.startswith(f + ".") for f in args.forbidden)]
+        timing["forbidden_modules"] = loaded
+        results["imports"][module] = timing
+        print("import %-28s %8.4f s" % (module, timing["seconds"]), file=sys.stderr)
+        if loaded:
+            failures.append("%s imports %s" % (module, ", ".join(loaded[:5])))
+        if args.budget is not None and timing["seconds"] > args.budget:
+            failures.append("%s imports in %.3f s, budget %.3f s" % (module, timing["seconds"], args.budget))
+    for prewarm in (False, True):
+        name = "prewarmed" if prewarm else "cold"
+        results["first_plot"][name] = first_plot_time(prewarm)
+        print("first plot %-23s %8.4f s" % (name, results["first_plot"][name]), file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+    for failure in failures:
+        print("FAILED " + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Times and memory-profiles every step of the Data_Analytics pipeline on a synthetic workbook.
+
+Results are written as JSON. With --baseline, the run is compared with a stored
+run and the command fails when an operation got slower or used more memory than
+the thresholds allow.
+
+Usage:
+    python -m benchmarks.pipeline --rows 100000 --output run.json --save-baseline baseline.json
+    python -m benchmarks.pipeline --rows 100000 --output run.json --baseline baseline.json
+"""
+
+#packages
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from backend_analytics_engine import Data_Analytics
+from benchmarks.generators import make_workbook_frame, make_workbook
+
+
+def measure(setup, func, repeat=3):
+    """
+    Times an operation and measures its peak memory allocation
+
+    Timings are taken without tracing, tracemalloc slowing down Python-heavy code by
+    an order of magnitude; the peak allocation comes from one extra traced run.
+
+    Parameters
+    ----------
+    setup : callable
+        Called before every run, its result is passed to func and not measured
+    func : callable
+        Operation called with the result of setup
+    repeat : int, optional
+        Number of timed runs. The default is 3.
+
+    Returns
+    -------
+    dictionary
+        Best and median wall time in seconds, peak traced allocation in bytes and
+        the error code of the last run
+    """
+    timings, error_code = [], 0
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        output = func(state)
+        timings.append(time.perf_counter() - start)
+        if isinstance(output, dict) and "error_code" in output:
+            error_code = output["error_code"]
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    func(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(timings),
+            "median_seconds": float(np.median(timings)),
+            "peak_bytes": peak,
+            "error_code": error_code,
+            }
+
+
+def loaded(df, backend='pandas'):
+    """Returns a Data_Analytics instance holding a copy of df, without cached statistics"""
+    da = Data_Analytics(disk_cache=False, backend=backend)
+    da.datasets = {"benchmark": df.copy()}
+    da.select_dataset("benchmark")
+    return da
+
+
+def operations(df, file_format, backend='pandas'):
+    """
+    Returns the benchmarked operations
+
+    Every operation starts from a freshly loaded dataset, so cached statistics and
+    earlier cleaning do not make it look faster.
+
+    Returns
+    -------
+    dictionary
+        (setup, func) pairs by operation name
+    """
+    document = make_workbook(df, file_format)
+    cont = [c for c in df.columns if c.startswith("num_")]
+    fresh = lambda: loaded(df, backend)
+
+    def reader():
+        document.seek(0)
+        return Data_Analytics(disk_cache=False, backend=backend), document
+
+    return {"read_document": (reader, lambda state: state[0].read_document(state[1])),
+            "check_data_integrity": (fresh, lambda da: da.check_data_integrity()),
+            "keep_data_integrity": (fresh, lambda da: da.keep_data_integrity(remove_foreign_rows=True)),
+            "describe_data": (fresh, lambda da: da.describe_data()),
+            "describe_data_approximate": (fresh, lambda da: da.describe_data(approximate=True)),
+            "outlier_removal_imputation": (fresh, lambda da: da.outlier_removal_imputation(
+                imputation_method='median', selected_columns=cont)),
+            "show_distribution": (fresh, lambda da: da.show_distribution(cont[0])),
+            "show_trend": (fresh, lambda da: da.show_trend(cont[0], cont[1])),
+            "show_outliers": (fresh, lambda da: da.show_outliers(cont[0])),
+            "show_correlations": (fresh, lambda da: da.show_correlations()),
+            "download_file": (fresh, lambda da: da.download_file(file_format='xlsx')),
+            }
+
+
+def compare(results, baseline, time_threshold=0.2, memory_threshold=0.2, min_seconds=0.01):
+    """
+    Compares results with a baseline run
+
+    Parameters
+    ----------
+    results : dictionary
+        Operations of the current run
+    baseline : dictionary
+        Operations of the baseline run
+    time_threshold : float, optional
+        Allowed relative increase of the best time. The default is 0.2.
+    memory_threshold : float, optional
+        Allowed relative increase of the peak memory. The default is 0.2.
+    min_seconds : float, optional
+        Operations faster than this in both runs are not compared on time, their
+        timings being mostly noise. The default is 0.01.
+
+    Returns
+    -------
+    list
+        Dictionaries describing every regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if max(current["seconds"], previous["seconds"]) >= min_seconds \
+                and current["seconds"] > previous["seconds"] * (1 + time_threshold):
+            regressions.append({"operation": name, "metric": "seconds",
+                                "baseline": previous["seconds"], "current": current["seconds"]})
+        if current["peak_bytes"] > previous["peak_bytes"] * (1 + memory_threshold):
+            regressions.append({"operation": name, "metric": "peak_bytes",
+                                "baseline": previous["peak_bytes"], "current": current["peak_bytes"]})
+        if current["error_code"] != 0:
+            regressions.append({"operation": name, "metric": "error_code",
+                                "baseline": previous["error_code"], "current": current["error_code"]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--cont", type=int, default=8)
+    parser.add_argument("--categ", type=int, default=3)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--cardinality", type=int, default=5)
+    parser.add_argument("--outlier-rate", type=float, default=0.005)
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "csv", "parquet"])
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "duckdb"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="names of the operations to run")
+    parser.add_argument("--output", help="JSON file of the results, printed when omitted")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    parser.add_argument("--save-baseline", help="also stores the results as a baseline")
+    parser.add_argument("--time-threshold", type=float, default=0.2)
+    parser.add_argument("--memory-threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    df = make_workbook_frame(args.rows, args.cont, args.categ, args.missing_rate,
+                             args.cardinality, args.outlier_rate)
+    results = {}
+    for name, (setup, func) in operations(df, args.format, args.backend).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(setup, func, args.repeat)
+        results[name].update(rows=len(df), columns=len(df.columns))
+        print("%-28s %9.4f s %10.1f MB" % (name, results[name]["seconds"], results[name]["peak_bytes"] / 1e6),
+              file=sys.stderr)
+
+    run = {"parameters": {k: v for k, v in vars(args).items()
+                          if k not in ("output", "baseline", "save_baseline", "only")},
+           "environment": {"python": platform.python_version(),
+                           "platform": platform.platform(),
+                           "numpy": np.__version__,
+                           "pandas": __import__("pandas").__version__,
+                           },
+           "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "operations": results,
+           }
+    text = json.dumps(run, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            file.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("parameters") != run["parameters"]:
+            print("warning: baseline was recorded with different parameters", file=sys.stderr)
+        regressions = compare(results, baseline["operations"], args.time_threshold, args.memory_threshold)
+        for regression in regressions:
+            print("REGRESSION %(operation)s %(metric)s: %(baseline)s -> %(current)s" % regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
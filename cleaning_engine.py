@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized data cleaning used by Data_Analytics.
+
+Cleaning steps are declared in a Cleaning_Plan and executed together with a
+single row mask and a single materialization of the cleaned frame.
+"""
+
+#packages
+import time
+import numpy as np
+import pandas as pd
+from stats_engine import column_mode, to_float_array
+
+# A value is foreign when it is a string without any word character, e.g. "?", "-" or ""
+FOREIGN_PATTERN = r'\w'
+
+
+def foreign_value_mask(series):
+    """
+    Flags the foreign values of a categorical column
+
+    Every distinct value is checked once and the result is mapped back to the
+    rows through the category codes, so the cost grows with the number of
+    distinct values rather than the number of rows.
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Categorical column, object or category dtype
+
+    Returns
+    -------
+    numpy array
+        Boolean mask, True for the rows holding a foreign value
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return np.zeros(len(series), dtype=bool)
+    # only strings can be foreign, the regex runs on the string uniques alone
+    uniques = np.asarray(uniques, dtype=object)
+    is_string = np.fromiter((isinstance(v, str) for v in uniques), dtype=bool, count=len(uniques))
+    foreign_uniques = np.zeros(len(uniques), dtype=bool)
+    if is_string.any():
+        has_word = pd.Series(uniques[is_string]).str.contains(FOREIGN_PATTERN, regex=True)
+        foreign_uniques[is_string] = ~has_word.to_numpy(dtype=bool)
+    if not foreign_uniques.any():
+        return np.zeros(len(series), dtype=bool)
+    return np.where(codes >= 0, foreign_uniques[codes], False)
+
+
+def _fill_value(series, method):
+    # Value imputed in a column, computed on the retained valid values
+    if method == 'mean':
+        return series.mean()
+    if method == 'median':
+        return series.median()
+    if method == 'mode':
+        return column_mode(series)
+    raise ValueError("Unsupported imputation method: %s" % method)
+
+
+class Cleaning_Plan():
+    """
+    Declarative list of cleaning steps compiled into a minimal set of vectorized operations
+
+    Steps are recorded in order and nothing is computed until execute is called.
+    Execution builds one combined row mask for every drop, one dictionary of
+    imputation values and materializes the cleaned frame once. Values missing
+    before cleaning and values invalidated as foreign or outliers are imputed
+    with the method of their own step, e.g. missing values with the mean and
+    outliers of the same column with the median.
+
+    Attributes
+    ----------
+    steps : list
+        Dictionaries describing the steps, see the add methods
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self):
+        self.steps = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def drop_missing(self, columns):
+        """
+        Removes the rows with missing values in any of the columns
+
+        Parameters
+        ----------
+        columns : list
+            Columns checked for missing values
+        """
+        self.steps.append({"step": "drop_missing", "columns": list(columns)})
+        return self
+
+    def impute_missing(self, columns, method):
+        """
+        Imputes the missing values of the columns
+
+        Parameters
+        ----------
+        columns : list
+            Columns to be imputed
+        method : str
+            'mean', 'median' or 'mode'
+        """
+        self.steps.append({"step": "impute_missing", "columns": list(columns), "method": method})
+        return self
+
+    def handle_foreign(self, columns, action='impute', method='mode'):
+        """
+        Treats foreign values (strings without any word character) of the columns
+
+        Parameters
+        ----------
+        columns : list
+            Categorical columns checked for foreign values
+        action : str, optional
+            'drop' removes the rows, 'impute' replaces the values. The default is 'impute'.
+        method : str, optional
+            Imputation method when action is 'impute'. The default is 'mode'.
+        """
+        self.steps.append({"step": "foreign", "columns": list(columns), "action": action, "method": method})
+        return self
+
+    def handle_outliers(self, columns, f=1.3, action='impute', method='mean', lower=None, upper=None):
+        """
+        Treats the values outside the box and whisker limits of the columns
+
+        Parameters
+        ----------
+        columns : list
+            Continuous columns
+        f : float, optional
+            Factor deciding whisker length. The default is 1.3.
+        action : str, optional
+            'drop' removes the rows, 'impute' replaces the values, 'cap' clips the
+            values to the limits. The default is 'impute'.
+        method : str or list, optional
+            Imputation method, or one method per column. The default is 'mean'.
+        lower : list, optional
+            Lower limit of every column when action is 'cap'. None entries, or None,
+            use the lower whisker. The default is None.
+        upper : list, optional
+            Upper limit of every column when action is 'cap'. None entries, or None,
+            use the upper whisker. The default is None.
+
+        Raises
+        ------
+        ValueError
+            If a list of methods or limits does not have one entry per column
+        """
+        columns = list(columns)
+        methods = [method] * len(columns) if isinstance(method, str) else list(method)
+        lower = list(lower) if lower else [None] * len(columns)
+        upper = list(upper) if upper else [None] * len(columns)
+        for name, values in (("method", methods), ("lower", lower), ("upper", upper)):
+            if len(values) != len(columns):
+                raise ValueError("%s has %d entries for %d columns" % (name, len(values), len(columns)))
+        self.steps.append({"step": "outliers", "columns": columns, "f": f,
+                           "action": action, "method": methods,
+                           "lower": lower, "upper": upper,
+                           })
+        return self
+
+    def execute(self, df):
+        """
+        Executes the plan on a dataframe without modifying it
+
+        Parameters
+        ----------
+        df : Pandas DataFrame
+            Data to be cleaned
+
+        Returns
+        -------
+        tuple
+            Cleaned dataframe and report dictionary with the rows removed, the number
+            of imputed values per column, the limits and number of outliers per column,
+            the modified columns and the timings of every phase in seconds
+        """
+        timings = {}
+        n_rows = len(df)
+
+        # 1. values that become missing: foreign labels and outliers
+        start = time.perf_counter()
+        invalid = {}
+        drop_mask = np.zeros(n_rows, dtype=bool)
+        # imputation method of every (column, source), 'missing' for the values missing
+        # before cleaning and 'invalid' for the foreign values and outliers
+        methods = {}
+        for step in self.steps:
+            if step["step"] == "foreign":
+                for col in step["columns"]:
+                    mask = foreign_value_mask(df[col])
+                    if step["action"] == "drop":
+                        drop_mask |= mask
+                    elif mask.any():
+                        invalid[col] = invalid[col] | mask if col in invalid else mask
+                        methods[(col, 'invalid')] = step["method"]
+        timings["detect_foreign"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        capped = {}
+        outliers = {}
+        for step in self.steps:
+            if step["step"] == "outliers" and step["columns"]:
+                columns = step["columns"]
+                # all quartiles of the column block in a single call
+                q = df[columns].quantile([0.25, 0.75]).to_numpy(dtype=np.float64)
+                iqr = q[1] - q[0]
+                lower = q[0] - step["f"] * iqr
+                upper = q[1] + step["f"] * iqr
+                if step["action"] == "cap":
+                    lower = np.array([l if c is None else c for l, c in zip(lower, step["lower"])], dtype=np.float64)
+                    upper = np.array([u if c is None else c for u, c in zip(upper, step["upper"])], dtype=np.float64)
+                # one vectorized comparison for the whole block
+                values = np.column_stack([to_float_array(df[col]) for col in columns])
+                masks = (values < lower) | (values > upper)
+                if step["action"] == "cap":
+                    values = np.clip(values, lower, upper)
+                for j, (col, method) in enumerate(zip(columns, step["method"])):
+                    mask = masks[:, j]
+                    outliers[col] = {"Lower limit": lower[j], "Upper limit": upper[j], "Values affected": int(mask.sum())}
+                    if step["action"] == "drop":
+                        drop_mask |= mask
+                    elif step["action"] == "cap":
+                        if mask.any():
+                            capped[col] = values[:, j]
+                    elif mask.any():
+                        invalid[col] = invalid[col] | mask if col in invalid else mask
+                        methods[(col, 'invalid')] = method
+        timings["detect_outliers"] = time.perf_counter() - start
+
+        # 2. one combined row mask for every drop
+        start = time.perf_counter()
+        for step in self.steps:
+            if step["step"] == "drop_missing" and step["columns"]:
+                drop_mask |= df[step["columns"]].isna().to_numpy().any(axis=1)
+            elif step["step"] == "impute_missing":
+                for col in step["columns"]:
+                    methods[(col, 'missing')] = step["method"]
+        # without an imputation step the missing values are filled like the invalid ones
+        for col in invalid:
+            methods.setdefault((col, 'missing'), methods[(col, 'invalid')])
+        keep = ~drop_mask
+        rows_removed = int(drop_mask.sum())
+        timings["row_mask"] = time.perf_counter() - start
+
+        # 3. one dictionary of imputation values computed on the retained valid values
+        start = time.perf_counter()
+        fill_values = {}
+        for col in dict.fromkeys(col for col, _ in methods):
+            series = df[col]
+            missing = series.isna().to_numpy()
+            bad = {'missing': missing & keep}
+            if col in invalid:
+                bad['invalid'] = invalid[col] & keep
+                missing = missing | invalid[col]
+            valid = None
+            values = {}
+            for source, mask in bad.items():
+                if not mask.any():
+                    continue
+                method = methods[(col, source)]
+                if method not in values:
+                    # both sources are imputed from the same retained valid values
+                    if valid is None:
+                        valid = series[keep & ~missing]
+                    values[method] = _fill_value(valid, method)
+                fill_values[(col, source)] = values[method]
+        timings["fill_values"] = time.perf_counter() - start
+
+        # 4. single materialization: one row take, then only imputed columns are replaced
+        start = time.perf_counter()
+        result = df.take(np.flatnonzero(keep)) if rows_removed else df.copy(deep=False)
+        imputed = {}
+        for col in dict.fromkeys(col for col, _ in fill_values):
+            series = result[col]
+            n_imputed = 0
+            if (col, 'missing') in fill_values:
+                n_imputed += int(series.isna().sum())
+                series = series.fillna(fill_values[(col, 'missing')])
+            if (col, 'invalid') in fill_values:
+                mask = invalid[col][keep] if rows_removed else invalid[col]
+                n_imputed += int(mask.sum())
+                series = series.mask(mask, fill_values[(col, 'invalid')])
+            imputed[col] = n_imputed
+            result[col] = series
+        for col, values in capped.items():
+            result[col] = values[keep] if rows_removed else values
+        timings["materialize"] = time.perf_counter() - start
+
+        report = {"rows_removed": rows_removed,
+                  "imputed": imputed,
+                  "outliers": outliers,
+                  "modified_columns": list(dict.fromkeys([col for col, _ in fill_values] + list(capped))),
+                  "timings": timings,
+                  }
+        return result, report
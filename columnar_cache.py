@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar on-disk cache of ingested documents.
+
+Every ingested dataframe is written once as an uncompressed Feather (Arrow
+IPC) file named after the digest of the uploaded document. Re-uploads of the
+same document memory-map that file instead of parsing the workbook again.
+"""
+
+#packages
+import os
+import time
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the cache is disabled without pyarrow
+    pa = None
+    feather = None
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "excel_data_analyzer_cache")
+
+
+class Columnar_Cache():
+    """
+    Feather file cache keyed by document digest with a size cap and a TTL
+
+    Attributes
+    ----------
+    cache_dir : str
+        Folder holding the cached files
+    max_bytes : int
+        Size cap of the cache folder in bytes
+    ttl : float or None
+        Seconds after which an unused entry expires. None disables expiry.
+    hits : int
+        Number of successful lookups
+    misses : int
+        Number of failed lookups
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    suffix = ".feather"
+
+    def __init__(self, cache_dir=None, max_bytes=5 << 30, ttl=7 * 24 * 3600):
+        """
+        Constructs/define all the necessary attributes of the cache
+
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Folder holding the cached files. The default is a folder in the
+            system temporary directory.
+        max_bytes : int, optional
+            Size cap of the cache folder in bytes. The default is 5 GiB.
+        ttl : float, optional
+            Seconds after which an unused entry expires. The default is 7 days.
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        """True when pyarrow is available"""
+        return feather is not None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def _entries(self):
+        # (path, size, last access) of every cached file
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _expired(self, last_access, now=None):
+        if self.ttl is None:
+            return False
+        return (now or time.time()) - last_access > self.ttl
+
+    def get(self, key):
+        """
+        Loads a cached dataframe
+
+        Parameters
+        ----------
+        key : str
+            Digest of the document
+
+        Returns
+        -------
+        Pandas DataFrame or None
+            Cached dataframe, None when missing or expired
+        """
+        path = self._path(key)
+        if not self.enabled or not os.path.isfile(path):
+            self.misses += 1
+            return None
+        if self._expired(os.stat(path).st_mtime):
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            table = feather.read_table(path, memory_map=True)
+            df = table.to_pandas(split_blocks=True)
+        except (OSError, pa.ArrowException):
+            self._remove(path)
+            self.misses += 1
+            return None
+        # modification time doubles as last access time for LRU eviction
+        os.utime(path, None)
+        self.hits += 1
+        return df
+
+    def put(self, key, df):
+        """
+        Writes a dataframe to the cache
+
+        Parameters
+        ----------
+        key : str
+            Digest of the document
+        df : Pandas DataFrame
+            Data to be cached
+
+        Returns
+        -------
+        boolean
+            True if the dataframe was cached. Frames Arrow cannot represent
+            (non string headers, mixed type object columns) are skipped.
+        """
+        if not self.enabled or not all(isinstance(c, str) for c in df.columns):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+        except (OSError, ValueError, TypeError, pa.ArrowException):
+            self._remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used ones above the size cap
+
+        Returns
+        -------
+        int
+            Number of removed entries
+        """
+        now = time.time()
+        removed = 0
+        entries = []
+        for path, size, last_access in self._entries():
+            if self._expired(last_access, now):
+                removed += self._remove(path)
+            else:
+                entries.append((path, size, last_access))
+        entries.sort(key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        while entries and total > self.max_bytes:
+            path, size, _ = entries.pop(0)
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    def clear(self):
+        """Removes every cached file"""
+        return sum(self._remove(path) for path, _, _ in self._entries())
+
+    def stats(self):
+        """
+        Returns the cache statistics
+
+        Returns
+        -------
+        dictionary
+            Folder, number of entries, size on disk, limits, hits and misses
+        """
+        entries = self._entries()
+        return {"enabled": self.enabled,
+                "cache_dir": self.cache_dir,
+                "entries": len(entries),
+                "bytes": sum(e[1] for e in entries),
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Content-hash keyed cache of parsed datasets.
+
+Streamlit reruns main.py on every widget interaction. The cache keeps the
+parsed Data_Analytics objects alive between reruns so a workbook is parsed
+once per upload instead of once per click.
+"""
+
+#packages
+import os
+import hashlib
+from collections import OrderedDict
+
+
+def content_digest(data, chunk_size=1 << 20):
+    """
+    Computes the digest of the uploaded content
+
+    Parameters
+    ----------
+    data : bytes, str or file-like object
+        Content of the document or its path. Files are read in chunks and
+        file-like objects are rewound afterwards.
+    chunk_size : int, optional
+        Number of bytes hashed at a time. The default is 1 MiB.
+
+    Returns
+    -------
+    str
+        Hex digest of the content
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        hasher.update(data)
+        return hasher.hexdigest()
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, "rb") as document:
+            return content_digest(document, chunk_size)
+    position = data.tell() if hasattr(data, "tell") else None
+    if hasattr(data, "seek"):
+        data.seek(0)
+    while True:
+        chunk = data.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    if position is not None:
+        data.seek(position)
+    return hasher.hexdigest()
+
+
+class Data_Cache():
+    """
+    LRU cache of datasets keyed by content digest with a memory budget
+
+    Attributes
+    ----------
+    max_entries : int
+        Maximum number of datasets kept in the cache
+    max_bytes : int
+        Memory budget of the cache in bytes
+    hits : int
+        Number of successful lookups
+    misses : int
+        Number of failed lookups
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, max_entries=4, max_bytes=1 << 30):
+        """
+        Constructs/define all the necessary attributes of the cache
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            Maximum number of datasets kept in the cache. The default is 4.
+        max_bytes : int, optional
+            Memory budget of the cache in bytes. The default is 1 GiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        """Memory currently accounted to the cached datasets"""
+        return sum(size for _, size in self._entries.values())
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value and marks it as recently used
+
+        Parameters
+        ----------
+        key : str
+            Content digest of the dataset
+        default : any type, optional
+            Returned when the key is not cached. The default is None.
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value, size=None):
+        """
+        Adds a value to the cache and evicts least recently used entries
+
+        Parameters
+        ----------
+        key : str
+            Content digest of the dataset
+        value : any type
+            Object to be cached, usually a Data_Analytics instance
+        size : int, optional
+            Memory used by the value in bytes. Estimated from value.df when None.
+
+        Returns
+        -------
+        list
+            Keys evicted to stay within the budget
+        """
+        if size is None:
+            size = self.estimate_size(value)
+        self._entries[key] = (value, int(size))
+        self._entries.move_to_end(key)
+        return self._evict(keep=key)
+
+    def resize(self, key, size=None):
+        """
+        Updates the accounted memory of a cached value after it has changed
+
+        Parameters
+        ----------
+        key : str
+            Content digest of the dataset
+        size : int, optional
+            New memory used by the value. Estimated from value.df when None.
+        """
+        if key not in self._entries:
+            return []
+        value = self._entries[key][0]
+        return self.put(key, value, size)
+
+    def pop(self, key, default=None):
+        """Removes a value from the cache and returns it"""
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Removes every cached value"""
+        self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache statistics
+
+        Returns
+        -------
+        dictionary
+            Number of entries, accounted bytes, hits and misses
+        """
+        return {"entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                }
+
+    @staticmethod
+    def estimate_size(value):
+        """Estimates the memory used by the dataframe held by the value"""
+        if getattr(value, "table", None) is not None:
+            # the duckdb backend keeps the data on disk
+            return 0
+        df = getattr(value, "df", None)
+        if df is None:
+            return 0
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def _evict(self, keep=None):
+        # Drop least recently used entries until both limits are met. The
+        # most recent entry is kept even if it alone exceeds the budget.
+        evicted = []
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                           or self.total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._entries.popitem(last=False)
+            evicted.append(key)
+        return evicted
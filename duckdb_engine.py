@@ -0,0 +1,772 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-core execution of Data_Analytics operations with DuckDB.
+
+With the duckdb backend the working dataset is kept as a Parquet file instead
+of a pandas frame. Missing value counts, descriptive statistics, cleaning plans
+and outlier handling are compiled into SQL queries which DuckDB runs on all
+cores, reading only the columns and row groups a query needs, so the data does
+not have to fit in memory.
+"""
+
+#packages
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from stats_engine import CONT_STATS
+
+try:
+    import duckdb
+except ImportError:  # the duckdb backend is unavailable without duckdb
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # dataframes are handed to DuckDB directly without pyarrow
+    pa = None
+    pq = None
+
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "excel_data_analyzer_tables")
+
+# SQL equivalent of cleaning_engine.FOREIGN_PATTERN: RE2's \w only matches ASCII word characters
+FOREIGN_SQL_PATTERN = r'[\p{L}\p{N}_]'
+
+CONTINUOUS_TYPES = ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UTINYINT', 'USMALLINT',
+                    'UINTEGER', 'UBIGINT', 'FLOAT', 'DOUBLE', 'DECIMAL', 'BOOLEAN')
+CATEGORICAL_TYPES = ('VARCHAR', 'ENUM')
+
+
+def quote(name):
+    """Quotes a column name as an SQL identifier"""
+    return '"%s"' % str(name).replace('"', '""')
+
+
+def literal(value):
+    """
+    Converts a Python value into an SQL literal
+
+    Parameters
+    ----------
+    value : any type
+        Number, string, boolean, timestamp or missing value
+
+    Returns
+    -------
+    str
+        SQL literal, NULL for missing values
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return "NULL"
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return "CAST('%r' AS DOUBLE)" % float(value)
+    if isinstance(value, pd.Timestamp):
+        return "TIMESTAMP '%s'" % value.isoformat(sep=' ')
+    return "'%s'" % str(value).replace("'", "''")
+
+
+def _null_to_nan(value):
+    return np.nan if value is None else value
+
+
+def _arrow_table(df):
+    # Parquet needs string column names and one type per column; mixed object
+    # columns, e.g. numbers with "?" labels, are written as text
+    df = df.rename(columns=str).reset_index(drop=True)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy(deep=False)
+        for col in df.columns:
+            if df[col].dtype == object:
+                try:
+                    pa.array(df[col], from_pandas=True)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class Parquet_Table():
+    """
+    Dataset stored in a Parquet file and queried lazily with DuckDB
+
+    Attributes
+    ----------
+    path : str
+        Parquet file holding the current version of the data
+    owned : boolean
+        True if the file was written by the table and is deleted with it
+    version : int
+        Incremented whenever a cleaning plan rewrites the file
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, path, owned=False, work_dir=None, threads=None, memory_limit=None):
+        """
+        Constructs/define all the necessary attributes of the table
+
+        Parameters
+        ----------
+        path : str
+            Parquet file holding the data
+        owned : boolean, optional
+            Deletes the file when it is replaced or the table is closed. The default is False.
+        work_dir : str, optional
+            Folder of the files written by the table. The default is a folder in the
+            system temporary directory.
+        threads : int, optional
+            Number of DuckDB threads. The default is None which uses every core.
+        memory_limit : str, optional
+            DuckDB memory limit, e.g. '2GB', above which DuckDB spills to disk.
+            The default is None which uses the DuckDB default.
+        """
+        if duckdb is None:
+            raise ImportError("The duckdb backend requires the duckdb package")
+        self.path = os.fspath(path)
+        self.owned = owned
+        self.work_dir = work_dir or DEFAULT_WORK_DIR
+        self.version = 0
+        self._schema = None
+        self._con = duckdb.connect()
+        if threads:
+            self._con.execute("SET threads = %d" % int(threads))
+        if memory_limit:
+            self._con.execute("SET memory_limit = %s" % literal(memory_limit))
+
+    @classmethod
+    def _new_path(cls, work_dir):
+        work_dir = work_dir or DEFAULT_WORK_DIR
+        os.makedirs(work_dir, exist_ok=True)
+        return os.path.join(work_dir, uuid.uuid4().hex + ".parquet")
+
+    @classmethod
+    def from_frame(cls, df, work_dir=None, **kwargs):
+        """
+        Writes a dataframe to a Parquet file and returns the table over it
+
+        Parameters
+        ----------
+        df : Pandas DataFrame
+            Data, the index is not kept
+        work_dir : str, optional
+            Folder of the Parquet file. The default is None.
+        **kwargs
+            Passed to the constructor
+
+        Returns
+        -------
+        Parquet_Table
+            Table owning the written file
+        """
+        path = cls._new_path(work_dir)
+        if pq is not None:
+            pq.write_table(_arrow_table(df), path)
+        else:
+            con = duckdb.connect()
+            frame = df.rename(columns=str).reset_index(drop=True)
+            con.register("frame", frame)
+            con.execute("COPY frame TO %s (FORMAT parquet)" % literal(path))
+            con.close()
+        return cls(path, owned=True, work_dir=work_dir, **kwargs)
+
+    @classmethod
+    def from_document(cls, document, file_format, work_dir=None, **kwargs):
+        """
+        Creates the table from a CSV or Parquet document without loading it into pandas
+
+        Parameters
+        ----------
+        document : str or file-like object
+            Path of the document or uploaded file
+        file_format : str
+            'csv' or 'parquet'
+        work_dir : str, optional
+            Folder of the written files. The default is None.
+        **kwargs
+            Passed to the constructor
+
+        Returns
+        -------
+        Parquet_Table
+            Table over the document, or over a Parquet copy of it
+        """
+        spilled = None
+        if isinstance(document, (str, os.PathLike)):
+            source = os.fspath(document)
+        else:
+            # uploaded files are copied to disk in chunks so DuckDB can scan them
+            spilled = cls._new_path(work_dir)[:-len(".parquet")] + "." + file_format
+            if hasattr(document, "seek"):
+                document.seek(0)
+            with open(spilled, "wb") as file:
+                shutil.copyfileobj(document, file, 1 << 20)
+            source = spilled
+        if file_format == "parquet":
+            return cls(source, owned=spilled is not None, work_dir=work_dir, **kwargs)
+        path = cls._new_path(work_dir)
+        con = duckdb.connect()
+        try:
+            con.execute("COPY (SELECT * FROM read_csv_auto(%s)) TO %s (FORMAT parquet)"
+                        % (literal(source), literal(path)))
+        finally:
+            con.close()
+            if spilled is not None:
+                os.remove(spilled)
+        return cls(path, owned=True, work_dir=work_dir, **kwargs)
+
+    @property
+    def source(self):
+        """SQL table expression scanning the Parquet file"""
+        return "read_parquet(%s)" % literal(self.path)
+
+    def _execute(self, sql):
+        # every query runs on its own cursor so that background jobs and reruns can query concurrently
+        return self._con.cursor().execute(sql)
+
+    @property
+    def schema(self):
+        """DuckDB type of every column"""
+        if self._schema is None:
+            rows = self._execute("DESCRIBE SELECT * FROM %s" % self.source).fetchall()
+            self._schema = {row[0]: row[1] for row in rows}
+        return self._schema
+
+    @property
+    def columns(self):
+        """Names of the columns"""
+        return pd.Index(list(self.schema))
+
+    def __len__(self):
+        return int(self._execute("SELECT count(*) FROM %s" % self.source).fetchone()[0])
+
+    def _is_type(self, column, types):
+        return self.schema[column].split('(')[0] in types
+
+    def continuous_columns(self):
+        """Numeric and boolean columns"""
+        return pd.Index([col for col in self.schema if self._is_type(col, CONTINUOUS_TYPES)])
+
+    def categorical_columns(self):
+        """Text columns"""
+        return pd.Index([col for col in self.schema if self._is_type(col, CATEGORICAL_TYPES)])
+
+    def missing_counts(self, columns):
+        """
+        Counts the missing values of the columns in one scan
+
+        Parameters
+        ----------
+        columns : list
+            Columns to be checked
+
+        Returns
+        -------
+        list
+            Dictionaries with the missing values count of every column
+        """
+        columns = list(columns)
+        if not columns:
+            return []
+        select = ", ".join("count(*) - count(%s)" % quote(col) for col in columns)
+        row = self._execute("SELECT %s FROM %s" % (select, self.source)).fetchone()
+        return [{'Missing': int(value)} for value in row]
+
+    def continuous_stats(self, columns):
+        """
+        Computes the summary statistics of continuous columns in one scan
+
+        Parameters
+        ----------
+        columns : list
+            Continuous columns
+
+        Returns
+        -------
+        list
+            Dictionaries with the values of CONT_STATS and the missing values count, see
+            stats_engine.continuous_column_stats
+        """
+        columns = list(columns)
+        if not columns:
+            return []
+        select = []
+        for col in columns:
+            x = "CAST(%s AS DOUBLE)" % quote(col)
+            select.append("count(*) - count(%s), avg(%s), var_samp(%s), min(%s), max(%s), "
+                          "quantile_cont(%s, [0.25, 0.5, 0.75])" % (x, x, x, x, x, x))
+        row = self._execute("SELECT %s FROM %s" % (", ".join(select), self.source)).fetchone()
+        result = []
+        for i in range(len(columns)):
+            missing, mean, variance, q_min, q_max, quartiles = row[6 * i:6 * i + 6]
+            stats = dict.fromkeys(CONT_STATS, np.nan)
+            stats['Missing'] = int(missing)
+            if mean is not None:
+                variance = _null_to_nan(variance)
+                stats.update(Mean=mean,
+                             Standard_Deviation=np.sqrt(variance),
+                             Variance=variance,
+                             Min=q_min,
+                             Max=q_max,
+                             First_Quartile=quartiles[0],
+                             Median=quartiles[1],
+                             Third_Quartile=quartiles[2])
+            result.append(stats)
+        return result
+
+    def grouped_continuous_stats(self, group_by, columns, dropna=True):
+        """
+        Computes the summary statistics of continuous columns for every group in one aggregation
+
+        Parameters
+        ----------
+        group_by : list
+            Grouping columns
+        columns : list
+            Continuous columns
+        dropna : boolean, optional
+            Leaves out the rows with a missing key if True. The default is True.
+
+        Returns
+        -------
+        tuple
+            Dataframe of the keys of every group, sorted by the keys, and one dictionary
+            of per-group arrays per column, see stats_engine.grouped_continuous_stats
+        """
+        group_by, columns = list(group_by), list(columns)
+        keys = ", ".join(quote(g) for g in group_by)
+        select = []
+        for col in columns:
+            x = "CAST(%s AS DOUBLE)" % quote(col)
+            select.append("count(%s), count(*) - count(%s), avg(%s), var_samp(%s), "
+                          "quantile_cont(%s, 0.0), quantile_cont(%s, 0.25), quantile_cont(%s, 0.5), "
+                          "quantile_cont(%s, 0.75), quantile_cont(%s, 1.0)" % ((x,) * 9))
+        where = " AND ".join("%s IS NOT NULL" % quote(g) for g in group_by) if dropna else "TRUE"
+        frame = self._execute("SELECT %s%s FROM %s WHERE %s GROUP BY %s ORDER BY %s"
+                              % (keys, "".join(", " + s for s in select), self.source, where, keys,
+                                 ", ".join("%s NULLS LAST" % quote(g) for g in group_by))).df()
+        group_keys = frame.iloc[:, :len(group_by)].astype(object)
+        group_keys = group_keys.where(group_keys.notna(), np.nan)
+        group_keys.columns = range(len(group_by))
+        values = frame.iloc[:, len(group_by):].to_numpy(dtype=np.float64, na_value=np.nan)
+        result = []
+        for i in range(len(columns)):
+            count, missing, mean, variance, q_min, q1, median, q3, q_max = values[:, 9 * i:9 * i + 9].T
+            result.append({'Count': count.astype(np.int64),
+                           'Missing': missing.astype(np.int64),
+                           'Mean': mean,
+                           'Standard_Deviation': np.sqrt(variance),
+                           'Variance': variance,
+                           'Min': q_min,
+                           'First_Quartile': q1,
+                           'Median': median,
+                           'Third_Quartile': q3,
+                           'Max': q_max,
+                           })
+        return group_keys, result
+
+    def value_counts(self, column, limit=None, where=None):
+        """
+        Counts the values of a column, most frequent first and ties in ascending order
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+        limit : int, optional
+            Number of values returned. The default is None which returns every value.
+        where : str, optional
+            SQL condition selecting the counted rows. The default is None.
+
+        Returns
+        -------
+        Pandas Series
+            Count of every non missing value
+        """
+        name = quote(column)
+        sql = "SELECT %s AS value, count(*) AS n FROM %s WHERE %s IS NOT NULL%s GROUP BY 1 ORDER BY 2 DESC, 1" % (
+            name, self.source, name, "" if where is None else " AND (%s)" % where)
+        if limit is not None:
+            sql += " LIMIT %d" % int(limit)
+        counts = self._execute(sql).fetchdf()
+        return pd.Series(counts["n"].to_numpy(), index=counts["value"].to_numpy(), dtype='int64')
+
+    def categorical_stats(self, columns, top=100):
+        """
+        Computes the summary statistics of categorical columns
+
+        Parameters
+        ----------
+        columns : list
+            Categorical columns
+        top : int, optional
+            Number of most frequent values kept in Value_Counts. The default is 100.
+
+        Returns
+        -------
+        list
+            Dictionaries with the values of CATEG_STATS, the missing values count and the
+            value counts, see stats_engine.categorical_column_stats
+        """
+        columns = list(columns)
+        if not columns:
+            return []
+        select = ", ".join("count(%s), count(DISTINCT %s), count(*)" % (quote(col), quote(col)) for col in columns)
+        row = self._execute("SELECT %s FROM %s" % (select, self.source)).fetchone()
+        result = []
+        for i, col in enumerate(columns):
+            count, n_unique, n_rows = row[3 * i:3 * i + 3]
+            value_counts = self.value_counts(col, limit=top) if count else pd.Series([], dtype='int64')
+            result.append({'Count': int(count),
+                           'Count_of_Unique_Values': int(n_unique),
+                           'Mode': value_counts.index[0] if count else np.nan,
+                           'Missing': int(n_rows - count),
+                           'Value_Counts': value_counts,
+                           })
+        return result
+
+    def column_array(self, column):
+        """
+        Reads one column as a float array with NaN for missing values
+
+        Parameters
+        ----------
+        column : str
+            Name of a continuous column
+
+        Returns
+        -------
+        numpy array
+            float64 values of the column in row order
+        """
+        values = self._execute("SELECT CAST(%s AS DOUBLE) AS x FROM %s" % (quote(column), self.source)).fetchnumpy()["x"]
+        if isinstance(values, np.ma.MaskedArray):
+            values = values.filled(np.nan)
+        return np.asarray(values, dtype=np.float64)
+
+    def take(self, positions):
+        """
+        Reads the rows at the given positions
+
+        Parameters
+        ----------
+        positions : list
+            Row positions
+
+        Returns
+        -------
+        Pandas DataFrame
+            Rows indexed by their position
+        """
+        positions = [int(p) for p in positions]
+        if not positions:
+            return self.head(0)
+        return self._positioned("SELECT * FROM %s WHERE file_row_number IN (%s) ORDER BY file_row_number"
+                                % (self._numbered(), ", ".join(map(str, positions))))
+
+    def iter_frames(self, columns=None, chunk_size=1000000):
+        """
+        Streams the rows in order as dataframes of about chunk_size rows
+
+        Parameters
+        ----------
+        columns : list, optional
+            Columns read. The default is None which reads every column.
+        chunk_size : int, optional
+            Number of rows per chunk. The default is 1000000.
+        """
+        select = "*" if columns is None else ", ".join(quote(col) for col in columns)
+        cursor = self._execute("SELECT %s FROM %s" % (select, self.source))
+        # DuckDB hands results over in vectors of 2048 rows
+        vectors = max(int(chunk_size) // 2048, 1)
+        while True:
+            chunk = cursor.fetch_df_chunk(vectors)
+            if len(chunk) == 0:
+                break
+            yield chunk
+
+    def _numbered(self):
+        # scan exposing the position of every row as file_row_number
+        return "read_parquet(%s, file_row_number = true)" % literal(self.path)
+
+    def _positioned(self, sql):
+        # rows indexed by their position
+        rows = self._execute(sql).fetchdf()
+        return rows.set_index("file_row_number").rename_axis(None)
+
+    def count_rows(self, where="TRUE"):
+        """Counts the rows meeting an SQL condition"""
+        return int(self._execute("SELECT count(*) FROM %s WHERE %s" % (self.source, where)).fetchone()[0])
+
+    def page(self, where="TRUE", order_by=None, ascending=True, offset=0, limit=100):
+        """
+        Reads one page of rows, filtered and sorted by DuckDB
+
+        Parameters
+        ----------
+        where : str, optional
+            SQL condition selecting the rows. The default is "TRUE".
+        order_by : str, optional
+            Column to sort by, missing values last. The default is None which keeps the row order.
+        ascending : boolean, optional
+            Sort direction. The default is True.
+        offset : int, optional
+            Number of rows skipped. The default is 0.
+        limit : int, optional
+            Number of rows read. The default is 100.
+
+        Returns
+        -------
+        Pandas DataFrame
+            Rows indexed by their position
+        """
+        order = "file_row_number"
+        if order_by is not None:
+            order = "%s %s NULLS LAST, file_row_number" % (quote(order_by), "ASC" if ascending else "DESC")
+        return self._positioned("SELECT * FROM %s WHERE %s ORDER BY %s LIMIT %d OFFSET %d"
+                                % (self._numbered(), where, order, int(limit), int(offset)))
+
+    def sample(self, n_rows, seed=0, stratify_by=None):
+        """
+        Draws a random sample of rows
+
+        Parameters
+        ----------
+        n_rows : int
+            Size of the sample
+        seed : int, optional
+            Seed of the random draw. The default is 0.
+        stratify_by : str, optional
+            Column whose groups are represented in proportion, the quotas being allocated
+            by largest remainder as in preview_engine.stratified_positions. The default is
+            None which draws a simple random sample.
+
+        Returns
+        -------
+        Pandas DataFrame
+            Rows indexed by their position, in row order
+        """
+        if stratify_by is None:
+            return self._positioned("SELECT * FROM %s USING SAMPLE reservoir(%d ROWS) REPEATABLE (%d) "
+                                    "ORDER BY file_row_number" % (self._numbered(), int(n_rows), int(seed)))
+        n_rows = min(int(n_rows), len(self))
+        fraction = float(n_rows) / max(len(self), 1)
+        group = quote(stratify_by)
+        # whole part of the proportional quotas, the remaining rows go to the largest remainders
+        quotas = ("SELECT %s AS stratum, floor(exact) + CASE WHEN row_number() OVER "
+                  "(ORDER BY exact - floor(exact) DESC, hash(%s, %d)) <= %d - sum(floor(exact)) OVER () "
+                  "THEN 1 ELSE 0 END AS quota FROM (SELECT %s, count(*) * %r AS exact FROM %s GROUP BY %s)"
+                  % (group, group, int(seed), n_rows, group, fraction, self.source, group))
+        return self._positioned(
+            "SELECT rows.* FROM %s AS rows JOIN (%s) AS quotas ON rows.%s IS NOT DISTINCT FROM quotas.stratum "
+            "QUALIFY row_number() OVER (PARTITION BY rows.%s ORDER BY hash(file_row_number + %d)) <= quotas.quota "
+            "ORDER BY file_row_number"
+            % (self._numbered(), quotas, group, group, int(seed)))
+
+    def head(self, n=5):
+        """Returns the first n rows"""
+        return self._execute("SELECT * FROM %s LIMIT %d" % (self.source, int(n))).fetchdf()
+
+    def to_frame(self):
+        """Loads the whole table into a pandas dataframe"""
+        return self._execute("SELECT * FROM %s" % self.source).fetchdf()
+
+    def execute_plan(self, plan):
+        """
+        Executes a cleaning plan as SQL and rewrites the Parquet file once
+
+        Rows to drop are combined into one filter, the imputation values come from one
+        aggregate query and the cleaned data is written by a single COPY statement.
+
+        Parameters
+        ----------
+        plan : Cleaning_Plan
+            Plan returned by Data_Analytics.build_cleaning_plan
+
+        Returns
+        -------
+        dictionary
+            Report with the same content as Cleaning_Plan.execute
+        """
+        timings = {}
+
+        # 1. conditions of the values that become missing: foreign labels and outliers
+        start = time.perf_counter()
+        drops = []
+        invalid = {}
+        # imputation method of every (column, source), see Cleaning_Plan.execute
+        methods = {}
+        for step in plan.steps:
+            if step["step"] == "foreign":
+                for col in step["columns"]:
+                    if not self._is_type(col, CATEGORICAL_TYPES):
+                        continue
+                    condition = "NOT regexp_matches(%s, %s)" % (quote(col), literal(FOREIGN_SQL_PATTERN))
+                    if step["action"] == "drop":
+                        drops.append(condition)
+                    else:
+                        invalid.setdefault(col, []).append(condition)
+                        methods[(col, 'invalid')] = step["method"]
+        timings["detect_foreign"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        capped = {}
+        outliers = {}
+        for step in plan.steps:
+            if step["step"] == "outliers" and step["columns"]:
+                columns = step["columns"]
+                # all quartiles of the column block in a single scan
+                select = ", ".join("quantile_cont(CAST(%s AS DOUBLE), [0.25, 0.75])" % quote(col) for col in columns)
+                quartiles = self._execute("SELECT %s FROM %s" % (select, self.source)).fetchone()
+                limits = []
+                for j, q in enumerate(quartiles):
+                    q1, q3 = (np.nan, np.nan) if q is None else (_null_to_nan(q[0]), _null_to_nan(q[1]))
+                    lower, upper = q1 - step["f"] * (q3 - q1), q3 + step["f"] * (q3 - q1)
+                    if step["action"] == "cap":
+                        lower = lower if step["lower"][j] is None else float(step["lower"][j])
+                        upper = upper if step["upper"][j] is None else float(step["upper"][j])
+                    limits.append((lower, upper))
+                conditions = ["(%s < %s OR %s > %s)" % (quote(col), literal(lower), quote(col), literal(upper))
+                              for col, (lower, upper) in zip(columns, limits)]
+                select = ", ".join("count(*) FILTER (WHERE %s)" % condition for condition in conditions)
+                affected = self._execute("SELECT %s FROM %s" % (select, self.source)).fetchone()
+                for col, method, (lower, upper), condition, n in zip(columns, step["method"], limits,
+                                                                      conditions, affected):
+                    outliers[col] = {"Lower limit": lower, "Upper limit": upper, "Values affected": int(n)}
+                    if step["action"] == "drop":
+                        drops.append(condition)
+                    elif step["action"] == "cap":
+                        if n:
+                            capped[col] = (lower, upper)
+                    elif n:
+                        invalid.setdefault(col, []).append(condition)
+                        methods[(col, 'invalid')] = method
+        timings["detect_outliers"] = time.perf_counter() - start
+
+        # 2. one filter for every drop, comparisons with missing values never drop a row
+        start = time.perf_counter()
+        for step in plan.steps:
+            if step["step"] == "drop_missing":
+                drops.extend("%s IS NULL" % quote(col) for col in step["columns"])
+            elif step["step"] == "impute_missing":
+                for col in step["columns"]:
+                    methods[(col, 'missing')] = step["method"]
+        # without an imputation step the missing values are filled like the invalid ones
+        for col in invalid:
+            methods.setdefault((col, 'missing'), methods[(col, 'invalid')])
+        keep = "NOT (%s)" % " OR ".join("coalesce(%s, FALSE)" % c for c in drops) if drops else "TRUE"
+        sources = {}
+        for col, source in methods:
+            if source == 'missing':
+                sources[(col, source)] = "%s IS NULL" % quote(col)
+            else:
+                sources[(col, source)] = "(%s)" % " OR ".join("coalesce(%s, FALSE)" % c for c in invalid[col])
+        columns = list(dict.fromkeys(col for col, _ in methods))
+        bad = {col: "(%s)" % " OR ".join(sources[key] for key in sources if key[0] == col) for col in columns}
+
+        # 3. rows removed, values to impute and mean/median fill values in one aggregate query
+        select = ["count(*) FILTER (WHERE NOT (%s))" % keep]
+        for key, condition in sources.items():
+            select.append("count(*) FILTER (WHERE (%s) AND %s)" % (keep, condition))
+        aggregates = list(dict.fromkeys((col, method) for (col, _), method in methods.items()))
+        for col, method in aggregates:
+            # both sources are imputed from the same retained valid values
+            if method in ('mean', 'median'):
+                aggregate = "avg" if method == 'mean' else "median"
+                select.append("%s(CAST(%s AS DOUBLE)) FILTER (WHERE (%s) AND NOT %s)"
+                              % (aggregate, quote(col), keep, bad[col]))
+            elif method == 'mode':
+                select.append("NULL")
+            else:
+                raise ValueError("Unsupported imputation method: %s" % method)
+        row = self._execute("SELECT %s FROM %s" % (", ".join(select), self.source)).fetchone()
+        rows_removed = int(row[0])
+        n_bad = dict(zip(sources, row[1:1 + len(sources)]))
+        values = dict(zip(aggregates, row[1 + len(sources):]))
+        timings["row_mask"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fill_values = {}
+        imputed = {}
+        for (col, source), method in methods.items():
+            if not n_bad[(col, source)]:
+                continue
+            if method == 'mode' and values[(col, method)] is None:
+                counts = self.value_counts(col, limit=1, where="(%s) AND NOT %s" % (keep, bad[col]))
+                values[(col, method)] = counts.index[0] if len(counts) else None
+            fill_values[(col, source)] = values[(col, method)]
+            imputed[col] = imputed.get(col, 0) + int(n_bad[(col, source)])
+        timings["fill_values"] = time.perf_counter() - start
+
+        # 4. single materialization with COPY, only the modified columns are rewritten
+        start = time.perf_counter()
+        if rows_removed or imputed or capped:
+            select = []
+            for col in self.schema:
+                name = quote(col)
+                if col in capped:
+                    lower, upper = capped[col]
+                    select.append("CASE WHEN %s < %s THEN %s WHEN %s > %s THEN %s ELSE CAST(%s AS DOUBLE) END AS %s"
+                                  % (name, literal(lower), literal(lower), name, literal(upper), literal(upper),
+                                     name, name))
+                elif col in imputed:
+                    cases = "".join(" WHEN %s THEN %s" % (sources[key], literal(value))
+                                    for key, value in fill_values.items() if key[0] == col)
+                    # a boolean column imputed with its mean or median becomes numeric, as with pandas
+                    value = "CAST(%s AS DOUBLE)" % name if self._is_type(col, ('BOOLEAN',)) else name
+                    select.append("CASE%s ELSE %s END AS %s" % (cases, value, name))
+                else:
+                    select.append(name)
+            path = self._new_path(self.work_dir)
+            self._execute("COPY (SELECT %s FROM %s WHERE %s) TO %s (FORMAT parquet)"
+                          % (", ".join(select), self.source, keep, literal(path)))
+            self._replace(path)
+        timings["materialize"] = time.perf_counter() - start
+
+        return {"rows_removed": rows_removed,
+                "imputed": imputed,
+                "outliers": outliers,
+                "modified_columns": list(dict.fromkeys(list(imputed) + list(capped))),
+                "timings": timings,
+                }
+
+    def checkout(self, path):
+        """
+        Switches the table to another Parquet file, e.g. a version kept by Dataset_History
+
+        Parameters
+        ----------
+        path : str
+            Parquet file, which is not deleted by the table
+        """
+        self._replace(path, owned=False)
+
+    def _replace(self, path, owned=True):
+        # switch to a new version of the file and delete the previous one if it is ours
+        old_path, old_owned = self.path, self.owned
+        self.path, self.owned = path, owned
+        self.version += 1
+        self._schema = None
+        if old_owned and os.path.exists(old_path):
+            os.remove(old_path)
+
+    def close(self):
+        """Deletes the Parquet file if it was written by the table"""
+        if self.owned and os.path.exists(self.path):
+            os.remove(self.path)
+        self.owned = False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
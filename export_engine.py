@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+Export of figures and dataframes to downloadable files.
+
+Figures are rendered only on demand, on a single background worker so that
+kaleido keeps one long-lived rendering process, and the bytes are cached by
+the hash of the figure so an unchanged chart is never rendered twice.
+
+Dataframes are written by the writers registered in FRAME_WRITERS into
+in-memory buffers, row by row for Excel and chunk by chunk for CSV, so that
+no full text or cell copy of a large frame is held at once.
+"""
+
+#packages
+import io
+import hashlib
+import zipfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import pandas as pd
+
+try:
+    import xlsxwriter
+except ImportError:  # openpyxl in write-only mode is used instead
+    xlsxwriter = None
+
+try:
+    from pypdf import PdfWriter, PdfReader
+except ImportError:  # multi-page PDF export is disabled without pypdf
+    PdfWriter = None
+    PdfReader = None
+
+MIME_TYPES = {"pdf": "application/pdf",
+              "png": "image/png",
+              "svg": "image/svg+xml",
+              "zip": "application/zip",
+              "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+              "csv": "text/csv",
+              "parquet": "application/vnd.apache.parquet",
+              "feather": "application/vnd.apache.arrow.file",
+              }
+
+FRAME_WRITERS = {}
+
+# size of an Excel worksheet
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMNS = 16384
+
+
+def figure_key(fig, image_format='pdf'):
+    """
+    Returns the cache key of a figure
+
+    Parameters
+    ----------
+    fig : Plotly figure
+        Figure to be exported
+    image_format : str, optional
+        Format of the image. The default is 'pdf'.
+
+    Returns
+    -------
+    str
+        Hash of the figure JSON and the format
+    """
+    digest = hashlib.blake2b(fig.to_json().encode('utf-8'), digest_size=16).hexdigest()
+    return "%s.%s" % (digest, image_format)
+
+
+def _to_image(fig, image_format):
+    # plotly.io is imported by the first export only
+    import plotly.io as pio
+    return pio.to_image(fig, format=image_format)
+
+
+class Figure_Exporter():
+    """
+    Background, cached renderer of figures
+
+    Attributes
+    ----------
+    max_entries : int
+        Maximum number of rendered images kept in memory
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, max_entries=64, render=None):
+        """
+        Constructs/define all the necessary attributes of the exporter
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            Maximum number of rendered images kept in memory. The default is 64.
+        render : callable, optional
+            Function (fig, format) returning the image bytes. The default is
+            plotly.io.to_image which goes through kaleido.
+        """
+        self.max_entries = max_entries
+        self._render = render or _to_image
+        # kaleido is not thread safe: a single worker reuses the same rendering process
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="figure-export")
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def cached(self, fig, image_format='pdf'):
+        """
+        Returns the rendered image if it is available
+
+        Parameters
+        ----------
+        fig : Plotly figure
+            Figure to be exported
+        image_format : str, optional
+            Format of the image. The default is 'pdf'.
+
+        Returns
+        -------
+        bytes or None
+            Image bytes, None if the figure has not been rendered yet
+        """
+        key = figure_key(fig, image_format)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def pending(self, fig=None, image_format='pdf'):
+        """
+        Tells whether renderings are in progress
+
+        Parameters
+        ----------
+        fig : Plotly figure, optional
+            Checks only this figure. The default is None which checks every figure.
+        image_format : str, optional
+            Format of the image. The default is 'pdf'.
+        """
+        with self._lock:
+            if fig is None:
+                return bool(self._pending)
+            return figure_key(fig, image_format) in self._pending
+
+    def export(self, fig, image_format='pdf'):
+        """
+        Renders a figure in the background
+
+        Parameters
+        ----------
+        fig : Plotly figure
+            Figure to be exported
+        image_format : str, optional
+            Format of the image. The default is 'pdf'.
+
+        Returns
+        -------
+        Future
+            Resolves to the image bytes, immediately if the figure is cached
+        """
+        key = figure_key(fig, image_format)
+        with self._lock:
+            if key in self._cache:
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            future = self._executor.submit(self._render_and_store, key, fig, image_format)
+            self._pending[key] = future
+            return future
+
+    def _render_and_store(self, key, fig, image_format):
+        try:
+            data = self._render(fig, image_format)
+            with self._lock:
+                self._cache[key] = data
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def export_batch(self, figures, image_format='pdf', archive='zip'):
+        """
+        Renders several figures into one document
+
+        Parameters
+        ----------
+        figures : dict
+            Figures by file name
+        image_format : str, optional
+            Format of every image. The default is 'pdf'.
+        archive : str, optional
+            'zip' puts one file per figure in a ZIP archive, 'pdf' merges the PDF pages
+            into one multi-page PDF and requires pypdf. The default is 'zip'.
+
+        Returns
+        -------
+        Future
+            Resolves to the bytes of the archive
+        """
+        if archive == 'pdf' and (PdfWriter is None or image_format != 'pdf'):
+            raise ValueError("Multi-page PDF export requires pypdf and image_format='pdf'")
+        futures = {name: self.export(fig, image_format) for name, fig in figures.items()}
+
+        def combine():
+            buffer = io.BytesIO()
+            if archive == 'pdf':
+                writer = PdfWriter()
+                for future in futures.values():
+                    for page in PdfReader(io.BytesIO(future.result())).pages:
+                        writer.add_page(page)
+                writer.write(buffer)
+            else:
+                with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                    for name, future in futures.items():
+                        zip_file.writestr(name, future.result())
+            return buffer.getvalue()
+
+        # the single render worker is busy with the figures, so the archive is assembled on its own thread
+        result = Future()
+
+        def assemble():
+            try:
+                result.set_result(combine())
+            except BaseException as exc:
+                result.set_exception(exc)
+        threading.Thread(target=assemble, daemon=True).start()
+        return result
+
+    def shutdown(self, wait=False):
+        """Stops the render worker"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def register_frame_writer(file_format):
+    """
+    Registers a dataframe writer for a file format
+
+    The writer is called as writer(df, buffer, index=True, chunk_size=...) and writes
+    the frame into the binary buffer.
+
+    Parameters
+    ----------
+    file_format : str
+        File extension handled by the writer
+    """
+    def register(writer):
+        FRAME_WRITERS[file_format] = writer
+        return writer
+    return register
+
+
+def _row_chunks(df, index, chunk_size, inf_rep='inf'):
+    # Rows as lists of Python objects with None for missing values and inf_rep for
+    # infinite values, as DataFrame.to_excel, a chunk at a time
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        if index:
+            chunk = chunk.reset_index()
+        values = chunk.astype(object).where(chunk.notna(), None)
+        floats = chunk.select_dtypes('floating')
+        if len(floats.columns):
+            values[floats.columns] = values[floats.columns].mask(floats == float('inf'), inf_rep) \
+                                                           .mask(floats == -float('inf'), '-' + inf_rep)
+        yield from values.itertuples(index=False, name=None)
+
+
+def _header(df, index):
+    names = [str(col) for col in df.columns]
+    if index:
+        names = [str(name) if name is not None else "" for name in df.index.names] + names
+    return names
+
+
+@register_frame_writer('xlsx')
+def write_xlsx(df, buffer, index=True, chunk_size=10000, sheet_name='Sheet1', inf_rep='inf'):
+    """
+    Writes a dataframe to an Excel workbook row by row
+
+    xlsxwriter, listed in requirements.txt, is used in constant memory mode, each
+    row is flushed once the next one is started. openpyxl in write-only mode is
+    only a fallback for installations without xlsxwriter. As DataFrame.to_excel,
+    infinite values are written as inf_rep and frames larger than a worksheet
+    raise ValueError before anything is written.
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    buffer : binary file-like object
+        Destination
+    index : boolean, optional
+        Writes the index as first columns. The default is True.
+    chunk_size : int, optional
+        Number of rows converted at a time. The default is 10000.
+    sheet_name : str, optional
+        Name of the worksheet. The default is 'Sheet1'.
+    inf_rep : str, optional
+        Representation of infinity, '-' + inf_rep for negative infinity. The default is 'inf'.
+    """
+    header = _header(df, index)
+    if len(df) + 1 > EXCEL_MAX_ROWS or len(header) > EXCEL_MAX_COLUMNS:
+        raise ValueError("The sheet is too large: %d rows and %d columns, an Excel worksheet holds at most "
+                         "%d rows and %d columns" % (len(df) + 1, len(header), EXCEL_MAX_ROWS, EXCEL_MAX_COLUMNS))
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True,
+                                                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                                                'remove_timezone': True,
+                                                'strings_to_urls': False,
+                                                'strings_to_formulas': False})
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, header)
+        for row_number, row in enumerate(_row_chunks(df, index, chunk_size, inf_rep), start=1):
+            if worksheet.write_row(row_number, 0, row) == -1:
+                raise ValueError("Row %d is outside of the worksheet" % row_number)
+        workbook.close()
+        return
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    worksheet.append(header)
+    for row in _row_chunks(df, index, chunk_size, inf_rep):
+        worksheet.append([value.tz_localize(None) if isinstance(value, pd.Timestamp) and value.tz is not None
+                          else value for value in row])
+    workbook.save(buffer)
+
+
+@register_frame_writer('csv')
+def write_csv(df, buffer, index=True, chunk_size=100000):
+    """
+    Writes a dataframe to UTF-8 CSV a chunk of rows at a time
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    buffer : binary file-like object
+        Destination
+    index : boolean, optional
+        Writes the index as first columns. The default is True.
+    chunk_size : int, optional
+        Number of rows encoded at a time. The default is 100000.
+    """
+    text = io.TextIOWrapper(buffer, encoding='utf-8', newline='', write_through=True)
+    for start in range(0, max(len(df), 1), chunk_size):
+        df.iloc[start:start + chunk_size].to_csv(text, index=index, header=start == 0)
+    text.detach()
+
+
+def _arrow_ready(df, index):
+    # Arrow formats need string column names, Feather also a default index
+    df = df.rename(columns=str)
+    if index and not df.index.equals(pd.RangeIndex(len(df))):
+        return df.reset_index()
+    return df.reset_index(drop=True)
+
+
+@register_frame_writer('parquet')
+def write_parquet(df, buffer, index=True, chunk_size=None):
+    """Writes a dataframe to Parquet, requires pyarrow"""
+    _arrow_ready(df, index).to_parquet(buffer, index=False)
+
+
+@register_frame_writer('feather')
+def write_feather(df, buffer, index=True, chunk_size=None):
+    """Writes a dataframe to uncompressed Feather, requires pyarrow"""
+    _arrow_ready(df, index).to_feather(buffer, compression='uncompressed')
+
+
+def export_frame(df, file_format='xlsx', index=True, **options):
+    """
+    Exports a dataframe to an in-memory file
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    file_format : str, optional
+        One of the formats of FRAME_WRITERS. The default is 'xlsx'.
+    index : boolean, optional
+        Exports the index too. The default is True.
+    **options
+        Passed to the writer, e.g. chunk_size
+
+    Returns
+    -------
+    bytes
+        Content of the file
+    """
+    if file_format not in FRAME_WRITERS:
+        raise ValueError("Unknown export format %r, available formats are %s"
+                         % (file_format, ", ".join(sorted(FRAME_WRITERS))))
+    buffer = io.BytesIO()
+    FRAME_WRITERS[file_format](df, buffer, index=index, **options)
+    return buffer.getvalue()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned history of the working dataset for undo, redo and revert.
+
+Every cleaning step commits a version. With the pandas backend a version is a
+shallow copy of the frame: cleaning replaces the modified columns and never
+writes into existing arrays, so the columns a step did not touch share their
+buffers with the previous version. Memory is therefore accounted per column
+version, as tracked by Data_Analytics.column_versions, and only the columns
+new in a version add to the budget. With the duckdb backend a version is the
+Parquet file the step wrote, which the history deletes when the version is
+evicted.
+
+Versions form a tree: reverting to an older version and cleaning again starts
+a new branch, the previous branch staying available until it is evicted.
+"""
+
+#packages
+import os
+import time
+import threading
+import pandas as pd
+
+
+class Dataset_Version():
+    """
+    Snapshot of the working dataset
+
+    Attributes
+    ----------
+    version_id : int
+        Identifier of the version, increasing with every commit
+    parent : int or None
+        Version the snapshot was derived from, None for the root
+    label : str
+        Description of the step which produced the version
+    created : float
+        Commit time, seconds since the epoch
+    data : Pandas DataFrame or None
+        Shallow copy of the frame with the pandas backend
+    path : str or None
+        Parquet file of the version with the duckdb backend
+    column_versions : dict
+        Column versions of Data_Analytics when the version was committed
+    cont_var : list
+        Continuous columns
+    categ_var : list
+        Categorical columns
+    rows : int
+        Number of rows
+    keys : list
+        Memory accounting keys of the columns and index of the version
+    """
+    def __init__(self, version_id, parent, label, data=None, path=None,
+                 column_versions=None, cont_var=(), categ_var=(), rows=0):
+        self.version_id = version_id
+        self.parent = parent
+        self.label = label
+        self.created = time.time()
+        self.data = data
+        self.path = path
+        self.column_versions = dict(column_versions or {})
+        self.cont_var = list(cont_var)
+        self.categ_var = list(categ_var)
+        self.rows = rows
+        self.keys = []
+
+
+class Dataset_History():
+    """
+    Bounded tree of versions of the working dataset
+
+    Attributes
+    ----------
+    max_versions : int
+        Maximum number of versions kept
+    max_bytes : int
+        Budget of the estimated memory, or disk space with the duckdb backend, of all versions
+    current : int or None
+        Version matching the working dataset
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, max_versions=20, max_bytes=1 << 30):
+        """
+        Constructs/define all the necessary attributes of the history
+
+        Parameters
+        ----------
+        max_versions : int, optional
+            Maximum number of versions kept. The default is 20.
+        max_bytes : int, optional
+            Budget of all versions in bytes. The default is 1 GiB.
+        """
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self.current = None
+        self._versions = {}
+        self._next_id = 0
+        # accounting key -> [bytes, number of versions holding it]
+        self._sizes = {}
+        # Parquet files deleted once no version holds them
+        self._owned_files = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._versions)
+
+    def __contains__(self, version_id):
+        return version_id in self._versions
+
+    @property
+    def nbytes(self):
+        """Estimated bytes held by the versions, shared columns being counted once"""
+        return sum(size for size, _ in self._sizes.values())
+
+    def get(self, version_id):
+        """Returns the version, KeyError if it does not exist or was evicted"""
+        return self._versions[version_id]
+
+    def unchanged(self, column_versions):
+        """True if the column versions are those of the current version, nothing to commit"""
+        return self.current is not None and self._versions[self.current].column_versions == column_versions
+
+    def commit(self, label, data=None, path=None, owned=False, column_versions=None,
+               cont_var=(), categ_var=(), rows=0):
+        """
+        Adds a version derived from the current version and makes it current
+
+        Parameters
+        ----------
+        label : str
+            Description of the step
+        data : Pandas DataFrame, optional
+            Shallow copy of the frame with the pandas backend. The default is None.
+        path : str, optional
+            Parquet file of the version with the duckdb backend. The default is None.
+        owned : boolean, optional
+            The history deletes the file once no version holds it. The default is False.
+        column_versions : dict, optional
+            Column versions of the data. The default is None.
+        cont_var, categ_var : list, optional
+            Continuous and categorical columns
+        rows : int, optional
+            Number of rows
+
+        Returns
+        -------
+        Dataset_Version
+            The new version
+        """
+        with self._lock:
+            version = Dataset_Version(self._next_id, self.current, label, data, path,
+                                      column_versions, cont_var, categ_var, rows)
+            self._next_id += 1
+            parent = self._versions.get(self.current)
+            if data is not None:
+                for col in data.columns:
+                    key = (col, version.column_versions.get(col, 0))
+                    if key not in self._sizes:
+                        series = data[col]
+                        self._sizes[key] = [int(series.memory_usage(index=False, deep=series.dtype == object)), 0]
+                    version.keys.append(key)
+                # the index is shared as long as no row was removed
+                if parent is not None and parent.data is not None and parent.data.index is data.index:
+                    index_key = parent.keys[-1]
+                else:
+                    index_key = ('__index__', version.version_id)
+                    self._sizes[index_key] = [int(data.index.memory_usage(deep=False)), 0]
+                version.keys.append(index_key)
+            elif path is not None:
+                if owned:
+                    self._owned_files.add(path)
+                key = ('__file__', path)
+                if key not in self._sizes:
+                    self._sizes[key] = [os.path.getsize(path) if os.path.exists(path) else 0, 0]
+                version.keys.append(key)
+            for key in version.keys:
+                self._sizes[key][1] += 1
+            self._versions[version.version_id] = version
+            self.current = version.version_id
+            self._evict()
+            return version
+
+    def checkout(self, version_id):
+        """Makes a version current and returns it, KeyError if it does not exist or was evicted"""
+        with self._lock:
+            version = self._versions[version_id]
+            self.current = version_id
+            return version
+
+    def parent_of(self, version_id):
+        """Returns the parent of a version, None for the root"""
+        return self._versions[version_id].parent
+
+    def latest_child(self, version_id):
+        """Returns the most recent version derived from a version, None if there is none"""
+        with self._lock:
+            children = [v for v in self._versions.values() if v.parent == version_id]
+        return max(children, key=lambda v: v.version_id).version_id if children else None
+
+    def log(self):
+        """
+        Lists the versions
+
+        Returns
+        -------
+        Pandas DataFrame
+            Version, parent, step, rows, columns, commit time and current flag, oldest first
+        """
+        with self._lock:
+            versions = list(self._versions.values())
+        return pd.DataFrame({"Version": [v.version_id for v in versions],
+                             "Parent": pd.array([v.parent for v in versions], dtype="Int64"),
+                             "Step": [v.label for v in versions],
+                             "Rows": [v.rows for v in versions],
+                             "Columns": [len(v.column_versions) for v in versions],
+                             "Created": [pd.Timestamp(v.created, unit='s') for v in versions],
+                             "Current": [v.version_id == self.current for v in versions],
+                             })
+
+    def _drop(self, version_id):
+        # removes a version, its children are attached to its parent
+        version = self._versions.pop(version_id)
+        for other in self._versions.values():
+            if other.parent == version_id:
+                other.parent = version.parent
+        for key in version.keys:
+            self._sizes[key][1] -= 1
+            if self._sizes[key][1] == 0:
+                del self._sizes[key]
+                if key[0] == '__file__' and key[1] in self._owned_files:
+                    self._owned_files.discard(key[1])
+                    if os.path.exists(key[1]):
+                        os.remove(key[1])
+
+    def _evict(self):
+        # Drop the oldest versions until both limits are met. The root, i.e. the
+        # data as loaded, and the current version are always kept.
+        while len(self._versions) > 2 and (len(self._versions) > self.max_versions or self.nbytes > self.max_bytes):
+            candidates = [v for v in self._versions.values()
+                          if v.version_id != self.current and v.parent is not None]
+            if not candidates:
+                break
+            self._drop(min(candidates, key=lambda v: v.version_id).version_id)
+
+    def clear(self):
+        """
+        Drops every version
+
+        Returns
+        -------
+        boolean
+            True if the Parquet file of the current version was owned by the history. It is
+            not deleted, its ownership goes back to the table using it.
+        """
+        with self._lock:
+            current = self._versions.get(self.current)
+            owned = current is not None and current.path in self._owned_files
+            if owned:
+                self._owned_files.discard(current.path)
+            for version_id in list(self._versions):
+                self._drop(version_id)
+            self.current = None
+            return owned
+
+    def __del__(self):
+        # files of the versions are deleted with the history
+        try:
+            with self._lock:
+                for version_id in list(self._versions):
+                    self._drop(version_id)
+        except Exception:
+            pass
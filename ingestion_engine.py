@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming ingestion of Excel, CSV and Parquet documents.
+
+Rows are read in bounded chunks and converted to typed column arrays right
+away, so the Python objects of only one chunk are alive at a time and peak
+memory stays close to the size of the final dataframe.
+"""
+
+#packages
+import io
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import openpyxl
+
+EXCEL_FORMATS = ('xlsx', 'xlsm', 'xltx', 'xltm')
+SUPPORTED_FORMATS = EXCEL_FORMATS + ('xls', 'csv', 'parquet')
+
+
+def detect_format(document):
+    """
+    Returns the format of the document from its name
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the document or uploaded file having a name attribute
+
+    Returns
+    -------
+    str
+        Lower case file extension without the dot, '' if unknown
+    """
+    name = document if isinstance(document, (str, os.PathLike)) else getattr(document, 'name', '')
+    return os.path.splitext(str(name))[1].lstrip('.').lower()
+
+
+def _rewind(document):
+    if hasattr(document, 'seek'):
+        document.seek(0)
+
+
+def _make_header(values):
+    # Same naming as pandas: blank headers become "Unnamed: i" and
+    # duplicates are suffixed with ".1", ".2", ...
+    columns = []
+    seen = {}
+    for i, val in enumerate(values):
+        name = "Unnamed: %d" % i if val is None or val == '' else val
+        if name in seen:
+            seen[name] += 1
+            candidate = "%s.%d" % (name, seen[name])
+            while candidate in seen:
+                seen[name] += 1
+                candidate = "%s.%d" % (name, seen[name])
+            seen[candidate] = 0
+            name = candidate
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+class Column_Chunks():
+    """
+    Accumulates typed column chunks and assembles the final dataframe
+
+    Attributes
+    ----------
+    columns : list
+        Column names of the frame
+    n_rows : int
+        Number of rows added so far
+    numeric_booleans : boolean
+        Types mixed boolean columns as pandas.read_excel does: booleans with missing
+        values or numbers become numeric. pandas.read_csv keeps them as objects.
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, columns, numeric_booleans=False):
+        self.columns = list(columns)
+        self.numeric_booleans = numeric_booleans
+        self.n_rows = 0
+        self._chunks = [[] for _ in self.columns]
+
+    def add_rows(self, rows):
+        """
+        Converts a chunk of row tuples to typed column arrays
+
+        Parameters
+        ----------
+        rows : list
+            List of row tuples, each as long as the header
+        """
+        if not rows:
+            return
+        width = len(self.columns)
+        for i, values in enumerate(zip(*rows)):
+            if i >= width:
+                break
+            self._chunks[i].append(self._convert(np.array(values, dtype=object)))
+        self.n_rows += len(rows)
+
+    def add_frame(self, frame):
+        """
+        Adds an already typed chunk such as one returned by pandas.read_csv
+
+        Parameters
+        ----------
+        frame : Pandas DataFrame
+            Chunk with the same columns as the header
+        """
+        for i in range(len(self.columns)):
+            values = frame.iloc[:, i].to_numpy()
+            if values.dtype == object:
+                values = self._convert(values)
+            self._chunks[i].append(values)
+        self.n_rows += len(frame)
+
+    @staticmethod
+    def _convert(values):
+        # A chunk made only of missing values carries no type information,
+        # it is kept as a marker and filled once the column dtype is known
+        series = pd.Series(values, dtype=object)
+        if series.isna().all():
+            return len(values)
+        return series.infer_objects().to_numpy()
+
+    def _assemble(self, chunks):
+        typed = [c for c in chunks if not isinstance(c, int)]
+        if not typed:
+            return np.full(sum(chunks), np.nan)
+        kinds = {c.dtype.kind for c in typed}
+        if kinds <= {'i', 'u', 'f'} or kinds == {'M'} or kinds == {'m'} or kinds == {'b'}:
+            dtype = np.result_type(*typed)
+        else:
+            dtype = np.dtype(object)
+        if len(typed) < len(chunks):
+            # missing values force the integer and boolean columns to float/object
+            # exactly as pandas does when it reads the whole sheet at once
+            if dtype.kind in 'iu' or (dtype.kind == 'b' and self.numeric_booleans):
+                dtype = np.dtype('float64')
+            elif dtype.kind == 'b':
+                dtype = np.dtype(object)
+        na_value = np.datetime64('NaT') if dtype.kind == 'M' else (
+            np.timedelta64('NaT') if dtype.kind == 'm' else np.nan)
+        parts = [np.full(c, na_value, dtype=dtype) if isinstance(c, int) else c.astype(dtype, copy=False)
+                 for c in chunks]
+        values = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        return self._numeric_objects(values) if dtype == object and self.numeric_booleans else values
+
+    @staticmethod
+    def _numeric_objects(values):
+        # Like pandas.read_excel, an object column holding only booleans and numbers
+        # is numeric: int64 without missing values if every value is integral, float64
+        # otherwise, booleans becoming 1 and 0. Other object columns get NaN for missing values.
+        missing = pd.isna(values)
+        valid = values[~missing]
+        if len(valid) and all(isinstance(v, (bool, np.bool_, int, np.integer, float, np.floating)) for v in valid):
+            if not missing.any() and all(isinstance(v, (bool, np.bool_, int, np.integer)) for v in valid):
+                return valid.astype(np.int64)
+            numbers = np.full(len(values), np.nan)
+            numbers[~missing] = valid.astype(np.float64)
+            return numbers
+        if missing.any():
+            values = values.copy()
+            values[missing] = np.nan
+        return values
+
+    def to_frame(self):
+        """
+        Assembles the dataframe, releasing the chunks column by column
+
+        Returns
+        -------
+        Pandas DataFrame
+            Frame with the accumulated rows
+        """
+        data = {}
+        for i, name in enumerate(self.columns):
+            chunks = self._chunks[i]
+            data[name] = self._assemble(chunks) if chunks else np.array([], dtype=object)
+            self._chunks[i] = []
+        return pd.DataFrame(data, columns=self.columns, copy=False)
+
+
+def read_excel_streaming(document, sheet_name=0, chunk_size=50000, sample_rows=1000):
+    """
+    Reads a worksheet with openpyxl read-only mode in bounded chunks
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the workbook or uploaded file
+    sheet_name : int or str, optional
+        Index or name of the worksheet. The default is 0.
+    chunk_size : int, optional
+        Number of rows converted at a time. The default is 50000.
+    sample_rows : int, optional
+        Size of the first chunk, used to settle the column dtypes early.
+        The default is 1000.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Data of the worksheet, first row used as header
+    """
+    _rewind(document)
+    workbook = openpyxl.load_workbook(document, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            worksheet = workbook.worksheets[sheet_name]
+        else:
+            worksheet = workbook[sheet_name]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        # trailing empty header cells are not columns
+        last = len(header)
+        while last > 0 and header[last - 1] is None:
+            last -= 1
+        width = last
+        builder = Column_Chunks(_make_header(header[:width]), numeric_booleans=True)
+        chunk = []
+        blank_rows = []
+        limit = max(1, min(sample_rows, chunk_size))
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            if all(val is None for val in row):
+                # blank rows are kept only when data follows them
+                blank_rows.append(row)
+                continue
+            if blank_rows:
+                chunk.extend(blank_rows)
+                blank_rows = []
+            chunk.append(row)
+            if len(chunk) >= limit:
+                builder.add_rows(chunk)
+                chunk = []
+                limit = chunk_size
+        builder.add_rows(chunk)
+        return builder.to_frame()
+    finally:
+        workbook.close()
+
+
+def read_csv_chunked(document, chunk_size=50000):
+    """
+    Reads a CSV document in chunks
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the CSV document or uploaded file
+    chunk_size : int, optional
+        Number of rows parsed at a time. The default is 50000.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Data of the CSV document
+    """
+    _rewind(document)
+    builder = None
+    with pd.read_csv(document, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            if builder is None:
+                builder = Column_Chunks(chunk.columns)
+            builder.add_frame(chunk)
+    return pd.DataFrame() if builder is None else builder.to_frame()
+
+
+def read_parquet(document):
+    """
+    Reads a Parquet document
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the Parquet document or uploaded file
+
+    Returns
+    -------
+    Pandas DataFrame
+        Data of the Parquet document
+    """
+    _rewind(document)
+    return pd.read_parquet(document)
+
+
+def read_table(document, file_format=None, sheet_name=0, chunk_size=50000, sample_rows=1000):
+    """
+    Reads a document with the reader matching its format
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the document or uploaded file
+    file_format : str, optional
+        Format of the document. Detected from the name when None.
+    sheet_name : int or str, optional
+        Worksheet to read for Excel documents. The default is 0.
+    chunk_size : int, optional
+        Number of rows converted at a time. The default is 50000.
+    sample_rows : int, optional
+        Size of the first Excel chunk. The default is 1000.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Data of the document
+    """
+    file_format = file_format or detect_format(document)
+    if file_format == 'csv':
+        return read_csv_chunked(document, chunk_size=chunk_size)
+    if file_format == 'parquet':
+        return read_parquet(document)
+    if file_format == 'xls':
+        # openpyxl cannot read the legacy binary format
+        _rewind(document)
+        return pd.read_excel(document, sheet_name=sheet_name)
+    if file_format in EXCEL_FORMATS or file_format == '':
+        return read_excel_streaming(document, sheet_name=sheet_name,
+                                    chunk_size=chunk_size, sample_rows=sample_rows)
+    raise ValueError("Unsupported file format: %s" % file_format)
+
+
+def document_name(document):
+    """
+    Returns the file name of the document without folder and extension
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the document or uploaded file having a name attribute
+
+    Returns
+    -------
+    str
+        Name of the document, 'document' if it has no name
+    """
+    name = document if isinstance(document, (str, os.PathLike)) else getattr(document, 'name', '')
+    return os.path.splitext(os.path.basename(str(name)))[0] or 'document'
+
+
+def list_sheets(document, file_format=None):
+    """
+    Returns the worksheet names of the document
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the document or uploaded file
+    file_format : str, optional
+        Format of the document. Detected from the name when None.
+
+    Returns
+    -------
+    list
+        Worksheet names, [None] for single table formats such as CSV and Parquet
+    """
+    file_format = file_format or detect_format(document)
+    _rewind(document)
+    if file_format in EXCEL_FORMATS or file_format == '':
+        # read-only mode only parses the workbook index, not the sheets
+        workbook = openpyxl.load_workbook(document, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    if file_format == 'xls':
+        with pd.ExcelFile(document) as workbook:
+            return list(workbook.sheet_names)
+    return [None]
+
+
+def portable_source(document):
+    """
+    Returns a picklable source of the document for worker processes
+
+    Parameters
+    ----------
+    document : str or file-like object
+        Path of the document or uploaded file
+
+    Returns
+    -------
+    str or bytes
+        The path itself, or the content of file-like objects
+    """
+    if isinstance(document, (str, os.PathLike)):
+        return os.fspath(document)
+    if hasattr(document, 'getvalue'):
+        return document.getvalue()
+    _rewind(document)
+    return document.read()
+
+
+def read_table_job(source, file_format, sheet_name=0, chunk_size=50000):
+    """
+    Worker entry point reading one table from a path or raw bytes
+
+    Parameters
+    ----------
+    source : str or bytes
+        Path of the document or its content
+    file_format : str
+        Format of the document
+    sheet_name : int or str, optional
+        Worksheet to read for Excel documents. The default is 0.
+    chunk_size : int, optional
+        Number of rows converted at a time. The default is 50000.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Data of the table
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return read_table(source, file_format=file_format,
+                      sheet_name=0 if sheet_name is None else sheet_name,
+                      chunk_size=chunk_size)
+
+
+def run_parallel(jobs, max_workers=None):
+    """
+    Runs read_table_job for every job in a process pool
+
+    openpyxl parsing is CPU bound and holds the GIL, so separate processes
+    are used. A single job, or an environment without process support, runs
+    in the calling process.
+
+    Parameters
+    ----------
+    jobs : list
+        List of (source, file_format, sheet_name, chunk_size) tuples
+    max_workers : int, optional
+        Number of worker processes. The default is the number of CPUs.
+
+    Returns
+    -------
+    list
+        Dataframes in the order of the jobs
+    """
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [read_table_job(*job) for job in jobs]
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError):
+        return [read_table_job(*job) for job in jobs]
+    with executor:
+        futures = [executor.submit(read_table_job, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def _looks_like_dates(values, sample_size=200):
+    # Checks a sample of the non missing strings before converting the whole column
+    sample = values.dropna()
+    sample = sample.iloc[:sample_size] if len(sample) > sample_size else sample
+    if len(sample) == 0 or not sample.map(type).eq(str).all():
+        return False
+    if pd.to_numeric(sample, errors='coerce').notna().any():
+        return False
+    with warnings.catch_warnings():
+        # values without a common format fall back to dateutil with a warning
+        warnings.simplefilter('ignore', UserWarning)
+        parsed = pd.to_datetime(sample, errors='coerce')
+    return bool(parsed.notna().all())
+
+
+def optimize_dtypes(df, categorical_threshold=0.5, parse_dates=True):
+    """
+    Reduces the memory used by a dataframe
+
+    Integers are downcast to the smallest type holding their range, floats to
+    float32 when no precision is lost, date-like text is parsed to datetime64
+    and text columns with few distinct values are converted to category.
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data to be optimized, it is not modified
+    categorical_threshold : float, optional
+        Maximum ratio of distinct values to non missing values for a text column
+        to be converted to category. The default is 0.5.
+    parse_dates : boolean, optional
+        Parses date-like text columns if True. The default is True.
+
+    Returns
+    -------
+    tuple
+        Optimized dataframe and a report with the dtype and memory of every
+        column before and after the optimization
+    """
+    before = df.memory_usage(index=False, deep=True)
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        kind = series.dtype.kind
+        if kind in 'iu':
+            series = pd.to_numeric(series, downcast='unsigned' if len(series) and series.min() >= 0 else 'integer')
+        elif kind == 'f':
+            narrow = series.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+                series = narrow
+        elif kind == 'O':
+            if parse_dates and _looks_like_dates(series):
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', UserWarning)
+                    parsed = pd.to_datetime(series, errors='coerce')
+                if parsed.isna().sum() == series.isna().sum():
+                    series = parsed
+            if series.dtype == object:
+                n_values = series.count()
+                if n_values and series.nunique() <= categorical_threshold * n_values:
+                    series = series.astype('category')
+        columns[name] = series
+    optimized = pd.DataFrame(columns, index=df.index, columns=df.columns, copy=False)
+    after = optimized.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'Features': df.columns,
+                           'Type before': [str(t) for t in df.dtypes],
+                           'Type after': [str(t) for t in optimized.dtypes],
+                           'Memory before (bytes)': before.to_numpy(),
+                           'Memory after (bytes)': after.to_numpy(),
+                           })
+    return optimized, report
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing and memory instrumentation of the backend and the app.
+
+Every Data_Analytics method and every section of main.py runs inside
+Metrics_Recorder.operation, which records its wall time, the rise of the peak
+memory, the rows and columns of the working data and the statistics cache hits.
+Records are kept in memory for the metrics panel of the app and can be appended
+to a file as JSON lines. One operation at a time can also be profiled with
+cProfile or, when installed, pyinstrument.
+"""
+
+#packages
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import contextlib
+import tracemalloc
+from collections import deque
+import pandas as pd
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+MEMORY_MODES = ('rss', 'tracemalloc')
+
+# depth of the operations running on the current thread, nested operations are recorded
+# with their depth and only the outermost one is profiled or traced
+_local = threading.local()
+
+
+def available_profilers():
+    """Returns the profilers which can be used, pyinstrument being optional"""
+    return tuple(p for p in PROFILERS if p != 'pyinstrument' or pyinstrument is not None)
+
+
+def peak_rss():
+    """Returns the peak resident memory of the process in bytes, None where it is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Metrics_Recorder():
+    """
+    Records the metrics of the operations of the backend and the app
+
+    Attributes
+    ----------
+    enabled : bool
+        Operations are only measured while True
+    path : str or None
+        File to which every record is appended as a JSON line
+    max_bytes : int
+        Size from which the file is renamed to path + '.1', replacing the previous one,
+        and a new file is started
+    profiler : str or None
+        'cprofile' or 'pyinstrument' to profile the outermost operations
+    memory : str
+        'rss' records the rise of the peak resident memory of the process, cheap but
+        zero when the process already reached a higher peak before. 'tracemalloc'
+        records the peak allocation during the operation, exact but several times slower.
+    max_records : int
+        Number of records kept in memory
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, path=None, profiler=None, memory='rss', max_records=1000, enabled=True, max_bytes=10 << 20):
+        """
+        Constructs/define all the necessary attributes of the recorder
+
+        Parameters
+        ----------
+        path : str, optional
+            File of the JSON lines. The default is None which keeps the records in memory only.
+        profiler : str, optional
+            'cprofile' or 'pyinstrument'. The default is None which disables profiling.
+        memory : str, optional
+            'rss' or 'tracemalloc'. The default is 'rss'.
+        max_records : int, optional
+            Number of records kept in memory. The default is 1000.
+        enabled : bool, optional
+            The default is True.
+        max_bytes : int, optional
+            Size of the file from which it is rotated, at most twice this size is kept
+            on disk. The default is 10 MB.
+        """
+        self.enabled = enabled
+        self.path = path
+        self.max_bytes = max_bytes
+        self.profiler = None
+        self.memory = None
+        self.set_profiler(profiler)
+        self.set_memory(memory)
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    @property
+    def max_records(self):
+        return self._records.maxlen
+
+    def set_profiler(self, profiler):
+        """
+        Selects the profiler of the outermost operations
+
+        Parameters
+        ----------
+        profiler : str or None
+            'cprofile', 'pyinstrument' or None to disable profiling
+        """
+        if profiler not in PROFILERS + (None,):
+            raise ValueError("profiler must be one of %s or None" % (PROFILERS,))
+        if profiler == 'pyinstrument' and pyinstrument is None:
+            raise ValueError("pyinstrument is not installed")
+        self.profiler = profiler
+
+    def set_memory(self, memory):
+        """
+        Selects how the memory of the operations is measured
+
+        Parameters
+        ----------
+        memory : str
+            'rss' or 'tracemalloc'
+        """
+        if memory not in MEMORY_MODES:
+            raise ValueError("memory must be one of %s" % (MEMORY_MODES,))
+        self.memory = memory
+
+    @contextlib.contextmanager
+    def operation(self, name, kind='ui', source=None, **fields):
+        """
+        Measures the code run inside the with block
+
+        Parameters
+        ----------
+        name : str
+            Name of the operation
+        kind : str, optional
+            'backend' for Data_Analytics methods, 'ui' for sections of the app.
+            The default is 'ui'.
+        source : Data_Analytics, optional
+            Object whose working data and statistics cache are reported. The default is None.
+        **fields
+            Additional values stored in the record
+
+        Yields
+        ------
+        dictionary
+            The record, values can be added to it inside the with block
+        """
+        if not self.enabled:
+            yield {}
+            return
+        depth = getattr(_local, 'depth', 0)
+        record = {"operation": name,
+                  "kind": kind,
+                  "depth": depth,
+                  "thread": threading.current_thread().name,
+                  "started": time.time(),
+                  }
+        record.update(fields)
+        if source is not None:
+            record["rows"], record["columns"] = source._shape()
+            hits, misses = source.cache_hits, source.cache_misses
+        tracing = self.memory == 'tracemalloc' and depth == 0 and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        peak = peak_rss()
+        profiler = self._start_profiler() if self.profiler is not None and depth == 0 else None
+        _local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["exception"] = type(e).__name__
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            _local.depth = depth
+            if profiler is not None:
+                record["profile"] = self._stop_profiler(profiler)
+            if tracing:
+                record["peak_memory_delta_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif peak is not None:
+                record["peak_memory_delta_bytes"] = peak_rss() - peak
+            if source is not None:
+                record["rows_out"], record["columns_out"] = source._shape()
+                record["cache_hits"] = source.cache_hits - hits
+                record["cache_misses"] = source.cache_misses - misses
+            self._add(record)
+
+    def _start_profiler(self):
+        try:
+            if self.profiler == 'pyinstrument':
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except (RuntimeError, ValueError):
+            # another profiler is already active, e.g. on another thread
+            return None
+        return profiler
+
+    def _stop_profiler(self, profiler, limit=30):
+        # text report of the profile, the slowest functions first
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+            return profiler.output_text()
+        profiler.disable()
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+        return text.getvalue()
+
+    def _add(self, record):
+        with self._lock:
+            self._records.append(record)
+            if self.path is not None:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps(record, default=str) + "\n")
+                    size = file.tell()
+                if size >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+
+    def records(self, kind=None):
+        """
+        Returns the records kept in memory, oldest first
+
+        Parameters
+        ----------
+        kind : str, optional
+            Only the records of this kind. The default is None which returns every record.
+
+        Returns
+        -------
+        list
+            Record dictionaries
+        """
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if kind is None or r["kind"] == kind]
+
+    def frame(self, kind=None):
+        """Returns the records without their profiles as a dataframe, latest first"""
+        records = [{k: v for k, v in r.items() if k != "profile"} for r in self.records(kind)]
+        return pd.DataFrame(records[::-1])
+
+    def summary(self, kind=None):
+        """
+        Aggregates the records by operation
+
+        Returns
+        -------
+        Pandas DataFrame
+            Number of calls, total, mean and maximum wall time, largest memory rise and
+            cache hits of every operation, the most expensive first
+        """
+        df = self.frame(kind)
+        if df.empty:
+            return df
+        for column in ("peak_memory_delta_bytes", "cache_hits", "cache_misses"):
+            if column not in df:
+                df[column] = None
+        summary = df.groupby(["kind", "operation"]).agg(calls=("seconds", "size"),
+                                                         total_seconds=("seconds", "sum"),
+                                                         mean_seconds=("seconds", "mean"),
+                                                         max_seconds=("seconds", "max"),
+                                                         max_memory_delta_bytes=("peak_memory_delta_bytes", "max"),
+                                                         cache_hits=("cache_hits", "sum"),
+                                                         cache_misses=("cache_misses", "sum"))
+        return summary.sort_values("total_seconds", ascending=False)
+
+    def clear(self):
+        """Drops the records kept in memory, the JSON lines file is kept"""
+        with self._lock:
+            self._records.clear()
+
+
+def instrumented(func):
+    """
+    Decorator recording every call of a Data_Analytics method with the recorder of the instance
+
+    The method runs unchanged when the instance has no enabled metrics recorder. The
+    error code of the returned status dictionary is added to the record.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        recorder = getattr(self, "metrics", None)
+        if recorder is None or not recorder.enabled:
+            return func(self, *args, **kwargs)
+        with recorder.operation(func.__name__, 'backend', source=self) as record:
+            output = func(self, *args, **kwargs)
+            if isinstance(output, dict) and "error_code" in output:
+                record["error_code"] = output["error_code"]
+            return output
+    return wrapper
+
+
+def instrument_methods(cls):
+    """Class decorator applying instrumented to every public method of the class but return_status"""
+    for name, value in list(vars(cls).items()):
+        if not name.startswith('_') and name != 'return_status' and callable(value) and not isinstance(value, type):
+            setattr(cls, name, instrumented(value))
+    return cls
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Background execution of long running Data_Analytics operations.
+
+Streamlit restarts main.py on every widget interaction. Operations submitted
+to a Job_Runner kept in the session state run on a worker thread, so they
+survive those reruns and the page only polls for their progress and result.
+"""
+
+#packages
+import time
+import inspect
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job_Cancelled(Exception):
+    """Raised inside a job which noticed that it has been cancelled"""
+
+
+class Job():
+    """
+    Operation submitted to a Job_Runner
+
+    Attributes
+    ----------
+    job_id : int
+        Identifier of the job
+    name : str
+        Name given at submission, usually the operation name
+    progress : float
+        Fraction of the work done, between 0 and 1
+    message : str or None
+        Last progress message
+    submitted : float
+        Submission time, seconds since the epoch
+    finished : float or None
+        End time, seconds since the epoch
+    cancellable : boolean
+        True if the operation reports progress and therefore stops when cancelled.
+        Other operations can only be cancelled before they start.
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, job_id, name, cancellable=False):
+        self.job_id = job_id
+        self.name = name
+        self.cancellable = cancellable
+        self.progress = 0.0
+        self.message = None
+        self.submitted = time.time()
+        self.finished = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        """True once cancel has been requested"""
+        return self._cancel_event.is_set()
+
+    def set_progress(self, fraction, message=None):
+        """
+        Reports progress from inside the job, raises Job_Cancelled if the job was cancelled
+
+        Parameters
+        ----------
+        fraction : float
+            Fraction of the work done, between 0 and 1
+        message : str, optional
+            Description of the current step. The default is None.
+        """
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        if self.cancelled:
+            raise Job_Cancelled()
+
+    @property
+    def status(self):
+        """'pending', 'running', 'done', 'failed' or 'cancelled'"""
+        if self.future is None:
+            return 'pending'
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.future.running():
+            return 'running'
+        if not self.future.done():
+            return 'pending'
+        # a job which ignored the cancellation ran to completion, its result stands
+        if isinstance(self.future.exception(), Job_Cancelled):
+            return 'cancelled'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    @property
+    def done(self):
+        """True once the job will not change anymore"""
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def result(self):
+        """
+        Returns the result of a finished job
+
+        Returns
+        -------
+        any type
+            Return value of the operation, None if the job is not done, failed or was cancelled
+        """
+        if self.status != 'done':
+            return None
+        return self.future.result()
+
+    def error(self):
+        """Returns the traceback of a failed job, None otherwise"""
+        if self.status != 'failed':
+            return None
+        exc = self.future.exception()
+        return ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+
+class Job_Runner():
+    """
+    Thread pool running operations as cancellable jobs with progress reporting
+
+    Attributes
+    ----------
+    jobs : dict
+        Submitted jobs by identifier
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, max_workers=1):
+        """
+        Constructs/define all the necessary attributes of the runner
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            Number of worker threads. The default is 1, which also serializes
+            operations modifying the same Data_Analytics instance.
+        """
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analytics-job")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Submits an operation
+
+        If func accepts a "progress" keyword argument, it receives Job.set_progress
+        and can report progress and notice cancellation. Other operations can only be
+        cancelled while they are pending.
+
+        Parameters
+        ----------
+        name : str
+            Name of the job
+        func : callable
+            Operation to be run
+        *args, **kwargs
+            Arguments of the operation
+
+        Returns
+        -------
+        Job
+            The submitted job
+        """
+        try:
+            accepts_progress = 'progress' in inspect.signature(func).parameters
+        except (TypeError, ValueError):
+            accepts_progress = False
+        with self._lock:
+            job = Job(next(self._ids), name, cancellable=accepts_progress)
+            self.jobs[job.job_id] = job
+        if accepts_progress:
+            kwargs['progress'] = job.set_progress
+
+        def run():
+            try:
+                if job.cancelled:
+                    raise Job_Cancelled()
+                result = func(*args, **kwargs)
+                job.progress = 1.0
+                return result
+            finally:
+                job.finished = time.time()
+
+        job.future = self._executor.submit(run)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the identifier, None if unknown"""
+        return self.jobs.get(job_id)
+
+    def latest(self, name):
+        """Returns the most recent job with the name, None if there is none"""
+        candidates = [job for job in self.jobs.values() if job.name == name]
+        return max(candidates, key=lambda job: job.job_id) if candidates else None
+
+    def active(self):
+        """Returns the jobs which are pending or running"""
+        return [job for job in list(self.jobs.values()) if not job.done]
+
+    def busy(self):
+        """True while a job is pending or running, the objects it uses must not be touched"""
+        return len(self.active()) > 0
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Pending jobs never start; running cancellable jobs stop at
+        their next progress report. Running jobs which are not cancellable, e.g.
+        cleaning steps modifying the data, are left to complete.
+
+        Parameters
+        ----------
+        job_id : int
+            Identifier of the job
+
+        Returns
+        -------
+        boolean
+            True if the job was cancelled or will stop at its next progress report
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        if job.future is not None and job.future.cancel():
+            job._cancel_event.set()
+            return True
+        if not job.cancellable:
+            return False
+        job._cancel_event.set()
+        return True
+
+    def forget(self, job_id=None, max_age=3600):
+        """
+        Removes finished jobs and their results
+
+        Parameters
+        ----------
+        job_id : int, optional
+            Identifier of the job to remove once it is finished. The default is None,
+            every finished job older than max_age is removed.
+        max_age : float, optional
+            Age in seconds of the finished jobs removed without job_id. The default is 3600.
+        """
+        now = time.time()
+        with self._lock:
+            if job_id is not None:
+                finished = [job_id] if job_id in self.jobs and self.jobs[job_id].done else []
+            else:
+                finished = [j.job_id for j in self.jobs.values() if j.done and j.finished and now - j.finished > max_age]
+            for job_id in finished:
+                del self.jobs[job_id]
+
+    def shutdown(self, wait=False):
+        """Cancels pending jobs and stops the worker threads"""
+        for job in self.active():
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,6 +1,12 @@
 import streamlit as st
 from backend_analytics_engine import Data_Analytics
-import io
+from data_cache import Data_Cache, content_digest
+from job_runner import Job_Runner
+from export_engine import Figure_Exporter, MIME_TYPES, export_frame
+from instrumentation import Metrics_Recorder, available_profilers
+from plot_engine import prewarm
+import os
+import time
 import logging
 #import logging.config
 
@@ -10,215 +16,510 @@ try:
                         filemode='a',
                         format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
                         datefmt='%H:%M:%S',
-                        level=logging.DEBUG)
+                        level=os.environ.get("LOG_LEVEL", "INFO").upper())
     logger = logging.getLogger('Front-end:')
-    logger.info("\n\nNew session started")
+    # Every section of the page and every backend call is timed, records are also appended to METRICS_FILE if set
+    if "metrics" not in st.session_state:
+        st.session_state["metrics"] = Metrics_Recorder(path=os.environ.get("METRICS_FILE") or None)
+        logger.info("\n\nNew session started")
+    metrics = st.session_state["metrics"]
+    metrics_panel = st.sidebar.expander("Performance metrics")
+    with metrics_panel:
+        metrics.set_profiler(st.selectbox("Profile operations with", [None] + list(available_profilers()),
+                                          format_func=lambda p: "no profiling" if p is None else p))
+        metrics.set_memory("tracemalloc" if st.toggle("Exact memory (tracemalloc, slower)") else "rss")
+
+    # Plotly is loaded in the background while the user uploads, the first chart does not wait for it
+    if os.environ.get("PREWARM_PLOTTING", "1") != "0":
+        prewarm()
 
     # Add App TiTle
     st.title("Excel Data Analyzer")
     st.text("This app helps you to analyze data and to get insights and recommendations!")
 
     # Upload File
-    file_uploaded = st.file_uploader("Choose a file...",
-                                     help="Upload files with format such as .xlsx and .xls")
-    if file_uploaded != None:
-        da = Data_Analytics()
-        output = da.read_document(file_uploaded)
-        file_uploaded = None
-        if output["error_code"]== 0:
-            st.success("File upload is successful")
-            logger.info("File upload is successful")
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
+    with metrics.operation("Upload"):
+        files_uploaded = st.file_uploader("Choose files...",
+                                          accept_multiple_files=True,
+                                          help="Upload files with format such as .xlsx, .xls, .csv and .parquet")
+        col5, col6, col7 = st.columns(3)
+        with col5:
+            load_all_sheets = st.toggle("Load all sheets of the workbooks")
+        with col6:
+            combine_datasets = st.toggle("Combine datasets into one")
+        with col7:
+            optimize_dtypes = st.toggle("Optimize memory usage")
+        # Parsed datasets are kept in the session so that reruns do not parse the workbook again
+        if "data_cache" not in st.session_state:
+            st.session_state["data_cache"] = Data_Cache(max_entries=4, max_bytes=2 << 30)
+            st.session_state["upload_digests"] = {}
+        data_cache = st.session_state["data_cache"]
+        if files_uploaded:
+            digests = []
+            for file_uploaded in files_uploaded:
+                upload_key = (file_uploaded.name, file_uploaded.size, getattr(file_uploaded, "id", None))
+                digest = st.session_state["upload_digests"].get(upload_key)
+                if digest is None:
+                    digest = content_digest(file_uploaded)
+                    st.session_state["upload_digests"][upload_key] = digest
+                digests.append(digest)
+            cache_key = "|".join(digests + [str(load_all_sheets), str(combine_datasets), str(optimize_dtypes)])
+            da = data_cache.get(cache_key)
+            if da is None:
+                da = Data_Analytics(metrics=metrics)
+                if len(files_uploaded) == 1 and not load_all_sheets:
+                    output = da.read_document(files_uploaded[0], digest=digests[0], optimize_dtypes=optimize_dtypes)
+                else:
+                    output = da.read_documents(files_uploaded,
+                                               sheet_names=None if load_all_sheets else [0],
+                                               concat=combine_datasets,
+                                               digests=digests,
+                                               optimize_dtypes=optimize_dtypes)
+                if output["error_code"]== 0:
+                    data_cache.put(cache_key, da)
+            else:
+                output = da.return_status(0, "Dataset loaded from session cache")
+            files_uploaded = None
+            if output["error_code"]== 0:
+                st.session_state["da"] = da
+                st.success("File upload is successful")
+                logger.info("File upload is successful")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
+    # The analytics object is built once per session, not on every rerun
+    if "da" not in st.session_state:
+        st.session_state["da"] = Data_Analytics(metrics=metrics)
+    da = st.session_state["da"]
+    # Long running operations are executed in the background and survive reruns
+    if "job_runner" not in st.session_state:
+        st.session_state["job_runner"] = Job_Runner()
+        st.session_state["job_outputs"] = {}
+    job_runner = st.session_state["job_runner"]
+    # The worker thread owns da while a job is pending or running: every widget calling into da
+    # is disabled until the job is done. busy is checked again by each section, a job submitted
+    # earlier in the same run must not race with the sections below.
+    busy = job_runner.busy
+    if len(da.datasets) > 1:
+        dataset_names = list(da.datasets)
+        dataset_name = st.selectbox("Choose a dataset", dataset_names,
+                                    index=dataset_names.index(da.active_dataset), disabled=busy())
+        if dataset_name != da.active_dataset and not busy():
+            da.select_dataset(dataset_name)
+    if da.active_dataset in da.memory_reports:
+        with st.expander("Memory usage per column"):
+            st.dataframe(da.memory_reports[da.active_dataset])
 
+    def render_job(name):
+        """
+        Shows the progress of the latest job with the name and returns its output once done.
+        A finished job is removed from the runner, only the output of the latest job of
+        every name is kept in the session.
+        """
+        job = job_runner.latest(name)
+        if job is not None and not job.done:
+            st.progress(job.progress, text=job.message or "Running...")
+            # jobs modifying the data only stop before they start, no Cancel once they run
+            if (job.cancellable or job.status == 'pending') and st.button("Cancel", key="cancel_" + name):
+                if job_runner.cancel(job.job_id):
+                    logger.info("cancelled " + name)
+            return None
+        if job is not None:
+            status = job.status
+            output = job.result() if status == 'done' else None
+            if status == 'failed':
+                logger.error(job.error())
+            elif status == 'done':
+                if output["error_code"] == 0:
+                    logger.info(output["status_msg"] or name + " performed")
+                else:
+                    logger.error(output["status_msg"])
+            st.session_state["job_outputs"][name] = (job.job_id, status, output)
+            job_runner.forget(job.job_id)
+        if name not in st.session_state["job_outputs"]:
+            return None
+        job_id, status, output = st.session_state["job_outputs"][name]
+        if status == 'cancelled':
+            st.warning("Operation was cancelled")
+            return None
+        if status == 'failed':
+            st.error("Operation failed")
+            return None
+        return output
 
     # Show data
-    show_data_call = st.button("Show Data", key="show1")
-    if show_data_call:
-        data=da.df
-        st.dataframe(data)
-        logger.info("performed Show Data")
+    with metrics.operation("Show data"):
+        # Only one page of rows is materialized and sent to the browser
+        show_data_call = st.toggle("Show Data", key="show1", disabled=busy())
+        if show_data_call and not busy():
+            columns = list(da.cont_var) + list(da.categ_var)
+            col8, col9, col10 = st.columns(3)
+            with col8:
+                preview_mode = st.selectbox("Preview", ("page", "head", "sample", "stratified"),
+                                            help="sample draws random rows, stratified keeps the groups in proportion")
+            with col9:
+                preview_size = st.selectbox("Rows per page", (50, 100, 500, 1000), index=1)
+            with col10:
+                preview_page = st.number_input("Page", min_value=1, value=1, step=1, disabled=preview_mode != "page")
+            preview_options = {}
+            if preview_mode == "page":
+                col11, col12 = st.columns(2)
+                with col11:
+                    sort_by = st.selectbox("Sort by", [None] + columns)
+                    filter_column = st.selectbox("Filter column", [None] + columns)
+                with col12:
+                    ascending = st.toggle("Ascending", value=True)
+                    filter_value = st.text_input("Contains", disabled=filter_column is None)
+                filters = [(filter_column, "contains", filter_value)] if filter_column is not None and filter_value else []
+                preview_options = dict(sort_by=sort_by, ascending=ascending, filters=filters)
+            elif preview_mode == "stratified":
+                preview_options = dict(stratify_by=st.selectbox("Stratify by", list(da.categ_var)))
+            output = da.preview_data(mode=preview_mode, page=preview_page - 1, page_size=preview_size, **preview_options)
+            if output["error_code"] == 0:
+                st.dataframe(output["output"]["rows"])
+                st.caption(output["status_msg"])
+                logger.info("performed Show Data")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
     # Ask query
-    user_query = st.text_input("Post your query ")
-    if user_query != "":
-        st.info("""Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor 
-        incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud 
-        exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. 
-        Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. 
-        Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt 
-        mollit anim id est laborum.""")
-        logger.info("Query posted by the user")
+    with metrics.operation("Ask query"):
+        user_query = st.text_input("Post your query ")
+        if user_query != "":
+            st.info("""Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor 
+            incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud 
+            exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. 
+            Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. 
+            Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt 
+            mollit anim id est laborum.""")
+            logger.info("Query posted by the user")
 
     # Check data integrity
-    st.subheader("Check data integrity", divider='rainbow')
-    data_integrity_check_call = st.button("Check Data Integrity")
-    if data_integrity_check_call:
-        output = da.check_data_integrity()
-        logger.info("Call for data integrity check")
-        if output["error_code"]==0:
-            st.dataframe(output["output"]["data_missingness"])
-            logger.info("performed data integrity check")
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
+    with metrics.operation("Check data integrity"):
+        st.subheader("Check data integrity", divider='rainbow')
+        data_integrity_check_call = st.button("Check Data Integrity", disabled=busy())
+        if data_integrity_check_call:
+            output = da.check_data_integrity()
+            logger.info("Call for data integrity check")
+            if output["error_code"]==0:
+                st.dataframe(output["output"]["data_missingness"])
+                logger.info("performed data integrity check")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
     # Imputation
-    st.subheader("Data Cleansing", divider='rainbow')
-    col3, col4 = st.columns(2)
-    with col3:
-        remove_missing_rows_continuous = st.toggle("Remove missing rows (continuous features)")
-        impute_missing_rows_continuous="mean"
-    with col4:
-        if not remove_missing_rows_continuous:
-            impute_missing_rows_continuous = st.selectbox("Impute method (continuous features)", ("mean", "median"))
-    with col3:
-        remove_missing_rows_categorical = st.toggle("Remove missing rows (categorical features)")
-        impute_missing_rows_categorical='mode'
-    with col4:
-        if not remove_missing_rows_categorical:
-            impute_missing_rows_categorical = st.selectbox("Impute method (categorical features)", ("mode", "mode"))
-    remove_foreign_rows = st.toggle("Remove rows with foreign values")
-    perform_imputation = st.button("Perform imputation/ Remove missing or foreign values")
-    if perform_imputation:
-        logger.info("call for performing imputation/ Remove missing or foreign values")
-        logger.debug("remove_missing_rows_continuous: ", str(remove_missing_rows_continuous),
-                                    "\nremove_missing_rows_categorical: ", str(remove_missing_rows_categorical),
-                                    "\nremove_foreign_rows: ",str(remove_foreign_rows),
-                                    "\nimpute_missing_rows_continuous: ",str(impute_missing_rows_continuous),
-                                    "\nimpute_missing_rows_categorical: ",str(impute_missing_rows_categorical)
-                                    )
-        output = da.keep_data_integrity(remove_missing_rows_continuous=remove_missing_rows_continuous,
-                                    remove_missing_rows_categorical=remove_missing_rows_categorical,
-                                    remove_foreign_rows=remove_foreign_rows,
-                                    impute_missing_rows_continuous=impute_missing_rows_continuous,
-                                    impute_missing_rows_categorical=impute_missing_rows_categorical
-                                    )
-        if output["error_code"]==0:
-            st.success(output["status_msg"])
-            logger.info(output["status_msg"])
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
-    def convert_df(df):
-        return df.to_csv().encode('utf-8')
+    with metrics.operation("Data cleansing"):
+        st.subheader("Data Cleansing", divider='rainbow')
+        col3, col4 = st.columns(2)
+        with col3:
+            remove_missing_rows_continuous = st.toggle("Remove missing rows (continuous features)")
+            impute_missing_rows_continuous="mean"
+        with col4:
+            if not remove_missing_rows_continuous:
+                impute_missing_rows_continuous = st.selectbox("Impute method (continuous features)", ("mean", "median"))
+        with col3:
+            remove_missing_rows_categorical = st.toggle("Remove missing rows (categorical features)")
+            impute_missing_rows_categorical='mode'
+        with col4:
+            if not remove_missing_rows_categorical:
+                impute_missing_rows_categorical = st.selectbox("Impute method (categorical features)", ("mode", "mode"))
+        remove_foreign_rows = st.toggle("Remove rows with foreign values")
+        perform_imputation = st.button("Perform imputation/ Remove missing or foreign values", disabled=busy())
+        if perform_imputation:
+            logger.info("call for performing imputation/ Remove missing or foreign values")
+            logger.debug("remove_missing_rows_continuous: %s, remove_missing_rows_categorical: %s, "
+                         "remove_foreign_rows: %s, impute_missing_rows_continuous: %s, "
+                         "impute_missing_rows_categorical: %s",
+                         remove_missing_rows_continuous, remove_missing_rows_categorical, remove_foreign_rows,
+                         impute_missing_rows_continuous, impute_missing_rows_categorical)
+            job_runner.submit("imputation", da.keep_data_integrity,
+                              remove_missing_rows_continuous=remove_missing_rows_continuous,
+                              remove_missing_rows_categorical=remove_missing_rows_categorical,
+                              remove_foreign_rows=remove_foreign_rows,
+                              impute_missing_rows_continuous=impute_missing_rows_continuous,
+                              impute_missing_rows_categorical=impute_missing_rows_categorical
+                              )
+        output = render_job("imputation")
+        if output is not None:
+            if output["error_code"]==0:
+                st.success(output["status_msg"])
+            else:
+                st.error(output["status_msg"])
+
+    # Cleaning history
+    # Every cleaning step is kept as a version sharing its unchanged columns, reverting needs no new upload
+    with metrics.operation("Cleaning history"):
+        show_history_flag = st.checkbox("Show cleaning history")
+        if show_history_flag:
+            col13, col14, col15 = st.columns(3)
+            with col13:
+                undo_call = st.button("Undo", disabled=busy())
+            with col14:
+                redo_call = st.button("Redo", disabled=busy())
+            output = None
+            if undo_call and not busy():
+                output = da.undo()
+            elif redo_call and not busy():
+                output = da.redo()
+            versions = da.list_versions()
+            if versions["error_code"] == 0 and len(versions["output"]):
+                with col15:
+                    version_id = st.selectbox("Version", list(versions["output"]["Version"]),
+                                              index=int(versions["output"]["Current"].to_numpy().argmax()))
+                if st.button("Revert to version", disabled=busy()) and version_id != da.history.current and not busy():
+                    output = da.revert_version(version_id)
+                    versions = da.list_versions()
+                st.dataframe(versions["output"])
+                st.caption(versions["status_msg"])
+            if output is not None:
+                if output["error_code"] == 0:
+                    st.success(output["status_msg"])
+                    logger.info(output["status_msg"])
+                else:
+                    st.error(output["status_msg"])
+    def convert_df(df, key):
+        # Summaries are encoded once per job instead of once per rerun
+        exports = st.session_state.setdefault("summary_exports", {})
+        if key not in exports:
+            for old_key in [k for k in exports if k[0] != key[0]]:
+                del exports[old_key]
+            exports[key] = export_frame(df, "csv")
+        return exports[key]
 
     # Descriptive analytics
-    st.subheader("Descriptive analytics", divider='rainbow')
-    descriptive_analytics_call = st.button("Perform Descriptive Analytics")
-    if descriptive_analytics_call:
-        logger.info("call for descriptive analytics")
-        output = da.describe_data()
-        if output["error_code"]==0:
-            st.dataframe(output["output"]["cont_data_summary"])
-            excel1 =convert_df(output["output"]["cont_data_summary"])
-            download1 = st.download_button(label="Download",
-                                  data=excel1,
-                                  file_name='continuous_data_summary.csv')
-            st.dataframe(output["output"]["categ_data_summary"])
-            excel2 = convert_df(output["output"]["categ_data_summary"])
-            download2 = st.download_button(label="Download",
-                                           data=excel1,
-                                           file_name='categorical_data_summary.csv')
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
+    with metrics.operation("Descriptive analytics"):
+        st.subheader("Descriptive analytics", divider='rainbow')
+        group_by = st.multiselect("Summarize continuous features per group of", list(da.categ_var),
+                                  help="Statistics of every group are computed together, even for thousands of groups")
+        descriptive_analytics_call = st.button("Perform Descriptive Analytics", disabled=busy())
+        if descriptive_analytics_call:
+            logger.info("call for descriptive analytics")
+            job_runner.submit("descriptive analytics", da.describe_data, group_by=group_by or None)
+        output = render_job("descriptive analytics")
+        if output is not None:
+            if output["error_code"]==0:
+                summary_job_id = st.session_state["job_outputs"]["descriptive analytics"][0]
+                st.dataframe(output["output"]["cont_data_summary"])
+                excel1 =convert_df(output["output"]["cont_data_summary"], (summary_job_id, "cont"))
+                download1 = st.download_button(label="Download",
+                                      data=excel1,
+                                      file_name='continuous_data_summary.csv',
+                                      mime=MIME_TYPES["csv"],
+                                      key="download_cont_summary")
+                st.dataframe(output["output"]["categ_data_summary"])
+                excel2 = convert_df(output["output"]["categ_data_summary"], (summary_job_id, "categ"))
+                download2 = st.download_button(label="Download",
+                                               data=excel2,
+                                               file_name='categorical_data_summary.csv',
+                                               mime=MIME_TYPES["csv"],
+                                               key="download_categ_summary")
+                if "grouped_cont_data_summary" in output["output"]:
+                    st.dataframe(output["output"]["grouped_cont_data_summary"])
+                    excel3 = convert_df(output["output"]["grouped_cont_data_summary"], (summary_job_id, "grouped"))
+                    st.download_button(label="Download",
+                                       data=excel3,
+                                       file_name='grouped_continuous_data_summary.csv',
+                                       mime=MIME_TYPES["csv"],
+                                       key="download_grouped_summary")
+            else:
+                st.error(output["status_msg"])
+
+    # Download data
+    with metrics.operation("Download data"):
+        st.subheader("Download data", divider='rainbow')
+        download_data_flag = st.checkbox("Download the cleaned data", disabled=busy())
+        if download_data_flag and not busy():
+            file_format = st.radio("File format", ("xlsx", "csv", "parquet", "feather"), horizontal=True)
+            output = da.download_file(file_format=file_format)
+            if output["error_code"] == 0:
+                st.download_button(label="Download data",
+                                   data=output["output"],
+                                   file_name="data." + file_format,
+                                   mime=MIME_TYPES[file_format])
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
     # Insights from graphs
     st.subheader("Visualization", divider='rainbow')
 
     #Download image function
+    # Figures are rendered only on demand by a background worker and cached by figure hash
+    if "figure_exporter" not in st.session_state:
+        st.session_state["figure_exporter"] = Figure_Exporter()
+    figure_exporter = st.session_state["figure_exporter"]
+    shown_figures = {}
     def download_img(fig, fig_name):
-        buffer = io.BytesIO() # creating an in memory buffer
-        fig.write_image(file=buffer, format='pdf') # save the figure as a png to the buffer
-        st.download_button(label="Download Image",
-                                           data=buffer,
-                                           file_name=fig_name,
-                                           mime="application/pdf")
+        shown_figures[fig_name] = fig
+        image = figure_exporter.cached(fig)
+        if image is not None:
+            st.download_button(label="Download Image",
+                                               data=image,
+                                               file_name=fig_name,
+                                               mime=MIME_TYPES["pdf"])
+        elif figure_exporter.pending(fig):
+            st.caption("Preparing image...")
+        elif st.button("Prepare image download", key="export_" + fig_name):
+            figure_exporter.export(fig)
+            logger.info("export requested for " + fig_name)
+            st.caption("Preparing image...")
 
     # Show distribution
-    show_distribution_flag = st.checkbox("Show distribution of features")
-    if show_distribution_flag:
-        logger.info("call for distribution plot")
-        features=set(da.cont_var)
-        feature = st.selectbox("Choose a feature", features, key="distribution_graph")
-        output = da.show_distribution(feature=feature)
-        if output["error_code"] ==0:
-            st.plotly_chart(output["output"])
-            logger.info("distribution plot generated")
-            # Download image
-            download_img(output["output"], "Distribution_plot.pdf")
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
+    with metrics.operation("Show distribution"):
+        show_distribution_flag = st.checkbox("Show distribution of features", disabled=busy())
+        if show_distribution_flag and not busy():
+            logger.info("call for distribution plot")
+            features=set(da.cont_var)
+            feature = st.selectbox("Choose a feature", features, key="distribution_graph")
+            output = da.show_distribution(feature=feature)
+            if output["error_code"] ==0:
+                st.plotly_chart(output["output"])
+                logger.info("distribution plot generated")
+                # Download image
+                download_img(output["output"], "Distribution_plot.pdf")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
     # Show trend
-    st.divider()
-    show_trend_flag = st.checkbox("Show trend of features")
-    if show_trend_flag:
-        logger.info("call for trend plot")
-        col1, col2 = st.columns(2)
-        with col1:
-            x_feature = st.radio("Choose x-axis", da.cont_var)
-        with col2:
-            y_feature = st.radio("Choose y-axis", da.cont_var)
-        output = da.show_trend(x_feature=x_feature,
-                               y_feature=y_feature)
-        if output["error_code"] ==0:
-            st.plotly_chart(output["output"])
-            logger.info("trend plot generated")
-            # Download image
-            download_img(output["output"], "Trend_plot.pdf")
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
+    with metrics.operation("Show trend"):
+        st.divider()
+        show_trend_flag = st.checkbox("Show trend of features", disabled=busy())
+        if show_trend_flag and not busy():
+            logger.info("call for trend plot")
+            col1, col2 = st.columns(2)
+            with col1:
+                x_feature = st.radio("Choose x-axis", da.cont_var)
+            with col2:
+                y_feature = st.radio("Choose y-axis", da.cont_var)
+            trend_mode = st.radio("Plot mode", ("auto", "full", "lttb", "density"), horizontal=True,
+                                  help="auto downsamples large datasets, density plots a 2D histogram")
+            output = da.show_trend(x_feature=x_feature,
+                                   y_feature=y_feature,
+                                   mode=trend_mode)
+            if output["error_code"] ==0:
+                st.plotly_chart(output["output"])
+                if output["status_msg"]:
+                    st.caption(output["status_msg"])
+                logger.info("trend plot generated")
+                # Download image
+                download_img(output["output"], "Trend_plot.pdf")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
-    # Show outliers
-    st.divider()
-    show_outliers_flag = st.checkbox("Show outliers of data feature-wise")
-    if show_outliers_flag:
-        logger.info("call for outlier plot")
-        features_set = set(da.cont_var)
-        feature_for_outliers = st.selectbox("Choose a feature", features_set, key="outlier_graph")
-        output = da.show_outliers(feature=feature_for_outliers)
-        if output["error_code"] == 0:
-            st.plotly_chart(output["output"])
-            logger.info("outlier plot generated")
-            # Download image
-            download_img(output["output"], "outliers_plot.pdf")
-        else:
-            st.error(output["status_msg"])
-            logger.error(output["status_msg"])
-    st.divider()
+    # Show correlations
+    # Every pair of features is summarized at once, the strongest trends are listed for plotting
+    with metrics.operation("Show correlations"):
+        st.divider()
+        show_correlations_flag = st.checkbox("Show correlations between features", disabled=busy())
+        if show_correlations_flag and not busy():
+            logger.info("call for correlation heatmap")
+            correlation_method = st.radio("Correlation", ("pearson", "spearman"), horizontal=True,
+                                          help="spearman correlates the ranks and also captures monotonic trends")
+            output = da.show_correlations(method=correlation_method)
+            if output["error_code"] == 0:
+                st.plotly_chart(output["output"]["figure"])
+                st.caption(output["status_msg"])
+                st.dataframe(output["output"]["trends"])
+                logger.info("correlation heatmap generated")
+                # Download image
+                download_img(output["output"]["figure"], "Correlation_plot.pdf")
+            else:
+                st.error(output["status_msg"])
+                logger.error(output["status_msg"])
 
-    # Outlier removal and imputation
-    st.subheader("Outlier Removal and Imputation", divider='rainbow')
-    show_outlier_flag = st.checkbox("Do you want to remove outliers?")
-    if show_outlier_flag:
-        imputation_method = st.selectbox("Imputation method", ("mean", "median"))
-        feature_list = st.multiselect(label="Choose features for outlier removal",
-                                      options=da.cont_var)
-        f = st.slider(label="Factor deciding whisker length",
-                      min_value=0.0,
-                      max_value=5.0,
-                      step=0.1)
-        start_call = st.button("Start")
-        if start_call:
-            logger.info("call for outlier removal")
-            output = da.outlier_removal_imputation(
-                                    remove_outliers = show_outlier_flag,
-                                    imputation_method = imputation_method,
-                                    selected_columns = feature_list,
-                                    lower_extreme = [],
-                                    higher_extreme = [],
-                                    f=f
-                                    )
-            if output["error_code"] ==0:
-                st.success(output["status_msg"])
-                logger.info(output["status_msg"])
+    # Show outliers
+    with metrics.operation("Show outliers"):
+        st.divider()
+        show_outliers_flag = st.checkbox("Show outliers of data feature-wise", disabled=busy())
+        if show_outliers_flag and not busy():
+            logger.info("call for outlier plot")
+            features_set = set(da.cont_var)
+            feature_for_outliers = st.selectbox("Choose a feature", features_set, key="outlier_graph")
+            outlier_page = st.number_input("Page of outlier points", min_value=1, value=1, step=1)
+            output = da.show_outliers(feature=feature_for_outliers, page=outlier_page - 1, json_budget=5 << 20)
+            if output["error_code"] == 0:
+                st.plotly_chart(output["output"])
+                st.caption(output["status_msg"])
+                logger.info("outlier plot generated")
+                # Download image
+                download_img(output["output"], "outliers_plot.pdf")
             else:
                 st.error(output["status_msg"])
                 logger.error(output["status_msg"])
+    st.divider()
+    # Download every chart shown above in one archive
+    with metrics.operation("Download all charts"):
+        if len(shown_figures) > 1:
+            if st.button("Prepare download of all charts"):
+                st.session_state["charts_archive"] = figure_exporter.export_batch(shown_figures, archive='zip')
+                logger.info("export requested for all charts")
+            charts_archive = st.session_state.get("charts_archive")
+            if charts_archive is not None:
+                if not charts_archive.done():
+                    st.caption("Preparing charts...")
+                elif charts_archive.exception() is not None:
+                    st.error("Charts could not be exported")
+                    logger.error(str(charts_archive.exception()))
+                else:
+                    st.download_button(label="Download all charts",
+                                       data=charts_archive.result(),
+                                       file_name="charts.zip",
+                                       mime=MIME_TYPES["zip"])
+
+    # Outlier removal and imputation
+    with metrics.operation("Outlier removal and imputation"):
+        st.subheader("Outlier Removal and Imputation", divider='rainbow')
+        show_outlier_flag = st.checkbox("Do you want to remove outliers?")
+        if show_outlier_flag:
+            imputation_method = st.selectbox("Imputation method", ("mean", "median", "extreme value capping"))
+            if imputation_method == "extreme value capping":
+                imputation_method = []
+            feature_list = st.multiselect(label="Choose features for outlier removal",
+                                          options=da.cont_var)
+            f = st.slider(label="Factor deciding whisker length",
+                          min_value=0.0,
+                          max_value=5.0,
+                          step=0.1)
+            start_call = st.button("Start", disabled=busy())
+            if start_call:
+                logger.info("call for outlier removal")
+                job_runner.submit("outlier removal", da.outlier_removal_imputation,
+                                  remove_outliers = show_outlier_flag,
+                                  imputation_method = imputation_method,
+                                  selected_columns = feature_list,
+                                  lower_extreme = [],
+                                  higher_extreme = [],
+                                  f=f
+                                  )
+            output = render_job("outlier removal")
+            if output is not None:
+                if output["error_code"] ==0:
+                    st.success(output["status_msg"])
+                    st.dataframe(output["output"])
+                else:
+                    st.error(output["status_msg"])
+
+    # Metrics panel
+    with metrics_panel:
+        st.dataframe(metrics.summary())
+        st.dataframe(metrics.frame())
+        profiled = [r for r in metrics.records() if "profile" in r][::-1]
+        if profiled:
+            i = st.selectbox("Profile", range(len(profiled)),
+                             format_func=lambda i: "%s (%.3f s)" % (profiled[i]["operation"], profiled[i]["seconds"]))
+            st.text(profiled[i]["profile"])
+        if st.button("Clear metrics"):
+            metrics.clear()
 except Exception as e:
     print(e)
+
+# Poll running background jobs and exports so that their progress and results are rendered
+exporting = ("figure_exporter" in st.session_state and st.session_state["figure_exporter"].pending()) \
+    or not getattr(st.session_state.get("charts_archive"), "done", lambda: True)()
+if ("job_runner" in st.session_state and st.session_state["job_runner"].busy()) or exporting:
+    time.sleep(0.5)
+    (st.rerun if hasattr(st, "rerun") else st.experimental_rerun)()
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+Server-side reductions for the plots of Data_Analytics.
+
+The figures built here carry a bounded number of points whatever the number
+of rows, so the payload sent to the browser does not grow with the data.
+
+Plotly is imported on first use rather than with the module, so that starting
+the app does not wait for it; prewarm loads it on a background thread while
+the user uploads a document.
+"""
+
+#packages
+import threading
+import importlib
+import numpy as np
+
+PLOTTING_MODULES = ('plotly.graph_objects', 'plotly.subplots', 'plotly.io')
+
+_prewarm_thread = None
+_prewarm_lock = threading.Lock()
+
+
+def _plotly():
+    # graph_objects and make_subplots, imported on first use
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    return go, make_subplots
+
+
+def _load_plotting():
+    for module in PLOTTING_MODULES:
+        importlib.import_module(module)
+    # the trace validators are only loaded when a first figure is built
+    go, _ = _plotly()
+    go.Figure([go.Scatter(x=[0], y=[0]), go.Bar(x=[0], y=[0]), go.Box(y=[0]), go.Heatmap(z=[[0]])])
+
+
+def prewarm(background=True):
+    """
+    Imports the plotting modules ahead of the first plot
+
+    Parameters
+    ----------
+    background : boolean, optional
+        Imports on a daemon thread and returns at once if True, otherwise waits
+        for the imports. The default is True.
+
+    Returns
+    -------
+    threading.Thread or None
+        The thread doing the imports, started once per process
+    """
+    global _prewarm_thread
+    if not background:
+        _load_plotting()
+        return None
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=_load_plotting, name="plotting-prewarm", daemon=True)
+            _prewarm_thread.start()
+        return _prewarm_thread
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Points are sorted by x and split into buckets; from every bucket the point
+    forming the largest triangle with the previously selected point and the
+    average of the next bucket is kept. Peaks and extremes survive.
+
+    Parameters
+    ----------
+    x : numpy array
+        x values without missing values
+    y : numpy array
+        y values without missing values
+    n_out : int
+        Number of points to keep
+
+    Returns
+    -------
+    numpy array
+        Positions of the kept points in x and y
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    order = np.argsort(x, kind='stable')
+    xs, ys = x[order], y[order]
+    every = (n - 2) / (n_out - 2)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = xs[end:next_end].mean()
+        avg_y = ys[end:next_end].mean()
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a])
+                      - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return order[selected]
+
+
+def ols_fit(x, y):
+    """
+    Closed-form ordinary least squares fit of y on x
+
+    Parameters
+    ----------
+    x : numpy array
+        x values without missing values
+    y : numpy array
+        y values without missing values
+
+    Returns
+    -------
+    dictionary
+        slope, intercept, r2 and number of points n
+    """
+    n = len(x)
+    fit = {"slope": np.nan, "intercept": np.nan, "r2": np.nan, "n": n}
+    if n < 2:
+        return fit
+    mean_x = x.sum() / n
+    mean_y = y.sum() / n
+    dx = x - mean_x
+    dy = y - mean_y
+    sxx = np.dot(dx, dx)
+    syy = np.dot(dy, dy)
+    sxy = np.dot(dx, dy)
+    if sxx == 0:
+        return fit
+    slope = sxy / sxx
+    fit.update(slope=slope,
+               intercept=mean_y - slope * mean_x,
+               r2=sxy * sxy / (sxx * syy) if syy > 0 else np.nan)
+    return fit
+
+
+def trend_figure(x, y, x_name, y_name, fit, mode='auto', max_points=5000, bins=100):
+    """
+    Builds the trend figure from the full data and a precomputed fit
+
+    Parameters
+    ----------
+    x : numpy array
+        x values without missing values
+    y : numpy array
+        y values without missing values
+    x_name : str
+        Title of the x-axis
+    y_name : str
+        Title of the y-axis
+    fit : dictionary
+        Result of ols_fit on the full data
+    mode : str, optional
+        'full' plots every point, 'lttb' keeps max_points points, 'density' plots
+        a 2D histogram of bins x bins cells, 'auto' is 'full' up to max_points
+        points and 'lttb' above. The default is 'auto'.
+    max_points : int, optional
+        Maximum number of points sent to the browser. The default is 5000.
+    bins : int, optional
+        Number of cells per axis in density mode. The default is 100.
+
+    Returns
+    -------
+    tuple
+        Plotly figure and the number of plotted points (cells in density mode)
+    """
+    if mode == 'auto':
+        mode = 'full' if len(x) <= max_points else 'lttb'
+    go, _ = _plotly()
+    fig = go.Figure()
+    if mode == 'density':
+        counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+        fig.add_trace(go.Heatmap(x=(x_edges[:-1] + x_edges[1:]) / 2,
+                                 y=(y_edges[:-1] + y_edges[1:]) / 2,
+                                 z=counts.T,
+                                 colorscale='Blues',
+                                 name='count'))
+        n_plotted = counts.size
+    else:
+        keep = np.arange(len(x)) if mode == 'full' else lttb(x, y, max_points)
+        fig.add_trace(go.Scattergl(x=x[keep], y=y[keep], mode='markers', name=y_name))
+        n_plotted = len(keep)
+    if len(x) and np.isfinite(fit["slope"]):
+        line_x = np.array([x.min(), x.max()])
+        fig.add_trace(go.Scatter(x=line_x, y=fit["intercept"] + fit["slope"] * line_x,
+                                 mode='lines', name='OLS trendline',
+                                 hovertemplate='y = %.4g x + %.4g<br>R<sup>2</sup> = %.4f<extra></extra>'
+                                               % (fit["slope"], fit["intercept"], fit["r2"])))
+    fig.update_layout(xaxis_title=x_name, yaxis_title=y_name)
+    return fig, n_plotted
+
+
+def binned_kde(values, grid_size=512, bandwidth=None):
+    """
+    Gaussian kernel density estimate on a fixed grid using linear binning and FFT convolution
+
+    The values are spread over grid_size bins, and the bin weights are convolved with
+    the sampled Gaussian kernel, so the cost is O(n + grid_size log grid_size) instead
+    of O(n * grid_size) for an exact KDE.
+
+    Parameters
+    ----------
+    values : numpy array
+        Values without missing values
+    grid_size : int, optional
+        Number of grid points. The default is 512.
+    bandwidth : float, optional
+        Standard deviation of the kernel. The default is None which uses Scott's rule
+        as scipy.stats.gaussian_kde does.
+
+    Returns
+    -------
+    tuple
+        Grid points and density values, empty arrays if there are less than two distinct values
+    """
+    n = len(values)
+    std = values.std(ddof=1) if n > 1 else 0.0
+    if n < 2 or std == 0:
+        return np.array([]), np.array([])
+    if bandwidth is None:
+        bandwidth = std * n ** (-1 / 5)
+    lo = values.min() - 3 * bandwidth
+    hi = values.max() + 3 * bandwidth
+    grid = np.linspace(lo, hi, grid_size)
+    delta = grid[1] - grid[0]
+
+    # linear binning: every value is split between its two neighbouring grid points
+    position = (values - lo) / delta
+    left = np.clip(np.floor(position).astype(np.int64), 0, grid_size - 2)
+    right_weight = position - left
+    weights = np.bincount(left, weights=1 - right_weight, minlength=grid_size)
+    weights += np.bincount(left + 1, weights=right_weight, minlength=grid_size)
+
+    # kernel sampled on the grid spacing, truncated at 4 bandwidths
+    half_width = min(int(np.ceil(4 * bandwidth / delta)), grid_size - 1)
+    offsets = np.arange(-half_width, half_width + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = grid_size + len(kernel) - 1
+    fft_size = 1 << int(np.ceil(np.log2(size)))
+    density = np.fft.irfft(np.fft.rfft(weights, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    density = density[half_width:half_width + grid_size] / n
+    return grid, np.clip(density, 0, None)
+
+
+def distribution_data(values, max_bins=200, grid_size=512):
+    """
+    Precomputes the histogram and KDE of a feature
+
+    Parameters
+    ----------
+    values : numpy array
+        Values without missing values
+    max_bins : int, optional
+        Maximum number of histogram bins. The default is 200.
+    grid_size : int, optional
+        Number of KDE grid points. The default is 512.
+
+    Returns
+    -------
+    dictionary
+        Histogram densities and bin edges, KDE grid and density
+    """
+    if len(values) == 0:
+        edges = np.array([0.0, 1.0])
+        return {"hist": np.zeros(1), "edges": edges, "grid": np.array([]), "kde": np.array([])}
+    edges = np.histogram_bin_edges(values, bins='auto')
+    if len(edges) - 1 > max_bins:
+        edges = np.histogram_bin_edges(values, bins=max_bins)
+    hist, edges = np.histogram(values, bins=edges, density=True)
+    grid, kde = binned_kde(values, grid_size=grid_size)
+    return {"hist": hist, "edges": edges, "grid": grid, "kde": kde}
+
+
+def distribution_figure(data, feature):
+    """
+    Builds the distribution figure from precomputed histogram and KDE
+
+    Parameters
+    ----------
+    data : dictionary
+        Result of distribution_data
+    feature : str
+        Name of the feature
+
+    Returns
+    -------
+    Plotly figure
+        Histogram bars with the KDE curve, size independent of the number of rows
+    """
+    edges = data["edges"]
+    go, _ = _plotly()
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=data["hist"], width=np.diff(edges),
+                         name=feature, opacity=0.7))
+    if len(data["grid"]):
+        fig.add_trace(go.Scatter(x=data["grid"], y=data["kde"], mode='lines', name='density'))
+    fig.update_layout(bargap=0, xaxis_title=feature, yaxis_title='density')
+    return fig
+
+
+def box_statistics(values, f=1.5):
+    """
+    Computes the box and whisker statistics of a feature
+
+    Parameters
+    ----------
+    values : numpy array
+        Values without missing values
+    f : float, optional
+        Factor deciding whisker length. The default is 1.5.
+
+    Returns
+    -------
+    dictionary
+        q1, median, q3, lower and upper fences (most extreme values within the
+        whiskers) and the whisker limits
+    """
+    if len(values) == 0:
+        return dict.fromkeys(["q1", "median", "q3", "lowerfence", "upperfence", "lower", "upper"], np.nan)
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    lower = q1 - f * (q3 - q1)
+    upper = q3 + f * (q3 - q1)
+    inside = values[(values >= lower) & (values <= upper)]
+    return {"q1": q1, "median": median, "q3": q3,
+            "lowerfence": inside.min() if len(inside) else q1,
+            "upperfence": inside.max() if len(inside) else q3,
+            "lower": lower, "upper": upper}
+
+
+def outlier_figure(feature, box, hist, edges, outliers, hover_columns):
+    """
+    Builds the outlier figure from precomputed box statistics, histogram and flagged rows
+
+    Parameters
+    ----------
+    feature : str
+        Name of the feature
+    box : dictionary
+        Result of box_statistics
+    hist : numpy array
+        Counts of the histogram bins
+    edges : numpy array
+        Edges of the histogram bins
+    outliers : Pandas DataFrame
+        Flagged rows shown as hover points
+    hover_columns : list
+        Columns of outliers shown in the hover text
+
+    Returns
+    -------
+    Plotly figure
+        Box on top of the histogram with the outlier points
+    """
+    go, make_subplots = _plotly()
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.25, 0.75], vertical_spacing=0.02)
+    fig.add_trace(go.Box(y=[feature], q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]],
+                         lowerfence=[box["lowerfence"]], upperfence=[box["upperfence"]],
+                         orientation='h', name=feature, boxpoints=False, showlegend=False),
+                  row=1, col=1)
+    if len(outliers):
+        hover = "<br>".join("%s: %%{customdata[%d]}" % (col, i) for i, col in enumerate(hover_columns))
+        fig.add_trace(go.Scatter(x=outliers[feature], y=[feature] * len(outliers), mode='markers',
+                                 name='outliers', customdata=outliers[hover_columns].astype(str).to_numpy(),
+                                 hovertemplate=hover + "<extra></extra>"),
+                      row=1, col=1)
+    fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=hist, width=np.diff(edges),
+                         name=feature, showlegend=False),
+                  row=2, col=1)
+    fig.update_layout(bargap=0, yaxis2_title='count')
+    fig.update_xaxes(title_text=feature, row=2, col=1)
+    return fig
+
+
+def correlation_figure(correlation, names, pairs=None, max_labels=30):
+    """
+    Builds the heatmap of a correlation matrix
+
+    Parameters
+    ----------
+    correlation : numpy array
+        Square correlation matrix
+    names : list
+        Names of the features
+    pairs : dictionary, optional
+        Matrices of pairwise_regression shown in the hover text. The default is None.
+    max_labels : int, optional
+        Correlations are written in the cells up to this number of features. The default is 30.
+
+    Returns
+    -------
+    Plotly figure
+        Heatmap on a diverging scale from -1 to 1
+    """
+    go, _ = _plotly()
+    names = [str(name) for name in names]
+    hover = "x: %{x}<br>y: %{y}<br>r: %{z:.3f}"
+    customdata = None
+    if pairs is not None:
+        # cell (row y, column x) shows the fit of x on y
+        customdata = np.dstack([pairs["Slope"], pairs["Intercept"], pairs["R2"], pairs["Count"]])
+        hover += "<br>%{x} = %{customdata[0]:.4g} * %{y} + %{customdata[1]:.4g}" \
+                 "<br>R²: %{customdata[2]:.3f}<br>rows: %{customdata[3]}"
+    fig = go.Figure(go.Heatmap(z=correlation, x=names, y=names, zmin=-1, zmax=1, colorscale='RdBu',
+                               reversescale=True, customdata=customdata, hovertemplate=hover + "<extra></extra>",
+                               texttemplate="%{z:.2f}" if len(names) <= max_labels else None))
+    fig.update_layout(yaxis_autorange='reversed', xaxis_side='top')
+    return fig
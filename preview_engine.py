@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded-cost previews of the working dataset.
+
+Sorting and filtering produce arrays of row positions which are cached by
+Data_Analytics until the columns involved change. Every page is then a slice
+of those positions, so only page_size rows are ever materialized and sent to
+the browser, whatever the size of the dataset.
+"""
+
+#packages
+import operator
+import numpy as np
+import pandas as pd
+
+FILTER_OPERATORS = {'==': operator.eq,
+                    '!=': operator.ne,
+                    '<': operator.lt,
+                    '<=': operator.le,
+                    '>': operator.gt,
+                    '>=': operator.ge,
+                    }
+PREVIEW_MODES = ('page', 'head', 'sample', 'stratified')
+
+
+def sort_order(series, ascending=True):
+    """
+    Computes the sort order of a column, missing values last
+
+    Values are ranked once through pd.factorize(sort=True), so the order of
+    columns of any dtype is a stable argsort of integer codes. As with
+    DataFrame.sort_values(kind='stable'), equal values keep their row order
+    in both directions.
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Column to sort by
+    ascending : boolean, optional
+        Sort direction. The default is True.
+
+    Returns
+    -------
+    tuple
+        Row positions in sorted order and the number of non missing values
+    """
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+    n_valid = int((codes >= 0).sum())
+    if not ascending:
+        codes = np.where(codes < 0, codes, len(uniques) - 1 - codes)
+    codes = np.where(codes < 0, len(uniques), codes)
+    return np.argsort(codes, kind='stable'), n_valid
+
+
+def filter_mask(df, filters):
+    """
+    Evaluates filters on a dataframe
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    filters : list
+        (column, operator, value) tuples combined with AND. Operators are those of
+        FILTER_OPERATORS, 'contains' (case insensitive substring), 'isna' and 'notna'.
+
+    Returns
+    -------
+    numpy array
+        Boolean mask of the rows passing every filter
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        series = df[column]
+        if op == 'isna':
+            passed = series.isna()
+        elif op == 'notna':
+            passed = series.notna()
+        elif op == 'contains':
+            passed = series.astype(str).str.contains(str(value), case=False, regex=False) & series.notna()
+        elif op in FILTER_OPERATORS:
+            passed = FILTER_OPERATORS[op](series, value)
+        else:
+            raise ValueError("Unsupported filter operator: %s" % op)
+        mask &= np.asarray(passed.fillna(False) if hasattr(passed, 'fillna') else passed, dtype=bool)
+    return mask
+
+
+def filters_to_sql(filters, quote, literal):
+    """
+    Translates filters into an SQL condition
+
+    Parameters
+    ----------
+    filters : list
+        (column, operator, value) tuples, see filter_mask
+    quote : callable
+        Quotes a column name
+    literal : callable
+        Converts a value into an SQL literal
+
+    Returns
+    -------
+    str
+        SQL condition, TRUE without filters
+    """
+    conditions = []
+    for column, op, value in filters:
+        name = quote(column)
+        if op == 'isna':
+            conditions.append("%s IS NULL" % name)
+        elif op == 'notna':
+            conditions.append("%s IS NOT NULL" % name)
+        elif op == 'contains':
+            conditions.append("contains(lower(CAST(%s AS VARCHAR)), %s)" % (name, literal(str(value).lower())))
+        elif op == '!=':
+            # missing values differ from any value, as with pandas
+            conditions.append("%s IS DISTINCT FROM %s" % (name, literal(value)))
+        elif op in FILTER_OPERATORS:
+            conditions.append("%s %s %s" % (name, '=' if op == '==' else op, literal(value)))
+        else:
+            raise ValueError("Unsupported filter operator: %s" % op)
+    return " AND ".join("coalesce(%s, FALSE)" % c for c in conditions) if conditions else "TRUE"
+
+
+def stratified_positions(codes, n_rows, seed=0):
+    """
+    Draws a sample of n_rows rows with the groups represented in proportion
+
+    Rows are shuffled once, stably grouped and the first rows of every group are kept,
+    so the draw is a single vectorized pass without a loop over groups. Quotas are
+    allocated by largest remainder and always sum to n_rows: with more groups than
+    rows, the groups drawing a row are picked at random among those of equal size.
+
+    Parameters
+    ----------
+    codes : numpy array
+        Group code of every row, missing values being a group of their own
+    n_rows : int
+        Size of the sample
+    seed : int, optional
+        Seed of the random draw. The default is 0.
+
+    Returns
+    -------
+    numpy array
+        Sorted row positions of the sample
+    """
+    n = len(codes)
+    if n <= n_rows:
+        return np.arange(n)
+    _, codes = np.unique(codes, return_inverse=True)
+    sizes = np.bincount(codes)
+    rng = np.random.default_rng(seed)
+    # whole part of the proportional quotas, the remaining rows go to the largest remainders
+    exact = sizes * (n_rows / n)
+    quotas = np.floor(exact).astype(np.int64)
+    remainders = exact - quotas
+    order = np.lexsort((rng.random(len(sizes)), -remainders))
+    quotas[order[:n_rows - quotas.sum()]] += 1
+    shuffled = rng.permutation(n)
+    grouped = shuffled[np.argsort(codes[shuffled], kind='stable')]
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(n) - np.repeat(starts, sizes)
+    return np.sort(grouped[rank < np.repeat(quotas, sizes)])
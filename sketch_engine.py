@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Mergeable sketches for approximate descriptive statistics.
+
+Every sketch is updated with one chunk of rows at a time and two sketches of
+the same kind built on different chunks can be merged, so statistics of very
+large datasets are computed in a single streaming pass with bounded memory:
+
+    KLL_Sketch       quartiles and median, rank error of about 2.3 / k
+    HyperLogLog      number of distinct values, relative error 1.04 / sqrt(m)
+    Heavy_Hitters    most frequent value (Misra-Gries), count error below n / (k + 1)
+
+Mean, variance, min, max and counts stay exact.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+from stats_engine import CONT_STATS, CATEG_STATS
+
+APPROX_CONT_STATS = CONT_STATS + ['Quantile_Rank_Error']
+APPROX_CATEG_STATS = CATEG_STATS + ['Count_of_Unique_Values_Error', 'Mode_Count_Error']
+
+
+def _hash_values(values):
+    # 64 bit hashes of distinct values, equal values of every chunk get the same hash;
+    # the values are already distinct, hashing them needs no factorization
+    return pd.util.hash_array(np.asarray(values), categorize=False)
+
+
+def _first_sorted(values):
+    # the smallest of tied values, as stats_engine reports modes
+    try:
+        return sorted(values)[0]
+    except TypeError:
+        return values[0]
+
+
+class KLL_Sketch():
+    """
+    KLL quantile sketch
+
+    Values are kept in levels of compactors, an item of level h standing for 2**h
+    values. A full level is sorted and every other item, starting at a random
+    offset, is promoted to the next level.
+
+    Attributes
+    ----------
+    k : int
+        Capacity of the top level, decides the accuracy
+    n : int
+        Number of values added
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, k=200, seed=0):
+        self.k = max(int(k), 8)
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def k_for_error(rank_error):
+        """Returns the k reaching a normalized rank error, at 99% confidence"""
+        return int(np.ceil((2.296 / rank_error) ** (1 / 0.9723)))
+
+    @property
+    def rank_error(self):
+        """Normalized rank error of the quantiles, at 99% confidence"""
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item stays at this level
+                kept = items[len(items) - len(items) % 2:]
+                promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """
+        Adds values
+
+        Parameters
+        ----------
+        values : numpy array
+            Values without missing values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        self.n += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Adds the values summarized by another sketch"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Returns approximate quantiles
+
+        Parameters
+        ----------
+        q : float or list
+            Quantiles between 0 and 1
+
+        Returns
+        -------
+        numpy array
+            Approximate values of the quantiles, NaN if the sketch is empty
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return items[np.clip(position, 0, len(items) - 1)]
+
+
+class HyperLogLog():
+    """
+    HyperLogLog distinct count sketch
+
+    Value hashes are kept exactly while they are few (sparse mode), so small
+    cardinalities are exact, and are folded into 2**p registers afterwards.
+
+    Attributes
+    ----------
+    p : int
+        Number of index bits, the sketch has 2**p registers
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, p=12):
+        self.p = min(max(int(p), 4), 18)
+        self.m = 1 << self.p
+        self.registers = None
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    @staticmethod
+    def p_for_error(relative_error):
+        """Returns the number of index bits reaching a relative standard error"""
+        return int(np.ceil(np.log2((1.04 / relative_error) ** 2)))
+
+    @property
+    def relative_error(self):
+        """Relative standard error of the estimate, 0 while the count is exact"""
+        return 0.0 if self.registers is None else 1.04 / np.sqrt(self.m)
+
+    def _add_hashes(self, hashes):
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        rank = np.full(len(hashes), 64 - self.p + 1, dtype=np.uint8)
+        nonzero = rest != 0
+        rank[nonzero] = 64 - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def _add(self, hashes):
+        if self.registers is None:
+            self.hashes = np.union1d(self.hashes, hashes)
+            if len(self.hashes) <= self.m // 4:
+                return
+            hashes, self.hashes = self.hashes, np.empty(0, dtype=np.uint64)
+            self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._add_hashes(hashes)
+
+    def update(self, series):
+        """
+        Adds values
+
+        Parameters
+        ----------
+        series : Pandas Series
+            Values without missing values
+        """
+        if len(series):
+            self.update_distinct(pd.unique(series))
+
+    def update_distinct(self, uniques):
+        """
+        Adds distinct values, only they are hashed
+
+        Parameters
+        ----------
+        uniques : array-like
+            Distinct values without missing values, e.g. the uniques of pd.factorize
+        """
+        if len(uniques):
+            self._add(_hash_values(uniques))
+
+    def merge(self, other):
+        """Adds the values summarized by another sketch with the same p"""
+        if other.registers is None:
+            self._add(other.hashes)
+        else:
+            if self.registers is None:
+                hashes = self.hashes
+                self.registers, self.hashes = other.registers.copy(), np.empty(0, dtype=np.uint64)
+                if len(hashes):
+                    self._add_hashes(hashes)
+            else:
+                np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Returns the estimated number of distinct values"""
+        if self.registers is None:
+            return len(self.hashes)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # linear counting for small cardinalities
+            return int(round(self.m * np.log(self.m / zeros)))
+        return int(round(raw))
+
+
+class Heavy_Hitters():
+    """
+    Misra-Gries summary of the most frequent values
+
+    At most k counters are kept. When more values are tracked, the (k+1)-th largest
+    count is subtracted from every counter and non positive counters are dropped,
+    which bounds the undercount of every value by the total subtracted.
+
+    Attributes
+    ----------
+    k : int
+        Number of counters
+    n : int
+        Number of values added
+    error : int
+        Maximum undercount of any value, at most n / (k + 1)
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, k=1000):
+        self.k = max(int(k), 1)
+        self.n = 0
+        self.error = 0
+        self.values = np.empty(0, dtype=object)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def k_for_error(count_error):
+        """Returns the number of counters keeping the count error below a fraction of the values"""
+        return max(int(np.ceil(1 / count_error)) - 1, 1)
+
+    def _reduce(self, values, counts):
+        # Misra-Gries reduction: the (k+1)-th largest count is subtracted and only the
+        # larger counts are kept, at most k of them
+        if len(counts) <= self.k:
+            return values, counts
+        top = np.argpartition(counts, len(counts) - self.k - 1)
+        threshold = counts[top[len(counts) - self.k - 1]]
+        top = top[len(counts) - self.k:]
+        top = top[counts[top] > threshold]
+        self.error += int(threshold)
+        return values[top], counts[top] - threshold
+
+    def _add(self, values, counts, n):
+        self.n += n
+        positive = counts > 0
+        values, counts = self._reduce(np.asarray(values, dtype=object)[positive], counts[positive])
+        if len(self.counts):
+            # at most 2k counters are merged, values are matched by factorizing them together
+            codes, uniques = pd.factorize(np.concatenate([self.values, values]))
+            counts = np.bincount(codes, weights=np.concatenate([self.counts, counts]), minlength=len(uniques))
+            values, counts = self._reduce(np.asarray(uniques, dtype=object), counts.astype(np.int64))
+        self.values, self.counts = values, counts
+
+    def update(self, series):
+        """
+        Adds values
+
+        Parameters
+        ----------
+        series : Pandas Series
+            Values without missing values
+        """
+        codes, uniques = pd.factorize(series)
+        self.update_counts(uniques, np.bincount(codes, minlength=len(uniques)), len(series))
+
+    def update_counts(self, values, counts, n):
+        """
+        Adds the exact counts of the distinct values of a chunk
+
+        Only the k largest counts are merged into the summary.
+
+        Parameters
+        ----------
+        values : array-like
+            Distinct values, e.g. the uniques of pd.factorize
+        counts : numpy array
+            Number of occurrences of every value
+        n : int
+            Number of values of the chunk
+        """
+        self._add(values, np.asarray(counts, dtype=np.int64), n)
+
+    def merge(self, other):
+        """Adds the values summarized by another summary"""
+        self._add(other.values, other.counts, other.n)
+        self.error += other.error
+        return self
+
+    def mode(self):
+        """Returns the most frequent value, the smallest one if tied. NaN if empty."""
+        if len(self.counts) == 0:
+            return np.nan
+        return _first_sorted(list(self.values[self.counts == self.counts.max()]))
+
+
+class Continuous_Sketch():
+    """
+    Streaming summary of a continuous column
+
+    Count, mean, variance (merged with Chan's formula), min and max are exact,
+    quartiles and median come from a KLL sketch.
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, quantile_error=0.01, seed=0):
+        self.n = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.kll = KLL_Sketch(KLL_Sketch.k_for_error(quantile_error), seed)
+
+    def _combine(self, n, mean, m2, v_min, v_max):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.min = min(self.min, v_min)
+        self.max = max(self.max, v_max)
+
+    def update(self, values):
+        """
+        Adds a chunk of values
+
+        Parameters
+        ----------
+        values : numpy array
+            float values with NaN for missing values
+        """
+        missing = np.isnan(values)
+        n_missing = int(missing.sum())
+        self.missing += n_missing
+        if n_missing:
+            values = values[~missing]
+        if values.size == 0:
+            return
+        mean = values.sum() / values.size
+        deviations = values - mean
+        self._combine(values.size, mean, np.dot(deviations, deviations), values.min(), values.max())
+        self.kll.update(values)
+
+    def merge(self, other):
+        """Adds the values summarized by another sketch"""
+        self.missing += other.missing
+        if other.n:
+            self._combine(other.n, other.mean, other.m2, other.min, other.max)
+            self.kll.merge(other.kll)
+        return self
+
+    def stats(self):
+        """
+        Returns the statistics
+
+        Returns
+        -------
+        dictionary
+            Values of APPROX_CONT_STATS and the missing values count
+        """
+        stats = dict.fromkeys(CONT_STATS, np.nan)
+        stats['Missing'] = self.missing
+        stats['Quantile_Rank_Error'] = self.kll.rank_error
+        if self.n == 0:
+            return stats
+        variance = self.m2 / (self.n - 1) if self.n > 1 else np.nan
+        q1, median, q3 = self.kll.quantile([0.25, 0.5, 0.75])
+        stats.update(Mean=self.mean,
+                     Standard_Deviation=np.sqrt(variance),
+                     Variance=variance,
+                     Min=self.min,
+                     Max=self.max,
+                     # the sketch may step past the exact extremes
+                     First_Quartile=min(max(q1, self.min), self.max),
+                     Median=min(max(median, self.min), self.max),
+                     Third_Quartile=min(max(q3, self.min), self.max))
+        return stats
+
+
+class Categorical_Sketch():
+    """
+    Streaming summary of a categorical column
+
+    Counts are exact, distinct values come from a HyperLogLog sketch and the mode
+    from a Misra-Gries summary.
+
+    Methods
+    -------
+        Details of the method are given with each method
+    """
+    def __init__(self, unique_error=0.01, mode_error=0.001):
+        self.count = 0
+        self.missing = 0
+        self.hll = HyperLogLog(HyperLogLog.p_for_error(unique_error))
+        self.heavy_hitters = Heavy_Hitters(Heavy_Hitters.k_for_error(mode_error))
+
+    def update(self, series):
+        """
+        Adds a chunk of values
+
+        The chunk is factorized once: its distinct values feed the HyperLogLog sketch
+        and their counts the Misra-Gries summary.
+
+        Parameters
+        ----------
+        series : Pandas Series
+            Values with missing values
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+        n_valid = len(series) - int(counts[0])
+        self.missing += int(counts[0])
+        self.count += n_valid
+        self.hll.update_distinct(uniques)
+        self.heavy_hitters.update_counts(uniques, counts[1:], n_valid)
+
+    def merge(self, other):
+        """Adds the values summarized by another sketch"""
+        self.count += other.count
+        self.missing += other.missing
+        self.hll.merge(other.hll)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        return self
+
+    def stats(self):
+        """
+        Returns the statistics
+
+        Returns
+        -------
+        dictionary
+            Values of APPROX_CATEG_STATS and the missing values count
+        """
+        return {'Count': self.count,
+                'Count_of_Unique_Values': self.hll.estimate(),
+                'Mode': self.heavy_hitters.mode(),
+                'Missing': self.missing,
+                'Count_of_Unique_Values_Error': self.hll.relative_error,
+                'Mode_Count_Error': self.heavy_hitters.error,
+                }
@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized descriptive statistics engine.
+
+Every column is converted to a NumPy array once. Mean and variance come from
+a sum and one centered dot product, min, quartiles, median and max from a
+single np.quantile call, and categorical modes from hash based counting
+(pd.factorize + np.bincount) instead of sorting every value.
+
+Grouped summaries use the same formulas for every group at once: rows are
+hashed into group codes, sums and centered sums of squares are weighted
+bincounts, and one lexsort by group and value gives the quantiles of all
+groups, so there is no Python loop over the groups.
+"""
+
+#packages
+import warnings
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+CONT_STATS = ['Mean', 'Standard_Deviation', 'Variance', 'Min', 'Max',
+              'First_Quartile', 'Median', 'Third_Quartile']
+CATEG_STATS = ['Count', 'Count_of_Unique_Values', 'Mode']
+
+
+def to_float_array(series):
+    """
+    Returns the values of a numeric column as a float array with NaN for missing values
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Numeric, boolean or nullable column
+
+    Returns
+    -------
+    numpy array
+        float64 values of the column
+    """
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def continuous_column_stats(series):
+    """
+    Computes the summary statistics of a continuous column
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Continuous column
+
+    Returns
+    -------
+    dictionary
+        Values of CONT_STATS and the missing values count
+    """
+    values = to_float_array(series)
+    missing = np.isnan(values)
+    n_missing = int(missing.sum())
+    if n_missing:
+        values = values[~missing]
+    stats = dict.fromkeys(CONT_STATS, np.nan)
+    stats['Missing'] = n_missing
+    n = values.size
+    if n == 0:
+        return stats
+    mean = values.sum() / n
+    deviations = values - mean
+    variance = np.dot(deviations, deviations) / (n - 1) if n > 1 else np.nan
+    q_min, q1, median, q3, q_max = np.quantile(values, QUANTILES)
+    stats.update(Mean=mean,
+                 Standard_Deviation=np.sqrt(variance),
+                 Variance=variance,
+                 Min=q_min,
+                 Max=q_max,
+                 First_Quartile=q1,
+                 Median=median,
+                 Third_Quartile=q3)
+    return stats
+
+
+def _first_sorted(values):
+    # pandas reports the smallest of tied modes
+    try:
+        return sorted(values)[0]
+    except TypeError:
+        return values[0]
+
+
+def column_mode(series):
+    """
+    Returns the most frequent value of a column using hash based counting
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Column of any dtype
+
+    Returns
+    -------
+    any type
+        Most frequent value, the smallest one if tied. NaN if the column is empty.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    codes = codes[codes >= 0]
+    if codes.size == 0:
+        return np.nan
+    counts = np.bincount(codes, minlength=len(uniques))
+    candidates = np.flatnonzero(counts == counts.max())
+    return _first_sorted(list(np.asarray(uniques, dtype=object)[candidates]))
+
+
+def categorical_column_stats(series):
+    """
+    Computes the summary statistics of a categorical column
+
+    Parameters
+    ----------
+    series : Pandas Series
+        Categorical column
+
+    Returns
+    -------
+    dictionary
+        Values of CATEG_STATS, the missing values count and the value counts
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    valid = codes >= 0
+    count = int(valid.sum())
+    stats = {'Count': count,
+             'Count_of_Unique_Values': len(uniques),
+             'Mode': np.nan,
+             'Missing': len(codes) - count,
+             'Value_Counts': pd.Series([], dtype='int64'),
+             }
+    if count:
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        stats['Value_Counts'] = pd.Series(counts, index=uniques).sort_values(ascending=False, kind='stable')
+        candidates = np.flatnonzero(counts == counts.max())
+        stats['Mode'] = _first_sorted(list(np.asarray(uniques, dtype=object)[candidates]))
+    return stats
+
+
+def summary_frame(stats, columns, names):
+    """
+    Assembles per-column statistics into a summary dataframe
+
+    Parameters
+    ----------
+    stats : list
+        Dictionaries returned by the column statistics functions
+    columns : list
+        Names of the statistics, used as columns of the frame
+    names : list
+        Names of the features, used as index of the frame
+
+    Returns
+    -------
+    Pandas DataFrame
+        Summary with one row per feature
+    """
+    data = {col: [s[col] for s in stats] for col in columns}
+    return pd.DataFrame(data, index=pd.Index(names), columns=columns)
+
+
+def continuous_summary(df, columns):
+    """
+    Computes the summary of the continuous columns of a dataframe
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    columns : list
+        Continuous columns
+
+    Returns
+    -------
+    Pandas DataFrame
+        Summary with the columns of CONT_STATS
+    """
+    columns = list(columns)
+    return summary_frame([continuous_column_stats(df[c]) for c in columns], CONT_STATS, columns)
+
+
+def categorical_summary(df, columns):
+    """
+    Computes the summary of the categorical columns of a dataframe
+
+    Parameters
+    ----------
+    df : Pandas DataFrame
+        Data
+    columns : list
+        Categorical columns
+
+    Returns
+    -------
+    Pandas DataFrame
+        Summary with the columns of CATEG_STATS
+    """
+    columns = list(columns)
+    return summary_frame([categorical_column_stats(df[c]) for c in columns], CATEG_STATS, columns)
+
+
+def group_codes(keys, dropna=True):
+    """
+    Hashes the rows into dense group codes
+
+    Parameters
+    ----------
+    keys : list
+        Pandas Series or arrays of the grouping columns, all of the same length
+    dropna : boolean, optional
+        Rows with a missing key get the code -1 if True, otherwise missing values
+        form a group of their own. The default is True.
+
+    Returns
+    -------
+    tuple
+        Group code of every row and a dataframe of the keys of every group, groups
+        being sorted by their keys
+    """
+    codes, levels = [], []
+    for key in keys:
+        key_codes, uniques = pd.factorize(key, sort=True, use_na_sentinel=dropna)
+        codes.append(key_codes)
+        levels.append(uniques)
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    sizes = [len(u) for u in levels]
+    combined = np.full(len(codes[0]), -1, dtype=np.int64)
+    if valid.any():
+        combined[valid] = np.ravel_multi_index([c[valid] for c in codes], sizes)
+    # only the observed combinations become groups, in the order of their keys
+    observed, dense = np.unique(combined[valid], return_inverse=True)
+    combined[valid] = dense
+    group_keys = np.unravel_index(observed, sizes) if len(sizes) else []
+    frame = pd.DataFrame({i: np.asarray(level, dtype=object)[positions] if len(level) else []
+                          for i, (level, positions) in enumerate(zip(levels, group_keys))})
+    return combined, frame
+
+
+def grouped_continuous_stats(codes, n_groups, values):
+    """
+    Computes the summary statistics of a continuous column for every group
+
+    Parameters
+    ----------
+    codes : numpy array
+        Group code of every row, -1 for rows out of every group
+    n_groups : int
+        Number of groups
+    values : numpy array
+        float64 values of the column with NaN for missing values
+
+    Returns
+    -------
+    dictionary
+        Arrays of n_groups values of CONT_STATS, Count and Missing
+    """
+    in_group = codes >= 0
+    missing = np.isnan(values)
+    valid = in_group & ~missing
+    n = np.bincount(codes[valid], minlength=n_groups)
+    n_missing = np.bincount(codes[in_group & missing], minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes[valid], weights=values[valid], minlength=n_groups) / n
+        deviations = values[valid] - mean[codes[valid]]
+        variance = np.bincount(codes[valid], weights=deviations * deviations, minlength=n_groups) / (n - 1)
+    variance[n < 2] = np.nan
+    stats = {'Count': n, 'Missing': n_missing, 'Mean': mean,
+             'Standard_Deviation': np.sqrt(variance), 'Variance': variance}
+
+    # one sort by group and value, the valid values of group g are then sorted[starts[g]:starts[g] + n[g]]
+    group_of = codes[valid]
+    sorted_values = values[valid][np.lexsort((values[valid], group_of))]
+    starts = np.concatenate([[0], np.cumsum(n)[:-1]]).astype(np.int64)
+    empty = n == 0
+    last = np.maximum(n - 1, 0)
+    for name, q in zip(['Min', 'First_Quartile', 'Median', 'Third_Quartile', 'Max'], QUANTILES):
+        # linear interpolation between the closest ranks, as np.quantile
+        position = q * last
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        fraction = position - lower
+        if sorted_values.size:
+            low = sorted_values[np.minimum(starts + lower, sorted_values.size - 1)]
+            high = sorted_values[np.minimum(starts + upper, sorted_values.size - 1)]
+            quantile = low + fraction * (high - low)
+        else:
+            quantile = np.full(n_groups, np.nan)
+        quantile[empty] = np.nan
+        stats[name] = quantile
+    return stats
+
+
+def grouped_summary_frame(group_keys, group_by, stats, names, columns=None):
+    """
+    Assembles per-group statistics into a tidy summary dataframe
+
+    Parameters
+    ----------
+    group_keys : Pandas DataFrame
+        Keys of every group, one column per grouping column
+    group_by : list
+        Names of the grouping columns
+    stats : list
+        Dictionaries of per-group arrays, one per feature
+    names : list
+        Names of the features
+    columns : list, optional
+        Names of the statistics. The default is None which uses Count, CONT_STATS and Missing.
+
+    Returns
+    -------
+    Pandas DataFrame
+        One row per group and feature, indexed by the group keys and the feature
+    """
+    columns = columns or ['Count'] + CONT_STATS + ['Missing']
+    n_groups, n_features = len(group_keys), len(names)
+    arrays = [np.repeat(np.asarray(group_keys.iloc[:, i], dtype=object), n_features) for i in range(len(group_by))]
+    arrays.append(np.tile(np.asarray(names, dtype=object), n_groups))
+    index = pd.MultiIndex.from_arrays(arrays, names=list(group_by) + ['Feature'])
+    # rows are grouped by group, then by feature
+    data = {col: np.column_stack([s[col] for s in stats]).ravel() if n_features else [] for col in columns}
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def rank_order(values):
+    """
+    Sorts the valid values of a column once for ranking any subset of its rows
+
+    Parameters
+    ----------
+    values : numpy array
+        float values with NaN for missing values
+
+    Returns
+    -------
+    tuple
+        Positions of the valid values in ascending order of value and the tie group
+        of every sorted position, equal values sharing a group
+    """
+    valid = np.flatnonzero(~np.isnan(values))
+    order = valid[np.argsort(values[valid], kind='stable')]
+    ordered = values[order]
+    groups = np.concatenate([[0], np.cumsum(ordered[1:] != ordered[:-1])]).astype(np.int64)
+    return order, groups[:len(order)]
+
+
+def masked_ranks(order, groups, mask):
+    """
+    Average ranks of a column among the rows of a mask, in linear time
+
+    Parameters
+    ----------
+    order, groups : numpy array
+        Returned by rank_order
+    mask : numpy array
+        Boolean mask of the rows ranked
+
+    Returns
+    -------
+    numpy array
+        Rank of every row of the mask, ties sharing their average rank, NaN elsewhere
+    """
+    inside = mask[order]
+    counts = np.bincount(groups, weights=inside, minlength=groups[-1] + 1 if len(groups) else 0)
+    average = np.cumsum(counts) - counts + (counts + 1) / 2
+    ranks = np.full(len(mask), np.nan)
+    ranks[order[inside]] = average[groups[inside]]
+    return ranks
+
+
+def spearman_correlation(arrays, chunk_size=100000):
+    """
+    Computes the Spearman correlation of every pair of columns
+
+    Like DataFrame.corr(method='spearman'), the values of a pair are ranked over
+    the rows where both columns are valid. Every column is ranked once over its
+    own valid values and the pairs whose valid rows are the same for both columns
+    come from pairwise_regression of these ranks. The other pairs are ranked again
+    over their common rows, in linear time from the sort order of the columns.
+    Columns are grouped by their pattern of missing values: all the pairs of two
+    groups share their rows, so every column is ranked once per pair of groups and
+    the correlations of the pairs come from one matrix product. When every column
+    misses different rows, each pair is ranked on its own, like pandas does.
+
+    Parameters
+    ----------
+    arrays : list
+        float64 arrays of the columns with NaN for missing values
+    chunk_size : int, optional
+        Number of rows multiplied at a time. The default is 100000.
+
+    Returns
+    -------
+    numpy array
+        Correlation matrix, NaN for pairs with less than two rows where both columns are valid
+    """
+    orders = [rank_order(values) for values in arrays]
+    valids = [~np.isnan(values) for values in arrays]
+    ranks = [masked_ranks(order, groups, valid) for (order, groups), valid in zip(orders, valids)]
+    n_rows = len(arrays[0]) if len(arrays) else 0
+    pairs = pairwise_regression(np.column_stack([r[start:start + chunk_size] for r in ranks])
+                                for start in range(0, n_rows, chunk_size))
+    correlation, count = pairs['Correlation'], pairs['Count']
+    n_valid = np.diag(count)
+    # columns missing the same rows form a group, the pairs within a group use the ranks above
+    codes, patterns = pd.factorize(pd.Series([np.packbits(valid).tobytes() for valid in valids]))
+    members = [np.flatnonzero(codes == code) for code in range(len(patterns))]
+    for g, h in zip(*np.triu_indices(len(members), k=1)):
+        first, second = members[g], members[h]
+        mask = valids[first[0]] & valids[second[0]]
+        n_common = int(count[first[0], second[0]])
+        if n_common < 2:
+            continue
+        # a column whose valid rows are all common keeps its ranks, ranks average (n_common + 1) / 2
+        x, y = (np.array([(ranks[i] if n_valid[i] == n_common else masked_ranks(*orders[i], mask))[mask]
+                          for i in group]) - (n_common + 1) / 2 for group in (first, second))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            value = (x @ y.T) / np.sqrt((x * x).sum(axis=1)[:, None] * (y * y).sum(axis=1)[None, :])
+        value = np.clip(value, -1.0, 1.0)
+        correlation[first[:, None], second] = value
+        correlation[second[:, None], first] = value.T
+    return correlation
+
+
+def pairwise_regression(chunks):
+    """
+    Computes the correlation and the least squares line of every pair of columns
+
+    Counts, sums, sums of squares and cross products over the rows where both
+    columns of a pair are valid are accumulated as four matrix products per chunk
+    of rows, so the whole matrix costs a few BLAS calls and only one chunk of rows
+    is held at a time. Values are shifted by the means of the first chunk to avoid
+    cancellation in the sums of squares.
+
+    Parameters
+    ----------
+    chunks : iterable
+        float64 arrays of shape (rows, columns) with NaN for missing values
+
+    Returns
+    -------
+    dictionary
+        Matrices where the entry (i, j) describes column j as a linear function of
+        column i on the rows where both are valid: Count, Correlation, Slope,
+        Intercept and R2
+    """
+    count = sum_x = sum_xx = sum_xy = shift = None
+    for values in chunks:
+        if shift is None:
+            with np.errstate(invalid='ignore'), warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                shift = np.nan_to_num(np.nanmean(values, axis=0))
+            n_columns = values.shape[1]
+            count, sum_x, sum_xx, sum_xy = (np.zeros((n_columns, n_columns)) for _ in range(4))
+        valid = ~np.isnan(values)
+        mask = valid.astype(np.float64)
+        x = np.where(valid, values - shift, 0.0)
+        count += mask.T @ mask
+        # sum_x[i, j] is the sum of column i over the rows where column j is valid too
+        sum_x += x.T @ mask
+        sum_xx += (x * x).T @ mask
+        sum_xy += x.T @ x
+    if count is None:
+        empty = np.zeros((0, 0))
+        return {'Count': empty, 'Correlation': empty, 'Slope': empty, 'Intercept': empty, 'R2': empty}
+    sum_y, sum_yy = sum_x.T, sum_xx.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sxx = count * sum_xx - sum_x * sum_x
+        syy = count * sum_yy - sum_y * sum_y
+        sxy = count * sum_xy - sum_x * sum_y
+        slope = sxy / sxx
+        correlation = np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0)
+        # intercept of the shifted values, then back to the original scale
+        intercept = (sum_y - slope * sum_x) / count + shift[None, :] - slope * shift[:, None]
+    too_few = count < 2
+    for matrix in (slope, correlation, intercept):
+        matrix[too_few] = np.nan
+    return {'Count': count.astype(np.int64),
+            'Correlation': correlation,
+            'Slope': slope,
+            'Intercept': intercept,
+            'R2': correlation * correlation,
+            }
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of the cleaning plan on both backends.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from duckdb_engine import duckdb
+from cleaning_engine import foreign_value_mask
+
+BACKENDS = ['pandas', pytest.param('duckdb', marks=pytest.mark.skipif(duckdb is None, reason="duckdb is not installed"))]
+
+
+def cleaned(backend, df, **kwargs):
+    """Runs build_cleaning_plan and execute_cleaning_plan on df and returns the cleaned frame"""
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    plan = da.build_cleaning_plan(**kwargs)
+    assert plan["error_code"] == 0, plan["error_trace"]
+    output = da.execute_cleaning_plan(plan["output"])
+    assert output["error_code"] == 0, output["error_trace"]
+    return da.table.to_frame() if da.table is not None else da.df
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_outliers_and_missing_values_use_their_own_method(backend):
+    df = pd.DataFrame({"x": [1, 1, 1, 1, 2, 2, 2, 50, 60, 1000, np.nan]})
+    result = cleaned(backend, df, impute_missing_rows_continuous='mean',
+                     outlier_columns=["x"], outlier_imputation_method='median')
+    # both fill values come from the retained valid values [1, 1, 1, 1, 2, 2, 2, 50, 60]
+    assert result["x"].iloc[9] == 2
+    assert result["x"].iloc[10] == pytest.approx(120 / 9)
+    assert result["x"].iloc[:9].tolist() == [1, 1, 1, 1, 2, 2, 2, 50, 60]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_foreign_and_missing_labels_are_imputed(backend):
+    df = pd.DataFrame({"x": np.arange(6, dtype=float),
+                       "c": ["a", "a", "b", "?", None, "-"]})
+    result = cleaned(backend, df)
+    assert result["c"].tolist() == ["a", "a", "b", "a", "a", "a"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("options", [dict(imputation_method=['mean']),
+                                     dict(lower_extreme=[0, 0, 0]),
+                                     dict(higher_extreme=[10])])
+def test_outlier_lists_must_match_the_columns(backend, options):
+    df = pd.DataFrame({"x": [1, 2, 3, 100.0], "y": [1, 2, 3, -100.0]})
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    output = da.outlier_removal_imputation(selected_columns=["x", "y"], **options)
+    assert output["error_code"] == 109
+    assert "entries for 2 columns" in output["error_trace"]
+
+
+def test_foreign_value_mask_ignores_non_string_values():
+    series = pd.Series([True, None, False, 1, "?", "ok", "-"], dtype=object)
+    assert foreign_value_mask(series).tolist() == [False, False, False, False, True, False, True]
+    assert not foreign_value_mask(pd.Series([True, None, False], dtype=object)).any()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_boolean_column_with_blanks_is_cleaned(backend):
+    df = pd.DataFrame({"x": np.arange(6, dtype=float),
+                       "flag": pd.Series([True, None, False, True, True, None], dtype=object)})
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    output = da.keep_data_integrity()
+    assert output["error_code"] == 0, output["error_trace"]
+
+
+@pytest.mark.skipif(duckdb is None, reason="duckdb is not installed")
+@pytest.mark.parametrize("options", [dict(),
+                                     dict(remove_missing_rows_continuous=True, remove_foreign_rows=True),
+                                     dict(remove_missing_rows_categorical=True, impute_missing_rows_continuous='median'),
+                                     dict(outlier_columns=["x", "y"], outlier_imputation_method='median'),
+                                     dict(outlier_columns=["y"], outlier_imputation_method='mean', f=1.0,
+                                          impute_missing_rows_categorical='mode', remove_foreign_rows=True)])
+def test_duckdb_plan_matches_pandas_plan(options):
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({"x": rng.normal(50, 10, n).round(2),
+                       "y": rng.exponential(5, n).round(2),
+                       "c": rng.choice(["a", "b", "c", "?", "-"], n, p=[0.5, 0.3, 0.14, 0.03, 0.03]).astype(object)})
+    df.loc[rng.random(n) < 0.05, "x"] = np.nan
+    df.loc[rng.random(n) < 0.05, "y"] = np.nan
+    df.loc[rng.random(n) < 0.05, "c"] = None
+    df.loc[rng.random(n) < 0.02, "x"] = 1000.0
+    expected = cleaned('pandas', df, **options).reset_index(drop=True)
+    result = cleaned('duckdb', df, **options)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, atol=1e-9)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Dataframe writers of export_engine against the pandas writers.
+"""
+
+#packages
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from export_engine import export_frame, write_xlsx, EXCEL_MAX_ROWS
+
+
+def test_xlsx_matches_to_excel():
+    df = pd.DataFrame({"x": [1.5, np.inf, -np.inf, np.nan],
+                       "n": [1, 2, 3, 4],
+                       "label": ["a", None, "c", "d"],
+                       "day": pd.date_range("2024-01-01", periods=4)})
+    expected = io.BytesIO()
+    df.to_excel(expected, index=False)
+    expected.seek(0)
+    document = export_frame(df, 'xlsx', index=False)
+    pd.testing.assert_frame_equal(pd.read_excel(io.BytesIO(document)), pd.read_excel(expected))
+    # infinite values are stored as text, like inf_rep of to_excel
+    cells = [row[0].value for row in load_workbook(io.BytesIO(document)).active.iter_rows(min_row=2)]
+    assert cells[:3] == [1.5, "inf", "-inf"]
+
+
+def test_xlsx_larger_than_a_sheet_raises():
+    df = pd.DataFrame({"x": np.zeros(EXCEL_MAX_ROWS, dtype=np.int8)})
+    buffer = io.BytesIO()
+    with pytest.raises(ValueError, match="too large"):
+        write_xlsx(df, buffer, index=False)
+    assert buffer.getvalue() == b""
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Undo, redo and eviction of the cleaning history on both backends.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from duckdb_engine import duckdb
+from history_engine import Dataset_History
+
+BACKENDS = ['pandas', pytest.param('duckdb', marks=pytest.mark.skipif(duckdb is None, reason="duckdb is not installed"))]
+
+
+def working_frame(da):
+    return (da.table.to_frame() if da.table is not None else da.df).reset_index(drop=True)
+
+
+def clean_step(da, **kwargs):
+    plan = da.build_cleaning_plan(**kwargs)
+    assert plan["error_code"] == 0, plan["error_trace"]
+    output = da.execute_cleaning_plan(plan["output"])
+    assert output["error_code"] == 0, output["error_trace"]
+    return working_frame(da)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_undo_redo_restore_every_step(backend):
+    df = pd.DataFrame({"x": [1.0, 2.0, 3.0, np.nan, 4.0, 5.0, 6.0, 1000.0],
+                       "c": ["a", "b", None, "a", "?", "b", "a", "a"]})
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    loaded = working_frame(da)
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False)
+    dropped = clean_step(da, remove_missing_rows_continuous=True)
+    capped = clean_step(da, outlier_columns=["x"], outlier_imputation_method='median')
+    assert len(dropped) == 7 and capped["x"].max() < 1000
+
+    assert da.undo()["error_code"] == 0
+    pd.testing.assert_frame_equal(working_frame(da), dropped)
+    assert da.undo()["error_code"] == 0
+    pd.testing.assert_frame_equal(working_frame(da), loaded)
+    assert da.undo()["error_code"] == 118
+    assert da.redo()["error_code"] == 0
+    pd.testing.assert_frame_equal(working_frame(da), dropped)
+    assert da.redo()["error_code"] == 0
+    pd.testing.assert_frame_equal(working_frame(da), capped)
+    assert da.redo()["error_code"] == 118
+
+    # cleaning an earlier version starts a branch, redo follows the latest one
+    da.undo()
+    da.undo()
+    branch = clean_step(da, remove_foreign_rows=True)
+    da.undo()
+    da.redo()
+    pd.testing.assert_frame_equal(working_frame(da), branch)
+    log = da.list_versions()["output"]
+    assert log["Current"].sum() == 1 and log.loc[log["Current"], "Parent"].iloc[0] == 0
+
+
+def test_eviction_keeps_the_root_and_the_current_version():
+    history = Dataset_History(max_versions=3)
+    df = pd.DataFrame({"x": np.arange(10.0)})
+    for step in range(6):
+        history.commit("step %d" % step, data=df.copy(deep=False), column_versions={"x": step})
+    assert len(history) == 3
+    assert 0 in history and history.current == 5
+    # the parents of the evicted versions are skipped
+    assert history.parent_of(5) == 4 and history.parent_of(4) == 0
+
+
+def test_unchanged_columns_are_counted_once():
+    df = pd.DataFrame({"x": np.arange(1000.0), "y": np.arange(1000.0)})
+    history = Dataset_History()
+    history.commit("loaded", data=df.copy(deep=False), column_versions={"x": 0, "y": 0})
+    single = history.nbytes
+    changed = df.copy(deep=False)
+    changed["y"] = changed["y"] * 2
+    history.commit("y doubled", data=changed, column_versions={"x": 0, "y": 1})
+    # x and the index are shared, only the new y is added
+    assert history.nbytes == single + changed["y"].memory_usage(index=False)
+
+
+def test_evicted_owned_files_are_deleted(tmp_path):
+    history = Dataset_History(max_versions=2)
+    paths = []
+    for step in range(4):
+        path = tmp_path / ("version_%d.parquet" % step)
+        path.write_bytes(b"data")
+        paths.append(path)
+        history.commit("step %d" % step, path=str(path), owned=True, column_versions={"x": step})
+    assert [path.exists() for path in paths] == [True, False, False, True]
+    assert history.clear() is True
+    # the file of the current version goes back to its table
+    assert [path.exists() for path in paths] == [False, False, False, True]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Parity tests of the streaming readers against the pandas readers.
+"""
+
+#packages
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from ingestion_engine import read_excel_streaming, read_csv_chunked
+
+openpyxl = pytest.importorskip("openpyxl")
+
+N_ROWS = 60
+
+
+def sheet_columns(n_rows=N_ROWS, seed=0):
+    """Columns of every kind the reader has to type, with blanks spread across the chunks"""
+    rng = np.random.default_rng(seed)
+    blank = rng.random(n_rows) < 0.2
+
+    def with_blanks(values, mask=blank):
+        return [None if m else v for v, m in zip(values, mask)]
+
+    return {"float": with_blanks(rng.normal(size=n_rows).tolist()),
+            "int": rng.integers(0, 100, n_rows).tolist(),
+            "int_blank": with_blanks(rng.integers(0, 100, n_rows).tolist()),
+            "bool": (rng.random(n_rows) < 0.5).tolist(),
+            "bool_blank": with_blanks((rng.random(n_rows) < 0.5).tolist()),
+            "bool_number": [True if i % 3 == 0 else float(i) for i in range(n_rows)],
+            "text_blank": with_blanks(rng.choice(["a", "b", "?", "long label"], n_rows).tolist()),
+            "date_blank": with_blanks(list(pd.date_range("2020-01-01", periods=n_rows).to_pydatetime())),
+            # only blanks in the first chunks, values afterwards
+            "late_text": [None] * (n_rows // 2) + ["x"] * (n_rows - n_rows // 2),
+            "late_bool": [None] * (n_rows // 2) + [True, False] * ((n_rows - n_rows // 2) // 2),
+            "empty": [None] * n_rows,
+            }
+
+
+def workbook(columns):
+    """Writes the columns to an in-memory workbook"""
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(list(columns))
+    for row in zip(*columns.values()):
+        sheet.append(list(row))
+    document = io.BytesIO()
+    book.save(document)
+    document.seek(0)
+    return document
+
+
+@pytest.mark.parametrize("chunk_size, sample_rows", [(7, 3), (50000, 1000)])
+def test_excel_streaming_matches_read_excel(chunk_size, sample_rows):
+    document = workbook(sheet_columns())
+    expected = pd.read_excel(document)
+    document.seek(0)
+    result = read_excel_streaming(document, chunk_size=chunk_size, sample_rows=sample_rows)
+    assert result.dtypes.to_dict() == expected.dtypes.to_dict()
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_boolean_column_with_blanks_is_float():
+    document = workbook({"flag": [True, None, False, True]})
+    result = read_excel_streaming(document)
+    assert result["flag"].dtype == np.float64
+    assert result["flag"].tolist()[::2] == [1.0, 0.0]
+    assert np.isnan(result["flag"].iloc[1])
+
+
+@pytest.mark.parametrize("chunk_size", [7, 50000])
+def test_csv_chunked_matches_read_csv(chunk_size):
+    df = pd.DataFrame(sheet_columns())
+    text = df.drop(columns=["bool_number"]).to_csv(index=False)
+    expected = pd.read_csv(io.StringIO(text))
+    result = read_csv_chunked(io.StringIO(text), chunk_size=chunk_size)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_read_documents_matches_read_excel_per_sheet(tmp_path, max_workers):
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for n_sheet in range(3):
+        columns = sheet_columns(seed=n_sheet)
+        sheet = book.create_sheet("sheet %d" % n_sheet)
+        sheet.append(list(columns))
+        for row in zip(*columns.values()):
+            sheet.append(list(row))
+    path = str(tmp_path / "book.xlsx")
+    book.save(path)
+    csv_path = str(tmp_path / "table.csv")
+    pd.DataFrame({"float": [1.5, None, 2.5], "text": ["a", "b", None]}).to_csv(csv_path, index=False)
+
+    da = Data_Analytics(disk_cache=False, metrics=False)
+    output = da.read_documents([path, csv_path], max_workers=max_workers, concat='union')
+    assert output["error_code"] == 0, output["error_trace"]
+    expected = {"book:" + name: df for name, df in pd.read_excel(path, sheet_name=None).items()}
+    expected["table"] = pd.read_csv(csv_path)
+    assert output["output"] == list(expected) + ["combined"]
+    for name, df in expected.items():
+        pd.testing.assert_frame_equal(da.datasets[name], df)
+    combined = da.datasets["combined"]
+    assert len(combined) == sum(len(df) for df in expected.values())
+    assert combined["Dataset"].tolist() == [name for name, df in expected.items() for _ in range(len(df))]
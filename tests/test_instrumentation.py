@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics file of the recorder.
+"""
+
+#packages
+import json
+from instrumentation import Metrics_Recorder
+
+
+def test_metrics_file_is_rotated(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    metrics = Metrics_Recorder(path=path, max_bytes=2000)
+    for i in range(100):
+        with metrics.operation("step %d" % i):
+            pass
+    sizes = [(tmp_path / name).stat().st_size for name in ("metrics.jsonl", "metrics.jsonl.1")]
+    assert max(sizes) < 2000 + 1000
+    with open(path) as file:
+        last = [json.loads(line) for line in file][-1]
+    assert last["operation"] == "step 99"
+    assert len(metrics.records()) == 100
+
+
+def test_metrics_stay_in_memory_without_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrics = Metrics_Recorder()
+    with metrics.operation("step"):
+        pass
+    assert len(metrics.records()) == 1
+    assert list(tmp_path.iterdir()) == []
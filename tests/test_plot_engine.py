@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Trend plots of both backends against the numpy least squares fit.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from duckdb_engine import duckdb
+from plot_engine import lttb, ols_fit
+
+pytest.importorskip("plotly")
+
+BACKENDS = ['pandas', pytest.param('duckdb', marks=pytest.mark.skipif(duckdb is None, reason="duckdb is not installed"))]
+
+
+def trend_frame(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 100, n)
+    df = pd.DataFrame({"x": x, "y": 3 * x - 7 + rng.normal(0, 20, n)})
+    df.loc[rng.random(n) < 0.05, "x"] = np.nan
+    df.loc[rng.random(n) < 0.05, "y"] = np.nan
+    return df
+
+
+def test_ols_fit_matches_polyfit():
+    df = trend_frame().dropna()
+    x, y = df["x"].to_numpy(), df["y"].to_numpy()
+    fit = ols_fit(x, y)
+    slope, intercept = np.polyfit(x, y, 1)
+    assert fit["n"] == len(x)
+    assert fit["slope"] == pytest.approx(slope, rel=1e-10)
+    assert fit["intercept"] == pytest.approx(intercept, rel=1e-10)
+    assert fit["r2"] == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2, rel=1e-10)
+    assert np.isnan(ols_fit(np.ones(5), np.arange(5.0))["slope"])
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(10000.0)
+    y = np.sin(x / 500)
+    y[[1234, 7777]] = [50, -50]
+    keep = lttb(x, y, 200)
+    assert len(keep) == 200 and len(np.unique(keep)) == 200
+    assert {0, 9999, 1234, 7777} <= set(keep.tolist())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("mode, max_points", [('auto', 500), ('full', 500), ('density', 500), ('auto', 50000)])
+def test_trend_uses_every_row_and_bounds_the_points(backend, mode, max_points):
+    df = trend_frame()
+    complete = df.dropna()
+    slope, intercept = np.polyfit(complete["x"], complete["y"], 1)
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    output = da.show_trend("x", "y", mode=mode, max_points=max_points)
+    assert output["error_code"] == 0, output["error_trace"]
+    points, line = output["output"].data
+    if mode == 'density':
+        assert np.asarray(points.z).sum() == len(complete)
+    else:
+        assert len(points.x) == (len(complete) if mode == 'full' else min(max_points, len(complete)))
+    # the trendline is fitted on all complete rows, not on the plotted points
+    line_x = np.asarray(line.x)
+    np.testing.assert_allclose(line_x, [complete["x"].min(), complete["x"].max()])
+    np.testing.assert_allclose(np.asarray(line.y), intercept + slope * line_x, rtol=1e-9)
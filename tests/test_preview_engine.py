@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Previews of both backends against the pandas results.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from duckdb_engine import duckdb
+from preview_engine import stratified_positions
+
+BACKENDS = ['pandas', pytest.param('duckdb', marks=pytest.mark.skipif(duckdb is None, reason="duckdb is not installed"))]
+
+
+def preview_frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"x": rng.normal(size=n).round(1),
+                       "group": rng.choice(["a", "b", "c", "d's"], n, p=[0.55, 0.3, 0.1, 0.05]).astype(object)})
+    df.loc[rng.random(n) < 0.1, "x"] = np.nan
+    df.loc[rng.random(n) < 0.05, "group"] = None
+    return df
+
+
+def preview(backend, df, **kwargs):
+    """Runs preview_data on df and returns its output"""
+    da = Data_Analytics(disk_cache=False, backend=backend, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    output = da.preview_data(**kwargs)
+    assert output["error_code"] == 0, output["error_trace"]
+    return output["output"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("filters", [[], [("x", ">", 0.5)], [("group", "contains", "D'"), ("x", "notna", None)],
+                                     [("group", "!=", "a"), ("x", "<=", 0)], [("group", "isna", None)]])
+def test_page_matches_pandas_filter_and_sort(backend, filters):
+    df = preview_frame()
+    expected = df
+    for column, op, value in filters:
+        series = df[column]
+        passed = {"isna": lambda: series.isna(),
+                  "notna": lambda: series.notna(),
+                  "contains": lambda: series.str.lower().str.contains(str(value).lower(), regex=False) == True,
+                  ">": lambda: series > value,
+                  "<=": lambda: series <= value,
+                  "!=": lambda: series != value}[op]()
+        expected = expected[passed[expected.index]]
+    expected = expected.sort_values("x", ascending=False, kind='stable', na_position='last')
+    output = preview(backend, df, page=1, page_size=40, sort_by="x", ascending=False, filters=filters)
+    assert output["total_rows"] == len(expected)
+    rows = output["rows"]
+    pd.testing.assert_index_equal(pd.Index(rows.index, dtype=np.int64), pd.Index(expected.index[40:80], dtype=np.int64))
+    np.testing.assert_array_equal(rows["x"].to_numpy(dtype=float), expected["x"][40:80].to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("page_size", [7, 100, 333])
+def test_stratified_preview_uses_largest_remainder_quotas(backend, page_size):
+    df = preview_frame()
+    output = preview(backend, df, mode="stratified", page_size=page_size, stratify_by="group")
+    rows = output["rows"]
+    assert len(rows) == page_size
+    assert rows.index.is_unique and rows.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(rows.reset_index(drop=True), df.loc[rows.index].reset_index(drop=True),
+                                  check_dtype=False)
+    sizes = df["group"].value_counts(dropna=False)
+    drawn = rows["group"].value_counts(dropna=False).reindex(sizes.index, fill_value=0)
+    exact = sizes * page_size / len(df)
+    assert ((drawn == np.floor(exact)) | (drawn == np.ceil(exact))).all()
+
+
+def test_stratified_positions_with_more_groups_than_rows():
+    codes = np.repeat(np.arange(50), np.arange(1, 51))
+    positions = stratified_positions(codes, 10, seed=3)
+    assert len(positions) == 10 and len(np.unique(codes[positions])) == 10
+    # the largest groups have the largest remainders
+    assert codes[positions].min() >= 40
+    np.testing.assert_array_equal(positions, stratified_positions(codes, 10, seed=3))
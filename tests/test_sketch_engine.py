@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Error bounds of the sketches against the exact pandas results.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from backend_analytics_engine import Data_Analytics
+from sketch_engine import KLL_Sketch, HyperLogLog, Heavy_Hitters, Continuous_Sketch
+
+CHUNK_SIZE = 10000
+
+
+def chunks(values, chunk_size=CHUNK_SIZE):
+    """Splits an array or a Series in chunks of rows"""
+    return [values[start:start + chunk_size] for start in range(0, len(values), chunk_size)]
+
+
+def zipf_labels(n, n_labels=5000, seed=0):
+    """Skewed categorical values, as real data"""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_labels + 1)
+    codes = rng.choice(n_labels, n, p=weights / weights.sum())
+    return pd.Series(np.char.add("label_", codes.astype(str)).astype(object))
+
+
+@pytest.mark.parametrize("quantile_error", [0.05, 0.01])
+def test_kll_rank_error_is_bounded(quantile_error):
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.normal(size=150000), rng.exponential(10, 50000)])
+    sketch = KLL_Sketch(KLL_Sketch.k_for_error(quantile_error))
+    for chunk in chunks(values):
+        sketch.update(chunk)
+    assert sketch.rank_error <= quantile_error
+    q = np.linspace(0.01, 0.99, 99)
+    exact = np.sort(values)
+    # normalized rank of every estimate in the exact data
+    ranks = np.searchsorted(exact, sketch.quantile(q), side='right') / len(values)
+    assert np.abs(ranks - q).max() <= sketch.rank_error
+
+
+def test_kll_merge_and_seed_are_deterministic():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=100000)
+    merged = KLL_Sketch(400)
+    for part in chunks(values, 25000):
+        sketch = KLL_Sketch(400)
+        sketch.update(part)
+        merged.merge(sketch)
+    assert merged.n == len(values)
+    q = [0.25, 0.5, 0.75]
+    ranks = np.searchsorted(np.sort(values), merged.quantile(q), side='right') / len(values)
+    assert np.abs(ranks - q).max() <= merged.rank_error
+    again = KLL_Sketch(400)
+    first = KLL_Sketch(400)
+    for chunk in chunks(values):
+        first.update(chunk)
+        again.update(chunk)
+    np.testing.assert_array_equal(first.quantile(q), again.quantile(q))
+
+
+@pytest.mark.parametrize("n_unique", [1000, 300000])
+def test_hyperloglog_relative_error_is_bounded(n_unique):
+    rng = np.random.default_rng(3)
+    series = pd.Series(rng.permutation(np.tile(np.arange(n_unique), 3)))
+    sketch = HyperLogLog(HyperLogLog.p_for_error(0.01))
+    for chunk in chunks(series):
+        sketch.update(chunk)
+    exact = series.nunique()
+    # three standard errors, exact while the hashes are kept in sparse mode
+    assert abs(sketch.estimate() - exact) <= 3 * sketch.relative_error * exact
+    if sketch.relative_error == 0:
+        assert sketch.estimate() == exact
+
+
+def test_hyperloglog_merge_matches_one_sketch():
+    values = pd.Series(np.arange(200000)).astype(str)
+    single = HyperLogLog(10)
+    single.update(values)
+    merged = HyperLogLog(10)
+    for part in chunks(values, 50000):
+        sketch = HyperLogLog(10)
+        sketch.update(part)
+        merged.merge(sketch)
+    np.testing.assert_array_equal(merged.registers, single.registers)
+    assert merged.estimate() == single.estimate()
+
+
+@pytest.mark.parametrize("k", [10, 100])
+def test_misra_gries_count_bounds(k):
+    series = zipf_labels(200000)
+    exact = series.value_counts()
+    sketch = Heavy_Hitters(k)
+    for chunk in chunks(series):
+        sketch.update(chunk)
+    assert sketch.n == len(series)
+    assert len(sketch.counts) <= k
+    assert sketch.error <= len(series) / (k + 1)
+    tracked = pd.Series(sketch.counts, index=sketch.values)
+    true_counts = exact[tracked.index]
+    assert (tracked <= true_counts).all()
+    assert (tracked >= true_counts - sketch.error).all()
+    # every value more frequent than the error is tracked
+    assert set(exact.index[exact > sketch.error]) <= set(tracked.index)
+    assert sketch.mode() == series.mode()[0]
+
+
+def test_misra_gries_merge_keeps_the_bounds():
+    series = zipf_labels(100000, seed=4)
+    exact = series.value_counts()
+    merged = Heavy_Hitters(50)
+    for part in chunks(series, 25000):
+        sketch = Heavy_Hitters(50)
+        sketch.update(part)
+        merged.merge(sketch)
+    assert merged.n == len(series)
+    assert merged.error <= len(series) / 51
+    tracked = pd.Series(merged.counts, index=merged.values)
+    assert (tracked <= exact[tracked.index]).all()
+    assert (tracked >= exact[tracked.index] - merged.error).all()
+
+
+def test_continuous_sketch_exact_moments():
+    rng = np.random.default_rng(5)
+    values = rng.normal(50, 5, 100000)
+    values[rng.random(len(values)) < 0.01] = np.nan
+    sketch = Continuous_Sketch()
+    for chunk in chunks(values):
+        sketch.update(chunk)
+    exact = pd.Series(values)
+    stats = sketch.stats()
+    assert stats['Missing'] == exact.isna().sum()
+    assert stats['Mean'] == pytest.approx(exact.mean(), rel=1e-12)
+    assert stats['Variance'] == pytest.approx(exact.var(), rel=1e-9)
+    assert stats['Min'] == exact.min() and stats['Max'] == exact.max()
+
+
+def test_describe_data_approximate_matches_exact():
+    rng = np.random.default_rng(6)
+    df = pd.DataFrame({"x": rng.normal(size=50000), "label": zipf_labels(50000, 500, seed=6)})
+    da = Data_Analytics(disk_cache=False, metrics=False)
+    da.datasets = {"test": df}
+    da.select_dataset("test")
+    output = da.describe_data(approximate=True, chunk_size=CHUNK_SIZE)
+    assert output["error_code"] == 0, output["error_trace"]
+    cont = output["output"]["cont_data_summary"]
+    categ = output["output"]["categ_data_summary"]
+    column = cont.loc["x"]
+    exact = np.sort(df["x"].to_numpy())
+    for name, q in (("First_Quartile", 0.25), ("Median", 0.5), ("Third_Quartile", 0.75)):
+        rank = np.searchsorted(exact, column[name], side='right') / len(exact)
+        assert abs(rank - q) <= column["Quantile_Rank_Error"]
+    label = categ.loc["label"]
+    assert label["Count_of_Unique_Values"] == df["label"].nunique()
+    assert label["Mode"] == df["label"].mode()[0]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Correlations of stats_engine against the pandas results.
+"""
+
+#packages
+import numpy as np
+import pandas as pd
+import pytest
+from stats_engine import spearman_correlation
+
+
+def spearman(df):
+    """Runs spearman_correlation on the columns of df"""
+    return spearman_correlation([df[c].to_numpy(dtype=np.float64) for c in df], chunk_size=1000)
+
+
+@pytest.mark.parametrize("missing_rate", [0.0, 0.05, 0.5])
+def test_spearman_matches_pandas_with_scattered_missing_values(missing_rate):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(3000, 12)))
+    # ties, a monotonic and a constant column
+    df[2] = df[2].round(1)
+    df[3] = np.exp(df[0])
+    df[4] = 1.0
+    df = df.mask(rng.random(df.shape) < missing_rate)
+    np.testing.assert_allclose(spearman(df), df.corr(method='spearman').to_numpy(), atol=1e-12, equal_nan=True)
+
+
+def test_spearman_matches_pandas_with_shared_missing_patterns():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(rng.normal(size=(2000, 10)))
+    for c in range(8):
+        # columns of the same source miss the same rows
+        df.iloc[(c % 3) * 300:(c % 3) * 300 + 500, c] = np.nan
+    # valid rows nested in those of other columns, and a pair without common rows
+    df.iloc[:1500, 8] = np.nan
+    df.iloc[1500:, 9] = np.nan
+    np.testing.assert_allclose(spearman(df), df.corr(method='spearman').to_numpy(), atol=1e-12, equal_nan=True)